@@ -25,6 +25,15 @@ CREATE TABLE productos_servicios (
     precio_unitario DECIMAL(10, 2) NOT NULL  -- Precio unitario del producto o servicio
 );
 
+-- Tasas de impuestos de cada producto o servicio; los productos sin perfil solo causan IVA al 16%
+CREATE TABLE perfiles_impuestos (
+    clave_producto_servicio VARCHAR(10) PRIMARY KEY REFERENCES productos_servicios(clave_producto_servicio),  -- Clave del producto o servicio
+    tasa_iva NUMERIC(7, 6) DEFAULT 0.160000 NOT NULL,  -- Tasa de IVA trasladado
+    tasa_ieps NUMERIC(7, 6) DEFAULT 0 NOT NULL,  -- Tasa de IEPS trasladado (forma parte de la base del IVA)
+    tasa_retencion_iva NUMERIC(7, 6) DEFAULT 0 NOT NULL,  -- Tasa de IVA retenido
+    tasa_retencion_isr NUMERIC(7, 6) DEFAULT 0 NOT NULL  -- Tasa de ISR retenido
+);
+
 -- Tablas para la información de la factura
 CREATE TABLE tipo_comprobante (
     clave VARCHAR(1) PRIMARY KEY NOT NULL UNIQUE,  -- Clave del tipo de comprobante (única)
@@ -112,7 +121,8 @@ INSERT INTO regimen_fiscal (clave, descripcion) VALUES
 -- Datos del tipo de comprobante
 INSERT INTO tipo_comprobante (clave, descripcion) VALUES
 ('I', 'INGRESO'),
-('E', 'EGRESO');
+('E', 'EGRESO'),
+('N', 'NÓMINA');
 
 -- Datos del uso o destino CFDI
 INSERT INTO uso_destino_cfdi (clave, descripcion) VALUES
@@ -146,6 +156,7 @@ INSERT INTO uso_destino_cfdi (clave, descripcion) VALUES
 CREATE TABLE facturas (
     -- Encabezado
     id SERIAL PRIMARY KEY,  -- Identificador único para cada factura
+    uuid VARCHAR(36) UNIQUE,  -- Folio fiscal (UUID)
     nombre_empresa VARCHAR(50) DEFAULT 'FARMACIAS DE DIOS' NOT NULL,  -- Nombre de la empresa
 
     -- Primera sección
@@ -166,26 +177,32 @@ CREATE TABLE facturas (
 
     -- Cuarta sección
     subtotal DECIMAL(10, 2) NOT NULL,  -- Subtotal
+    ieps DECIMAL(10, 2) DEFAULT 0 NOT NULL,  -- IEPS
     iva DECIMAL(10, 2) NOT NULL,  -- IVA
+    retenciones DECIMAL(10, 2) DEFAULT 0 NOT NULL,  -- Retenciones de IVA e ISR
     total DECIMAL(10, 2) NOT NULL,  -- Total
-    total_con_letra VARCHAR(255) NOT NULL,  -- Total con letra
+    total_con_letra VARCHAR(255),  -- Total con letra (lo completa el trabajo procesar_factura)
     moneda VARCHAR(20) DEFAULT 'MXN PESOS MEXICANOS' NOT NULL,  -- Moneda
     tipo_cambio DECIMAL(10, 2) DEFAULT 0.00 NOT NULL,  -- Tipo de cambio
     metodo_pago_clave VARCHAR(3) NOT NULL REFERENCES metodos_pago(clave),  -- Clave del método de pago
     forma_pago_clave VARCHAR(2) NOT NULL REFERENCES formas_pago(clave),  -- Clave de la forma de pago
 
     -- Quinta sección
-    sello_digital_cfdi TEXT NOT NULL,  -- Sello digital CFDI
-    sello_digital_sat TEXT NOT NULL,  -- Sello digital SAT
-    cadena_original_complemento_certificacion TEXT NOT NULL,  -- Cadena original complemento certificación
-    codigo_qr BYTEA NOT NULL  -- Código QR
+    sello_digital_cfdi TEXT,  -- Sello digital CFDI
+    sello_digital_sat TEXT,  -- Sello digital SAT
+    cadena_original_complemento_certificacion TEXT,  -- Cadena original complemento certificación
+    codigo_qr BYTEA,  -- Código QR
+    xml_sha256 CHAR(64)  -- SHA-256 del XML sellado en el almacén de documentos
 );
 
 -- Tabla para almacenar los PDF de las facturas
 CREATE TABLE facturas_pdf (
     id SERIAL PRIMARY KEY,  -- Identificador único para cada factura PDF
     id_factura INTEGER NOT NULL REFERENCES facturas(id),  -- ID de la factura asociada
-    pdf BYTEA NOT NULL  -- PDF de la factura
+    pdf BYTEA,  -- PDF de la factura (solo filas anteriores al almacén de documentos)
+    hash_sha256 CHAR(64),  -- SHA-256 del PDF en el almacén de documentos
+    version_plantilla VARCHAR(16),  -- Versión de la plantilla con la que se generó el PDF
+    UNIQUE (id_factura, version_plantilla)  -- Un PDF por factura y versión de plantilla
 );
 
 
@@ -646,6 +663,7 @@ INSERT INTO banco (clave, descripcion) VALUES
 CREATE TABLE recibos_nomina (
     -- Encabezado
     id SERIAL PRIMARY KEY,  -- Identificador único para cada recibo
+    uuid VARCHAR(36) UNIQUE,  -- Folio fiscal (UUID)
     nombre_empresa VARCHAR(50) DEFAULT 'FARMACIAS DE DIOS' NOT NULL,  -- Nombre de la empresa
 
     -- Primera sección
@@ -684,7 +702,8 @@ CREATE TABLE recibos_nomina (
     sello_digital_cfdi TEXT NOT NULL,  -- Sello digital CFDI
     sello_digital_sat TEXT NOT NULL,  -- Sello digital SAT
     cadena_original_complemento_certificacion TEXT NOT NULL,  -- Cadena original complemento certificación
-    codigo_qr BYTEA NOT NULL  -- Código QR
+    codigo_qr BYTEA NOT NULL,  -- Código QR
+    xml_sha256 CHAR(64)  -- SHA-256 del XML sellado en el almacén de documentos
 );
 
 
@@ -692,5 +711,127 @@ CREATE TABLE recibos_nomina (
 CREATE TABLE recibos_pdf (
     id SERIAL PRIMARY KEY,  -- Identificador único para cada factura PDF
     id_recibo INTEGER NOT NULL REFERENCES recibos_nomina(id),  -- ID de la factura asociada
-    pdf BYTEA NOT NULL  -- PDF de la factura
-);
\ No newline at end of file
+    pdf BYTEA,  -- PDF de la factura (solo filas anteriores al almacén de documentos)
+    hash_sha256 CHAR(64)  -- SHA-256 del PDF en el almacén de documentos
+);
+
+------------------------------------------------------------
+------------------ VERSIONES DE CATÁLOGOS ------------------
+-----------------------------------------------------------
+
+-- Tabla con la versión de cada catálogo, usada por la caché de catálogos de la aplicación
+CREATE TABLE catalogos_version (
+    tabla VARCHAR(64) PRIMARY KEY NOT NULL,  -- Nombre de la tabla del catálogo
+    version BIGINT NOT NULL DEFAULT 1  -- Se incrementa con cada cambio en el catálogo
+);
+
+-- Función que incrementa la versión del catálogo modificado
+CREATE OR REPLACE FUNCTION incrementar_version_catalogo() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO catalogos_version (tabla, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (tabla) DO UPDATE SET version = catalogos_version.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Disparadores sobre cada catálogo (una vez por sentencia)
+DO $$
+DECLARE
+    catalogo TEXT;
+BEGIN
+    FOREACH catalogo IN ARRAY ARRAY[
+        'tipo_comprobante', 'uso_destino_cfdi', 'regimen_fiscal', 'metodos_pago', 'formas_pago',
+        'productos_servicios', 'perfiles_impuestos', 'regimen_laboral', 'banco', 'percepciones', 'deducciones'
+    ] LOOP
+        INSERT INTO catalogos_version (tabla) VALUES (catalogo) ON CONFLICT (tabla) DO NOTHING;
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_catalogo()',
+            'trg_version_' || catalogo, catalogo
+        );
+    END LOOP;
+END;
+$$;
+
+
+------------------------------------------------------------
+------------------ TRABAJOS EN SEGUNDO PLANO ---------------
+-----------------------------------------------------------
+
+-- Cola de trabajos en segundo plano (ver app/services/trabajos.py)
+CREATE TABLE trabajos (
+    id BIGSERIAL PRIMARY KEY,  -- Identificador único para cada trabajo
+    tipo VARCHAR(50) NOT NULL,  -- Tipo de trabajo (nombre de la tarea registrada)
+    clave VARCHAR(100),  -- Identificador para consultar el trabajo, por ejemplo 'factura:15'
+    carga JSONB NOT NULL DEFAULT '{}',  -- Argumentos de la tarea
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',  -- pendiente, en_proceso, terminado o fallido
+    intentos INTEGER NOT NULL DEFAULT 0,  -- Intentos realizados
+    max_intentos INTEGER NOT NULL DEFAULT 5,  -- Intentos antes de marcarlo como fallido
+    ejecutar_despues TIMESTAMP NOT NULL DEFAULT NOW(),  -- No se ejecuta antes de esta fecha (reintentos)
+    bloqueado_por VARCHAR(100),  -- Trabajador que lo está ejecutando
+    bloqueado_en TIMESTAMP,  -- Fecha en que el trabajador lo tomó
+    error TEXT,  -- Último error
+    creado_en TIMESTAMP NOT NULL DEFAULT NOW(),  -- Fecha de creación
+    terminado_en TIMESTAMP  -- Fecha en que terminó o falló definitivamente
+);
+
+-- Consulta del estado por clave
+CREATE INDEX idx_trabajos_clave ON trabajos (clave);
+
+-- Trabajos pendientes en el orden en que se toman
+CREATE INDEX idx_trabajos_pendientes ON trabajos (id) WHERE estado = 'pendiente';
+
+-- Trabajos en proceso, para recuperar los abandonados
+CREATE INDEX idx_trabajos_en_proceso ON trabajos (bloqueado_en) WHERE estado = 'en_proceso';
+
+-- Índices de las consultas frecuentes (en una base existente se crean con python -m services.migraciones)
+-- Historial de facturas de un receptor; cubre las columnas del listado
+CREATE INDEX idx_facturas_receptor_fecha ON facturas (rfc_receptor, fecha_expedicion DESC, id DESC) INCLUDE (uuid, clave_producto_servicio, cantidad, total);
+
+-- Facturas y recibos por rango de fechas
+CREATE INDEX idx_facturas_fecha ON facturas (fecha_expedicion, id);
+CREATE INDEX idx_recibos_fecha_expedicion ON recibos_nomina (fecha_expedicion, id);
+CREATE INDEX idx_recibos_fecha_pago ON recibos_nomina (fecha_pago);
+
+-- Recibos de un empleado, del más reciente al más antiguo
+CREATE INDEX idx_recibos_empleado_fecha ON recibos_nomina (empleado, fecha_pago DESC);
+
+-- PDF de un recibo y PDF que siguen guardados como BYTEA
+CREATE INDEX idx_recibos_pdf_recibo ON recibos_pdf (id_recibo) INCLUDE (hash_sha256);
+CREATE INDEX idx_facturas_pdf_sin_migrar ON facturas_pdf (id) WHERE hash_sha256 IS NULL AND pdf IS NOT NULL;
+CREATE INDEX idx_recibos_pdf_sin_migrar ON recibos_pdf (id) WHERE hash_sha256 IS NULL AND pdf IS NOT NULL;
+
+------------------------------------------------------------
+-------------------- RESUMEN DE VENTAS ---------------------
+-----------------------------------------------------------
+
+-- Ventas e impuestos por mes, producto o servicio, forma de pago y método de pago (ver app/services/agregados.py)
+CREATE TABLE resumen_ventas (
+    mes DATE NOT NULL,  -- Primer día del mes de expedición
+    clave_producto_servicio VARCHAR(10) NOT NULL,  -- Clave del producto o servicio
+    forma_pago_clave VARCHAR(2) NOT NULL,  -- Clave de la forma de pago
+    metodo_pago_clave VARCHAR(3) NOT NULL,  -- Clave del método de pago
+    facturas INTEGER NOT NULL DEFAULT 0,  -- Número de facturas
+    cantidad BIGINT NOT NULL DEFAULT 0,  -- Cantidad vendida
+    subtotal DECIMAL(14, 2) NOT NULL DEFAULT 0,  -- Suma de los subtotales
+    ieps DECIMAL(14, 2) NOT NULL DEFAULT 0,  -- Suma del IEPS
+    iva DECIMAL(14, 2) NOT NULL DEFAULT 0,  -- Suma del IVA trasladado
+    retenciones DECIMAL(14, 2) NOT NULL DEFAULT 0,  -- Suma de las retenciones
+    total DECIMAL(14, 2) NOT NULL DEFAULT 0,  -- Suma de los totales
+    PRIMARY KEY (mes, clave_producto_servicio, forma_pago_clave, metodo_pago_clave)
+);
+
+-- Migraciones aplicadas (ver app/services/migraciones.py); el esquema de este archivo ya incluye las versiones 1 a 7
+CREATE TABLE esquema_migraciones (
+    version INTEGER PRIMARY KEY,  -- Número de la migración
+    descripcion VARCHAR(255) NOT NULL,  -- Descripción de la migración
+    aplicada_en TIMESTAMP NOT NULL DEFAULT NOW()  -- Fecha en que se aplicó
+);
+INSERT INTO esquema_migraciones (version, descripcion) VALUES
+    (1, 'Perfiles de impuestos'),
+    (2, 'Folio fiscal, impuestos y PDF en el almacén'),
+    (3, 'Cola de trabajos'),
+    (4, 'Versiones de catálogos'),
+    (5, 'Índices de las consultas frecuentes'),
+    (6, 'Resumen de ventas'),
+    (7, 'XML sellado de los comprobantes');
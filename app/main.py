@@ -4,8 +4,7 @@ import streamlit as st
 import time
 import altair as alt
 
-from services.auth_service import get_db, registrar_usuario, verificar_usuario, obtener_rfc
-from models import Usuario
+from services.auth_service import get_db, registrar_usuario, iniciar_sesion, obtener_usuario_sesion, cerrar_sesion
 from services.factura_service import (
     crear_factura, 
     obtener_tipo_comprobante, 
@@ -15,16 +14,50 @@ from services.factura_service import (
     obtener_formas_pago, 
     obtener_productos_servicios,
     obtener_precio_unitario,
-    calcular_valores_factura
+    calcular_valores_factura,
+    obtener_estado_factura,
+    obtener_xml_factura,
+    obtener_historial_facturas,
+    obtener_detalle_factura
 )
-from utils.factura_pdf_util import generar_pdf, obtener_datos, guardar_factura_pdf
+from services.instrumentacion_sql import iniciar_servidor_metricas, medir_sql
+from services.trazas import linea_de_tiempo, registro_trazas, traza, tramo
+from services.extractos import ESCRITORES, exportar_extracto_zip
+from services.tablero import productos_principales, serie_ventas
+from utils.factura_pdf_util import obtener_pdf_factura
 
 import datetime
+import os
+import tempfile
 # Obtén la fecha y hora actual
 now = datetime.datetime.now()
 # Formatea la fecha y hora en el formato "DD/MM/AA - HH:MM"
 formatted_now = now.strftime("%d.%m.%y-%H.%M")
 
+# Segundos que se reutilizan los datos del tablero antes de volver a consultarlos
+TABLERO_CACHE_TTL = int(os.environ.get('TABLERO_CACHE_TTL', '300'))
+
+# Consultas automáticas del estado de una factura en proceso (una por segundo) antes de pedir al
+# usuario que lo actualice a mano
+ESTADO_FACTURA_CONSULTAS = int(os.environ.get('ESTADO_FACTURA_CONSULTAS', '30'))
+
+# Aviso para las facturas selladas antes de guardar su XML cuyo sello ya no puede verificarse
+XML_NO_DISPONIBLE = "El XML de esta factura no está disponible: se selló antes de guardar los XML y no puede reconstruirse."
+
+# Aviso para las facturas que todavía no están selladas
+PDF_NO_DISPONIBLE = "El PDF estará disponible cuando la factura termine de procesarse."
+
+# Panel de depuración con las últimas trazas, solo para empleados (ver services/trazas.py)
+TRAZAS_PANEL = os.environ.get('TRAZAS_PANEL', '').strip().lower() in ('1', 'true', 'si', 'sí', 'yes', 'on')
+TRAZAS_PANEL_CANTIDAD = int(os.environ.get('TRAZAS_PANEL_CANTIDAD', '20'))
+
+# Periodos del tablero: etiqueta -> meses hacia atrás (None para todo el historial)
+PERIODOS_TABLERO = {
+    "Últimos 12 meses": 12,
+    "Últimos 3 años": 36,
+    "Todo el historial": None,
+}
+
 # Definir la función principal que se ejecutará cuando se inicie el script
 def main():
     """
@@ -54,21 +87,54 @@ def main():
         with col2:
             st.image("app/utils/logo.png", width=100)
 
+    # Obtener el usuario de la sesión iniciada (desde la caché de sesiones, sin consultar la base de datos)
+    usuario = obtener_usuario_sesion(st.session_state.get("sesion"))
+    if "sesion" in st.session_state and usuario is None:
+        # La sesión venció por inactividad
+        del st.session_state["sesion"]
+        st.warning("Tu sesión expiró, vuelve a iniciar sesión")
+
     # Si el usuario ha iniciado sesión
-    if "usuario" in st.session_state:
+    if usuario:
         col1, col2 = st.columns([7.5, 2])
         with col2:
             # Agregar un botón para cerrar la sesión
             if st.button("📤 Cerrar sesión"):
-                # Eliminar "usuario" del st.session_state para cerrar la sesión
-                del st.session_state["usuario"]
+                # Eliminar la sesión de la caché y del st.session_state para cerrar la sesión
+                cerrar_sesion(st.session_state["sesion"])
+                del st.session_state["sesion"]
+                st.session_state.pop("historial_paginas", None)
                 # Redirigir al usuario a la pantalla de inicio
                 with st.spinner('Cerrando sesión'):
                     time.sleep(2)
                 st.rerun()
 
-        # Llamar a la función para generar la factura
-        generar_factura()
+        # Los extractos contables incluyen los documentos de todos los clientes: solo para empleados
+        pestañas = ["📝 Nueva factura", "📚 Historial"] + (["📈 Tablero", "📊 Extractos"] if usuario.get('es_empleado') else [])
+        tab_factura, tab_historial, *tabs_empleado = st.tabs(pestañas)
+        with tab_factura:
+            # Llamar a la función para generar la factura
+            with medir_sql('generar_factura'), traza('generar_factura'):
+                generar_factura(usuario)
+        with tab_historial:
+            with medir_sql('historial_facturas'):
+                mostrar_historial_facturas(usuario)
+        if tabs_empleado:
+            tab_tablero, tab_extractos = tabs_empleado
+            with tab_tablero:
+                with medir_sql('tablero'):
+                    mostrar_tablero()
+            with tab_extractos:
+                with medir_sql('extractos'):
+                    mostrar_extractos()
+            if TRAZAS_PANEL:
+                mostrar_trazas()
+
+        # Volver a consultar el estado de la factura en proceso después de mostrar todas las pestañas
+        if st.session_state.pop("consultar_estado", False):
+            st.session_state["consultas_estado"] = st.session_state.get("consultas_estado", 0) + 1
+            time.sleep(1)
+            st.rerun()
     
     else:
         # Crear dos pestañas, una para mostrar el inicio de sesión y otra para mostrar el registro
@@ -77,13 +143,15 @@ def main():
             with st.expander("🔓 Iniciar sesión o registrarse:"):
                 tab1, tab2 = st.tabs(["Iniciar Sesión", "Registrarse"])
                 with tab1:
-                    mostrar_inicio_sesión()
+                    with medir_sql('inicio_sesion'):
+                        mostrar_inicio_sesión()
                 with tab2:
                     tab1, tab2 = st.tabs(["Cliente", "Empleado"])
-                    if tab1:
-                        mostrar_registro(es_empleado=False)
-                    elif tab2:
-                        mostrar_registro(es_empleado=True)
+                    with medir_sql('registro'):
+                        if tab1:
+                            mostrar_registro(es_empleado=False)
+                        elif tab2:
+                            mostrar_registro(es_empleado=True)
 
 # Si el usuario selecciona "Inicio de sesión"
 def mostrar_inicio_sesión():
@@ -107,31 +175,21 @@ def mostrar_inicio_sesión():
     if st.button("Iniciar sesión"):
         # Abrir una nueva sesión de base de datos
         with get_db() as db:
-            # Buscar al usuario en la base de datos por correo electrónico
-            usuario = db.query(Usuario).filter(Usuario.correo_electronico == correo_electronico).first()
-            # Si el usuario existe
-            if usuario:
-                # Verificar la contraseña del usuario
-                usuario = verificar_usuario(db, correo_electronico, contraseña)
-                
-                # Si la contraseña es correcta
-                if usuario:
-                    # Obtener el rfc_receptor del usuario
-                    rfc_receptor = obtener_rfc(db, correo_electronico)
-                    # Almacenar el estado de inicio de sesión en la sesión
-                    st.session_state["usuario"] = usuario
-                    # Mostrar un mensaje de éxito
-                    st.success("Has iniciado sesión correctamente")
-                    # Refrescar la página para mostrar solo la pestaña de generar factura
-                    st.experimental_rerun()
-                # Si la contraseña es incorrecta
-                else:
-                    # Mostrar un mensaje de error
-                    st.error("El correo electrónico o la contraseña son incorrectos")
-            # Si el correo electrónico es incorrecto
-            else:
-                # Mostrar un mensaje de error
-                st.error("El correo electrónico o la contraseña son incorrectos")
+            # Verificar las credenciales con una sola consulta y crear la sesión
+            sesion = iniciar_sesion(db, correo_electronico, contraseña)
+
+        # Si las credenciales son correctas
+        if sesion:
+            # Almacenar el identificador de la sesión
+            st.session_state["sesion"] = sesion
+            # Mostrar un mensaje de éxito
+            st.success("Has iniciado sesión correctamente")
+            # Refrescar la página para mostrar solo la pestaña de generar factura
+            st.experimental_rerun()
+        # Si el correo electrónico o la contraseña son incorrectos
+        else:
+            # Mostrar un mensaje de error
+            st.error("El correo electrónico o la contraseña son incorrectos")
 
 
 # Si el usuario selecciona "Registro"
@@ -198,43 +256,34 @@ def mostrar_registro(es_empleado: bool = False):
             else:
                 # Abrir una nueva sesión de base de datos
                 with get_db() as db:
-                    # Buscar al usuario en la base de datos por correo electrónico o RFC
-                    usuario_existente = db.query(Usuario).filter((Usuario.correo_electronico == correo_electronico) | (Usuario.rfc_receptor == rfc_receptor)).first()
-                    # Si el usuario existe, mostrar un mensaje de error específico
-                    if usuario_existente:
-                        if usuario_existente.correo_electronico == correo_electronico:
-                            st.error("El correo electrónico ya está registrado.")
-                        if usuario_existente.rfc_receptor == rfc_receptor:
-                            st.error("El RFC ya está registrado.")
+                    # Registrar al usuario (si el correo electrónico o el RFC ya existen se recibe el mensaje de error)
+                    usuario = registrar_usuario(db, nombre_usuario, contraseña, correo_electronico, rfc_receptor, domicilio, es_empleado)
+                    # Si el correo electrónico o el RFC ya están registrados
+                    if isinstance(usuario, str):
+                        # Mostrar un mensaje de error
+                        st.error(usuario)
                     else:
-                        # Registrar al usuario
-                        usuario = registrar_usuario(db, nombre_usuario, contraseña, correo_electronico, rfc_receptor, domicilio, es_empleado)
-                        # Si el registro fue exitoso
-                        if isinstance(usuario, str):
-                            # Mostrar un mensaje de error
-                            st.error(usuario)
-                        else:
-                            # Mostrar un mensaje de éxito
-                            st.success("Usuario registrado con éxito. Puedes regresar a la pantalla de inicio de sesión para ingresar.")
-                            # Borrar los campos de entrada
-                            nombre_usuario_placeholder.empty()
-                            contraseña_placeholder.empty()
-                            correo_electronico_placeholder.empty()
-                            rfc_receptor_placeholder.empty()
-                            calle_placeholder = st.empty()
-                            numero_exterior_placeholder = st.empty()
-                            numero_interior_placeholder = st.empty()
-                            colonia_placeholder = st.empty()
-                            municipio_placeholder = st.empty()
-                            codigo_postal_placeholder = st.empty()
-                            estado_placeholder = st.empty()
-                            pais_placeholder = st.empty()
+                        # Mostrar un mensaje de éxito
+                        st.success("Usuario registrado con éxito. Puedes regresar a la pantalla de inicio de sesión para ingresar.")
+                        # Borrar los campos de entrada
+                        nombre_usuario_placeholder.empty()
+                        contraseña_placeholder.empty()
+                        correo_electronico_placeholder.empty()
+                        rfc_receptor_placeholder.empty()
+                        calle_placeholder = st.empty()
+                        numero_exterior_placeholder = st.empty()
+                        numero_interior_placeholder = st.empty()
+                        colonia_placeholder = st.empty()
+                        municipio_placeholder = st.empty()
+                        codigo_postal_placeholder = st.empty()
+                        estado_placeholder = st.empty()
+                        pais_placeholder = st.empty()
         else:
             # Si no todos los campos están llenos, mostrar un mensaje de error
             st.error("Todos los campos son obligatorios")
 
 # Función para generar una factura
-def generar_factura():
+def generar_factura(usuario: dict):
     """
     Genera una factura con los datos ingresados por el usuario.
 
@@ -244,13 +293,11 @@ def generar_factura():
     un mensaje de éxito y se ofrece la opción de descargar el PDF de la factura o enviarla por correo.
 
     Args:
-        None
+        usuario (dict): Los datos del usuario de la sesión.
 
     Returns:
         None
     """
-    # Obtener el usuario de la sesión
-    usuario = st.session_state["usuario"]
     # Abrir una nueva sesión de base de datos
     with get_db() as db:
         # Redirigir a un nuevo menú para generar facturas
@@ -266,36 +313,44 @@ def generar_factura():
         forma_pago_clave_placeholder = st.empty()
 
         # Crear campos de entrada para los datos de la factura
-        uso_destino_cfdi_opciones = obtener_uso_destino_cfdi(db)
+        with tramo('catalogo.uso_destino_cfdi'):
+            uso_destino_cfdi_opciones = obtener_uso_destino_cfdi(db)
         uso_destino_cfdi = uso_destino_cfdi_placeholder.selectbox("Uso Destino CFDI", uso_destino_cfdi_opciones)
 
-        tipo_comprobante_clave_opciones = obtener_tipo_comprobante(db)
+        with tramo('catalogo.tipo_comprobante'):
+            tipo_comprobante_clave_opciones = obtener_tipo_comprobante(db)
         tipo_comprobante_clave = tipo_comprobante_clave_placeholder.selectbox("Tipo de Comprobante", tipo_comprobante_clave_opciones)
 
-        regimen_fiscal_clave_opciones = obtener_regimen_fiscal(db)
+        with tramo('catalogo.regimen_fiscal'):
+            regimen_fiscal_clave_opciones = obtener_regimen_fiscal(db)
         regimen_fiscal_clave = regimen_fiscal_clave_placeholder.selectbox("Regimen Fiscal", regimen_fiscal_clave_opciones)
 
-        rfc_receptor = usuario.rfc_receptor
+        rfc_receptor = usuario['rfc_receptor']
 
-        clave_producto_servicio_opciones = obtener_productos_servicios(db)
+        with tramo('catalogo.productos_servicios'):
+            clave_producto_servicio_opciones = obtener_productos_servicios(db)
         clave_producto_servicio = clave_producto_servicio_placeholder.selectbox("Clave Producto o Servicio", clave_producto_servicio_opciones)
 
         cantidad = cantidad_placeholder.number_input("Cantidad", min_value=1)
 
-        metodo_pago_clave_opciones = obtener_metodos_pago(db)
+        with tramo('catalogo.metodos_pago'):
+            metodo_pago_clave_opciones = obtener_metodos_pago(db)
         metodo_pago_clave = metodo_pago_clave_placeholder.selectbox("Metodo de Pago", metodo_pago_clave_opciones)
 
-        formas_pago = obtener_formas_pago(db)
+        with tramo('catalogo.formas_pago'):
+            formas_pago = obtener_formas_pago(db)
         forma_pago_clave = forma_pago_clave_placeholder.selectbox("Forma de Pago", formas_pago)
 
-        precio_unitario = obtener_precio_unitario(db, clave_producto_servicio)
+        with tramo('obtener_precio_unitario'):
+            precio_unitario = obtener_precio_unitario(db, clave_producto_servicio)
             
         # Calcula los valores de la factura
-        valores_factura = calcular_valores_factura(db, {
-            'clave_producto_servicio': clave_producto_servicio,
-            'cantidad': cantidad,
-            'precio_unitario': precio_unitario
-        })
+        with tramo('calcular_valores_factura'):
+            valores_factura = calcular_valores_factura(db, {
+                'clave_producto_servicio': clave_producto_servicio,
+                'cantidad': cantidad,
+                'precio_unitario': precio_unitario
+            })
 
         # Crea un marcador de posición para el botón "Generar Factura"
         generar_factura_button_placeholder = st.empty()
@@ -304,68 +359,339 @@ def generar_factura():
         if generar_factura_button_placeholder.button("✅ Generar Factura"):
         
             # Agregar los datos de la factura a la base de datos
-            factura = crear_factura(db, {
-                'uso_destino_cfdi_clave': uso_destino_cfdi,
-                'tipo_comprobante_clave': tipo_comprobante_clave,
-                'regimen_fiscal_clave': regimen_fiscal_clave,
-                'rfc_receptor': rfc_receptor,
-                'clave_producto_servicio': clave_producto_servicio,
-                'cantidad': cantidad,
-                'metodo_pago_clave': metodo_pago_clave,
-                'forma_pago_clave': forma_pago_clave,
-                'precio_unitario': precio_unitario,
-                'importe': valores_factura['importe'],
-                'subtotal': valores_factura['subtotal'],
-                'iva': valores_factura['iva'],
-                'total': valores_factura['total']
-            })
+            with tramo('crear_factura'):
+                factura = crear_factura(db, {
+                    'uso_destino_cfdi_clave': uso_destino_cfdi,
+                    'tipo_comprobante_clave': tipo_comprobante_clave,
+                    'regimen_fiscal_clave': regimen_fiscal_clave,
+                    'rfc_receptor': rfc_receptor,
+                    'clave_producto_servicio': clave_producto_servicio,
+                    'cantidad': cantidad,
+                    'metodo_pago_clave': metodo_pago_clave,
+                    'forma_pago_clave': forma_pago_clave,
+                    'precio_unitario': precio_unitario,
+                    'importe': valores_factura['importe'],
+                    'subtotal': valores_factura['subtotal'],
+                    'ieps': valores_factura['ieps'],
+                    'iva': valores_factura['iva'],
+                    'retenciones': valores_factura['retenciones'],
+                    'total': valores_factura['total']
+                })
             # Si la generación de la factura fue exitosa
             if factura:
-                # Vacía el marcador de posición del botón "Generar Factura"
-                generar_factura_button_placeholder.empty()
-        
-                id_factura = factura.id
-                datos_factura = obtener_datos(db, id_factura)
-                    
-                pdf_bytes = generar_pdf(datos_factura)
-                guardar_factura_pdf(db, id_factura, pdf_bytes)
-                    
-                col1, col2, col3 = st.columns([3, 1.5, 1.8])
-                with col1:
-                    # Mostrar un mensaje de éxito
-                    st.success("Factura generada con éxito")
-                    
-                with col2:
-                    # Usa el ID, la fecha y hora formateada en el nombre del archivo
-                    st.download_button('⬇️ Descargar PDF', pdf_bytes, file_name=f'Factura-{id_factura}-{formatted_now}.pdf', mime='application/pdf')
-        
-                with col3:
-                    # Borrar los campos de entrada
-                    uso_destino_cfdi_placeholder.empty()
-                    tipo_comprobante_clave_placeholder.empty()
-                    regimen_fiscal_clave_placeholder.empty()
-                    clave_producto_servicio_placeholder.empty()
-                    cantidad_placeholder.empty()
-                    metodo_pago_clave_placeholder.empty()
-                    forma_pago_clave_placeholder.empty()
-        
-                    # Agregar un botón "Generar otra factura"
-                    if st.button("🔄 Generar otra factura"):
-                        # Borrar los campos de entrada
-                        uso_destino_cfdi_placeholder.empty()
-                        tipo_comprobante_clave_placeholder.empty()
-                        regimen_fiscal_clave_placeholder.empty()
-                        clave_producto_servicio_placeholder.empty()
-                        cantidad_placeholder.empty()
-                        metodo_pago_clave_placeholder.empty()
-                        forma_pago_clave_placeholder.empty()
-        
-                        # Vuelve a mostrar el botón "Generar Factura"
-                        generar_factura_button_placeholder.button("✅ Generar Factura")
+                # Los sellos, el código QR y el PDF se generan en segundo plano; aquí solo se guarda la factura
+                st.session_state["id_factura"] = factura.id
+                st.session_state["consultas_estado"] = 0
             else:
                 # Si la generación de la factura falló, mostrar un mensaje de error
                 st.error("Error al generar la factura")
 
+        # Si ya se generó una factura en esta sesión
+        if "id_factura" in st.session_state:
+            # Vacía el marcador de posición del botón "Generar Factura"
+            generar_factura_button_placeholder.empty()
+
+            id_factura = st.session_state["id_factura"]
+            # Estado del procesamiento en segundo plano (None para facturas sin trabajo encolado)
+            with tramo('obtener_estado_factura', id_factura=id_factura):
+                estado = obtener_estado_factura(db, id_factura)
+            en_proceso = estado in ('pendiente', 'en_proceso')
+
+            # Mientras el trabajo no termine, main() vuelve a consultar el estado hasta ESTADO_FACTURA_CONSULTAS veces
+            consultas_agotadas = st.session_state.get("consultas_estado", 0) >= ESTADO_FACTURA_CONSULTAS
+            if en_proceso and not consultas_agotadas:
+                st.session_state["consultar_estado"] = True
+
+            col1, col2, col3 = st.columns([3, 1.5, 1.8])
+            with col1:
+                if en_proceso and consultas_agotadas and estado == 'pendiente':
+                    st.warning("No hay trabajador activo: la factura sigue pendiente. Inícialo con python -m services.trabajos o actualiza más tarde.")
+                elif en_proceso:
+                    st.info("Factura guardada, generando sellos y PDF...")
+                elif estado == 'fallido':
+                    st.error("La factura se guardó, pero no se pudo generar su PDF")
+                else:
+                    # Mostrar un mensaje de éxito
+                    st.success("Factura generada con éxito")
+
+            with col2:
+                # Generar el PDF (o tomarlo de la caché) solo cuando el usuario lo pide
+                if not en_proceso and estado != 'fallido' and st.button("📄 Obtener PDF"):
+                    with tramo('obtener_pdf_factura', id_factura=id_factura):
+                        pdf_bytes = obtener_pdf_factura(db, id_factura)
+                    if pdf_bytes is None:
+                        st.warning(PDF_NO_DISPONIBLE)
+                    else:
+                        # Usa el ID, la fecha y hora formateada en el nombre del archivo
+                        st.download_button('⬇️ Descargar PDF', pdf_bytes, file_name=f'Factura-{id_factura}-{formatted_now}.pdf', mime='application/pdf')
+                # El XML del CFDI es el que se guardó al sellar la factura
+                if not en_proceso and estado != 'fallido' and st.button("🧾 Obtener XML"):
+                    with tramo('obtener_xml_factura', id_factura=id_factura):
+                        xml_bytes = obtener_xml_factura(db, id_factura)
+                    if xml_bytes is None:
+                        st.warning(XML_NO_DISPONIBLE)
+                    else:
+                        st.download_button('⬇️ Descargar XML', xml_bytes, file_name=f'Factura-{id_factura}-{formatted_now}.xml', mime='application/xml')
+                # Volver a consultar el estado a mano cuando ya no se consulta solo
+                if en_proceso and consultas_agotadas and st.button("🔃 Actualizar"):
+                    st.session_state["consultas_estado"] = 0
+                    st.rerun()
+
+            with col3:
+                # Borrar los campos de entrada
+                uso_destino_cfdi_placeholder.empty()
+                tipo_comprobante_clave_placeholder.empty()
+                regimen_fiscal_clave_placeholder.empty()
+                clave_producto_servicio_placeholder.empty()
+                cantidad_placeholder.empty()
+                metodo_pago_clave_placeholder.empty()
+                forma_pago_clave_placeholder.empty()
+
+                # Agregar un botón "Generar otra factura"
+                if st.button("🔄 Generar otra factura"):
+                    # Olvidar la factura generada y volver a mostrar el formulario
+                    del st.session_state["id_factura"]
+                    st.session_state.pop("consultar_estado", None)
+                    st.rerun()
+
+# Función para mostrar el historial de facturas del usuario
+def mostrar_historial_facturas(usuario: dict):
+    """
+    Muestra el historial de facturas del usuario por páginas y el detalle de la factura que se abra.
+
+    Cada página se pide a partir de la última factura de la anterior (paginación por llave); las llaves
+    de las páginas ya vistas se guardan en st.session_state para poder regresar. El código QR, los
+    sellos y el PDF solo se cargan para la factura abierta.
+
+    Args:
+        usuario (dict): Los datos del usuario de la sesión.
+
+    Returns:
+        None
+    """
+    st.subheader("📚 Historial de facturas")
+    # Llaves de inicio de las páginas visitadas; la última es la de la página actual
+    paginas = st.session_state.setdefault("historial_paginas", [None])
+
+    with get_db() as db:
+        pagina = obtener_historial_facturas(db, usuario['rfc_receptor'], despues=paginas[-1])
+
+        if not pagina['facturas']:
+            st.info("Aún no tienes facturas")
+            return
+
+        st.dataframe(
+            [{
+                'ID': factura['id'],
+                'Folio fiscal': factura['uuid'],
+                'Fecha': factura['fecha_expedicion'].strftime("%d/%m/%Y %H:%M"),
+                'Producto o servicio': factura['clave_producto_servicio'],
+                'Cantidad': factura['cantidad'],
+                'Total': f"${factura['total']:,.2f}",
+            } for factura in pagina['facturas']],
+            hide_index=True,
+            use_container_width=True,
+        )
+
+        col1, col2, col3 = st.columns([1, 1, 4])
+        with col1:
+            if len(paginas) > 1 and st.button("⬅️ Anteriores"):
+                paginas.pop()
+                st.rerun()
+        with col2:
+            if pagina['siguiente'] is not None and st.button("Siguientes ➡️"):
+                paginas.append(pagina['siguiente'])
+                st.rerun()
+        with col3:
+            st.caption(f"Página {len(paginas)}")
+
+        # Abrir una factura de la página: solo entonces se cargan el código QR y los sellos
+        id_factura = st.selectbox(
+            "Abrir factura",
+            [None] + [factura['id'] for factura in pagina['facturas']],
+            format_func=lambda id_factura: "Selecciona una factura" if id_factura is None else f"Factura {id_factura}",
+        )
+        if id_factura is None:
+            return
+
+        factura = obtener_detalle_factura(db, id_factura, usuario['rfc_receptor'])
+        if factura is None:
+            st.error("No se encontró la factura")
+            return
+
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            if factura['codigo_qr'] is not None:
+                st.image(bytes(factura['codigo_qr']), width=180)
+        with col2:
+            st.write(f"**Folio fiscal:** {factura['uuid']}")
+            st.write(f"**Total:** ${factura['total']:,.2f} ({factura['total_con_letra'] or ''})")
+            with st.expander("Sellos"):
+                st.text_area("Sello digital del CFDI", factura['sello_digital_cfdi'] or '', disabled=True)
+                st.text_area("Sello digital del SAT", factura['sello_digital_sat'] or '', disabled=True)
+                st.text_area("Cadena original del complemento de certificación", factura['cadena_original_complemento_certificacion'] or '', disabled=True)
+
+        # Solo las facturas ya selladas tienen PDF y XML
+        if factura['sello_digital_cfdi']:
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                if st.button("📄 Obtener PDF", key="historial_pdf"):
+                    pdf_bytes = obtener_pdf_factura(db, id_factura)
+                    if pdf_bytes is None:
+                        st.warning(PDF_NO_DISPONIBLE)
+                    else:
+                        st.download_button('⬇️ Descargar PDF', pdf_bytes, file_name=f'Factura-{id_factura}.pdf', mime='application/pdf', key="historial_descargar_pdf")
+            with col2:
+                if st.button("🧾 Obtener XML", key="historial_xml"):
+                    xml_bytes = obtener_xml_factura(db, id_factura)
+                    if xml_bytes is None:
+                        st.warning(XML_NO_DISPONIBLE)
+                    else:
+                        st.download_button('⬇️ Descargar XML', xml_bytes, file_name=f'Factura-{id_factura}.xml', mime='application/xml', key="historial_descargar_xml")
+        else:
+            st.info("La factura aún se está procesando")
+
+@st.cache_data(ttl=TABLERO_CACHE_TTL, show_spinner=False)
+def obtener_datos_tablero(desde):
+    """
+    Obtiene las series y los productos principales del tablero, con caché por periodo.
+
+    Args:
+        desde (date): El primer mes del periodo (None para todo el historial).
+
+    Returns:
+        tuple: (serie de ventas, productos principales), ver services/tablero.py.
+    """
+    with get_db() as db:
+        return serie_ventas(db, desde), productos_principales(db, desde)
+
+# Función para mostrar el tablero de ventas
+def mostrar_tablero():
+    """
+    Muestra el tablero de ventas: facturas, ventas e IVA en el tiempo y los productos más vendidos.
+
+    Returns:
+        None
+    """
+    st.subheader("📈 Tablero de ventas")
+    meses_atras = PERIODOS_TABLERO[st.selectbox("Periodo", list(PERIODOS_TABLERO))]
+    desde = None
+    if meses_atras is not None:
+        hoy = datetime.date.today()
+        indice_mes = hoy.year * 12 + hoy.month - 1 - (meses_atras - 1)
+        desde = datetime.date(indice_mes // 12, indice_mes % 12 + 1, 1)
+
+    serie, productos = obtener_datos_tablero(desde)
+    if not serie['serie']:
+        st.info("Aún no hay ventas en el periodo")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Facturas", f"{sum(punto['facturas'] for punto in serie['serie']):,.0f}")
+    col2.metric("Ventas", f"${sum(punto['total'] for punto in serie['serie']):,.2f}")
+    col3.metric("IVA trasladado", f"${sum(punto['iva'] for punto in serie['serie']):,.2f}")
+    if serie['meses_por_punto'] > 1:
+        st.caption(f"Cada punto junta {serie['meses_por_punto']} meses")
+
+    base = alt.Chart(alt.Data(values=serie['serie'])).encode(x=alt.X('periodo:T', title='Periodo'))
+    st.altair_chart(
+        base.mark_bar().encode(y=alt.Y('facturas:Q', title='Facturas'), tooltip=['periodo:T', 'facturas:Q']),
+        use_container_width=True,
+    )
+    st.altair_chart(
+        base.transform_fold(['total', 'iva'], as_=['concepto', 'importe']).mark_line(point=True).encode(
+            y=alt.Y('importe:Q', title='Importe'),
+            color=alt.Color('concepto:N', title='Concepto'),
+            tooltip=['periodo:T', 'concepto:N', alt.Tooltip('importe:Q', format=',.2f')],
+        ),
+        use_container_width=True,
+    )
+
+    st.write("**Productos y servicios más vendidos**")
+    st.altair_chart(
+        alt.Chart(alt.Data(values=productos)).mark_bar().encode(
+            x=alt.X('total:Q', title='Ventas'),
+            y=alt.Y('descripcion:N', title=None, sort='-x'),
+            tooltip=['clave_producto_servicio:N', 'descripcion:N', 'facturas:Q', 'cantidad:Q', alt.Tooltip('total:Q', format=',.2f')],
+        ),
+        use_container_width=True,
+    )
+
+# Función para descargar los extractos contables
+def mostrar_extractos():
+    """
+    Muestra el formulario para descargar el extracto contable de facturas o recibos de un rango de fechas.
+
+    El extracto se escribe por lotes en un archivo temporal (un ZIP con un archivo por mes si se pide)
+    y se ofrece para descargar.
+
+    Returns:
+        None
+    """
+    st.subheader("📊 Extractos contables")
+    hoy = datetime.date.today()
+    col1, col2 = st.columns(2)
+    with col1:
+        tipo = st.selectbox("Documentos", ["facturas", "recibos"], format_func=str.capitalize)
+        desde = st.date_input("Desde", hoy.replace(day=1))
+        por_mes = st.checkbox("Un archivo por mes")
+    with col2:
+        formato = st.selectbox("Formato", sorted(ESCRITORES), format_func=str.upper)
+        hasta = st.date_input("Hasta", hoy)
+
+    if st.button("📦 Generar extracto"):
+        if desde > hasta:
+            st.error("La fecha inicial debe ser anterior a la final")
+            return
+        archivo = tempfile.TemporaryFile()
+        with st.spinner("Generando extracto..."):
+            with get_db() as db:
+                archivos = exportar_extracto_zip(db, tipo, desde, hasta, archivo, formato=formato, por_mes=por_mes)
+        archivo.seek(0)
+        st.success(f"{sum(archivos.values())} filas en {len(archivos)} archivo(s)")
+        st.download_button('⬇️ Descargar extracto', archivo, file_name=f'{tipo}_{desde}_{hasta}.zip', mime='application/zip')
+
+# Función para mostrar el panel de depuración con las últimas trazas
+def mostrar_trazas():
+    """
+    Muestra en la barra lateral la línea de tiempo de las últimas trazas (ver services/trazas.py).
+
+    Returns:
+        None
+    """
+    with st.sidebar.expander("🐞 Trazas"):
+        trazas = registro_trazas.ultimas(TRAZAS_PANEL_CANTIDAD)
+        if not trazas:
+            st.info("Todavía no hay trazas")
+            return
+
+        lineas = [linea_de_tiempo(documento) for documento in trazas]
+        indice = st.selectbox(
+            "Traza", range(len(trazas)),
+            format_func=lambda i: f"{lineas[i][0]['tramo']} · {lineas[i][0]['duracion_ms']:.1f} ms" if lineas[i] else "(vacía)",
+        )
+        linea = lineas[indice]
+        for tramo_linea in linea:
+            tramo_linea['etapa'] = '  ' * tramo_linea['profundidad'] + tramo_linea['tramo']
+        st.altair_chart(
+            alt.Chart(alt.Data(values=linea)).mark_bar().encode(
+                x=alt.X('inicio_ms:Q', title="ms"),
+                x2='fin_ms:Q',
+                y=alt.Y('etapa:N', sort=None, title=None),
+                color=alt.condition("datum.error != ''", alt.value('firebrick'), alt.value('steelblue')),
+                tooltip=['tramo:N', alt.Tooltip('duracion_ms:Q', format='.2f'), 'error:N'],
+            ),
+            use_container_width=True,
+        )
+        st.dataframe(
+            [{'Etapa': tramo_linea['etapa'], 'Inicio (ms)': round(tramo_linea['inicio_ms'], 2), 'Duración (ms)': round(tramo_linea['duracion_ms'], 2)} for tramo_linea in linea],
+            hide_index=True,
+        )
+
 # Si el script se ejecuta como el script principal, llamar a la función main
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Servir las métricas de SQL si se configuró SQL_METRICAS_PUERTO (una vez por proceso)
+    iniciar_servidor_metricas()
+    # Medir todas las sentencias SQL de esta ejecución del script
+    with medir_sql('ejecucion'):
+        main()
\ No newline at end of file
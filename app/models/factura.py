@@ -5,7 +5,7 @@ Este archivo define las clases que representan entidades relacionadas con las fa
 Cada clase define una tabla en la base de datos utilizando SQLAlchemy para el mapeo objeto-relacional (ORM).
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Text, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, Text, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -37,7 +37,7 @@ class ProductoServicio(Base):
     clave_producto_servicio = Column(String(10), primary_key=True, unique=True, nullable=False)  # Clave única del producto o servicio
     unidad = Column(String(255), nullable=False)  # Unidad del producto o servicio
     descripcion = Column(String(255), nullable=False)  # Descripción del producto o servicio
-    precio_unitario = Column(Float, nullable=False)  # Precio unitario del producto o servicio
+    precio_unitario = Column(Numeric(10, 2), nullable=False)  # Precio unitario del producto o servicio
 
     facturas = relationship("Factura", back_populates="producto_servicio")  # Relación con la tabla Factura: un producto o servicio puede estar asociado a múltiples facturas
 
@@ -104,7 +104,11 @@ class FacturaPDF(Base):
 
     id = Column(Integer, primary_key=True, index=True)  # Identificador único del PDF de la factura
     id_factura = Column(Integer, ForeignKey("facturas.id"))  # Identificador de la factura asociada al PDF
-    pdf = Column(LargeBinary)  # Contenido binario del PDF
+    pdf = Column(LargeBinary)  # Contenido binario del PDF (solo filas anteriores al almacén de documentos)
+    hash_sha256 = Column(String(64))  # SHA-256 del PDF en el almacén de documentos
+    version_plantilla = Column(String(16))  # Versión de la plantilla con la que se generó el PDF
+
+    __table_args__ = (UniqueConstraint('id_factura', 'version_plantilla'),)  # Un PDF por factura y versión de plantilla
     
     facturas = relationship("Factura", back_populates="facturas_pdf")  # Relación con la tabla Factura: un PDF de factura está asociado a una factura
 
@@ -115,29 +119,33 @@ class Factura(Base):
     __tablename__ = 'facturas'
 
     id = Column(Integer, primary_key=True)  # Identificador único de la factura
+    uuid = Column(String(36), unique=True)  # Folio fiscal (UUID) de la factura
     nombre_empresa = Column(String(50), default='FARMACIAS DE DIOS', nullable=False)  # Nombre de la empresa emisora de la factura
-    uso_destino_cfdi_clave = Column(Integer, ForeignKey('uso_destino_cfdi.clave'), nullable=False)  # Clave del uso o destino del CFDI
+    uso_destino_cfdi_clave = Column(String(4), ForeignKey('uso_destino_cfdi.clave'), nullable=False)  # Clave del uso o destino del CFDI
     lugar_expedicion = Column(String(20), default='CIUDAD DE MÉXICO', nullable=False)  # Lugar de expedición de la factura
     fecha_expedicion = Column(DateTime, nullable=False)  # Fecha de expedición de la factura
     rfc_emisor = Column(String(20), default='FARA2402035H8', nullable=False)  # RFC del emisor de la factura
-    tipo_comprobante_clave = Column(Integer, ForeignKey('tipo_comprobante.clave'), nullable=False)  # Clave del tipo de comprobante
-    regimen_fiscal_clave = Column(Integer, ForeignKey('regimen_fiscal.clave'), nullable=False)  # Clave del régimen fiscal del emisor
+    tipo_comprobante_clave = Column(String(1), ForeignKey('tipo_comprobante.clave'), nullable=False)  # Clave del tipo de comprobante
+    regimen_fiscal_clave = Column(String(3), ForeignKey('regimen_fiscal.clave'), nullable=False)  # Clave del régimen fiscal del emisor
     rfc_receptor = Column(String(20), ForeignKey('usuarios.rfc_receptor'), nullable=False)  # RFC del receptor asociado a la factura
     clave_producto_servicio = Column(String(10), ForeignKey('productos_servicios.clave_producto_servicio'), nullable=False)  # Clave del producto o servicio incluido en la factura
     cantidad = Column(Integer, nullable=False)  # Cantidad de productos o servicios incluidos en la factura
-    importe = Column(Float, nullable=False)  # Importe total de la factura
-    subtotal = Column(Float, nullable=False)  # Subtotal de la factura
-    iva = Column(Float, nullable=False)  # IVA (Impuesto al Valor Agregado) de la factura
-    total = Column(Float, nullable=False)  # Total de la factura
-    total_con_letra = Column(String(255), nullable=False)  # Total en letra de la factura
+    importe = Column(Numeric(10, 2), nullable=False)  # Importe total de la factura
+    subtotal = Column(Numeric(10, 2), nullable=False)  # Subtotal de la factura
+    ieps = Column(Numeric(10, 2), default=0, nullable=False)  # IEPS (Impuesto Especial sobre Producción y Servicios) de la factura
+    iva = Column(Numeric(10, 2), nullable=False)  # IVA (Impuesto al Valor Agregado) de la factura
+    retenciones = Column(Numeric(10, 2), default=0, nullable=False)  # Retenciones de IVA e ISR de la factura
+    total = Column(Numeric(10, 2), nullable=False)  # Total de la factura
+    total_con_letra = Column(String(255))  # Total en letra de la factura
     moneda = Column(String(20), default='MXN PESOS MEXICANOS', nullable=False)  # Moneda en la que está expresada la factura
-    tipo_cambio = Column(Float, default=0.00, nullable=False)  # Tipo de cambio en caso de que la moneda sea distinta de pesos mexicanos
-    metodo_pago_clave = Column(Integer, ForeignKey('metodos_pago.clave'), nullable=False)  # Clave del método de pago
-    forma_pago_clave = Column(Integer, ForeignKey('formas_pago.clave'), nullable=False)  # Clave de la forma de pago
-    sello_digital_cfdi = Column(Text, nullable=False)  # Sello digital del CFDI (Comprobante Fiscal Digital por Internet)
-    sello_digital_sat = Column(Text, nullable=False)  # Sello digital del SAT (Servicio de Administración Tributaria)
-    cadena_original_complemento_certificacion = Column(Text, nullable=False)  # Cadena original del complemento de certificación
-    codigo_qr = Column(String, nullable=False)  # Código QR de la factura
+    tipo_cambio = Column(Numeric(10, 2), default=0.00, nullable=False)  # Tipo de cambio en caso de que la moneda sea distinta de pesos mexicanos
+    metodo_pago_clave = Column(String(3), ForeignKey('metodos_pago.clave'), nullable=False)  # Clave del método de pago
+    forma_pago_clave = Column(String(2), ForeignKey('formas_pago.clave'), nullable=False)  # Clave de la forma de pago
+    sello_digital_cfdi = Column(Text)  # Sello digital del CFDI (Comprobante Fiscal Digital por Internet)
+    sello_digital_sat = Column(Text)  # Sello digital del SAT (Servicio de Administración Tributaria)
+    cadena_original_complemento_certificacion = Column(Text)  # Cadena original del complemento de certificación
+    codigo_qr = Column(String)  # Código QR de la factura (los datos fiscales los completa el trabajo procesar_factura)
+    xml_sha256 = Column(String(64))  # SHA-256 del XML sellado en el almacén de documentos
 
     # Relaciones con otras tablas
     usuario = relationship("Usuario", back_populates="facturas")
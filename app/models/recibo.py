@@ -137,7 +137,8 @@ class ReciboPDF(Base):
     
     id = Column(Integer, primary_key=True)  # Identificador único para cada recibo PDF
     id_recibo = Column(Integer, ForeignKey('recibos_nomina.id'), nullable=False)  # ID del recibo de nómina asociado
-    pdf = Column(LargeBinary, nullable=False)  # PDF del recibo de nómina
+    pdf = Column(LargeBinary)  # PDF del recibo de nómina (solo filas anteriores al almacén de documentos)
+    hash_sha256 = Column(String(64))  # SHA-256 del PDF en el almacén de documentos
     
     recibos_nomina = relationship("ReciboNomina", back_populates="recibos_pdf")  # Relación con la tabla ReciboNomina: un recibo PDF puede estar asociado a múltiples recibos de nómina
 
@@ -152,6 +153,7 @@ class Recibo(Base):
         __tablename__ = 'recibos_nomina'
     
         id = Column(Integer, primary_key=True)  # Identificador único para cada recibo
+        uuid = Column(String(36), unique=True)  # Folio fiscal (UUID) del recibo
         nombre_empresa = Column(String(50), default='FARMACIAS DE DIOS', nullable=False)  # Nombre de la empresa
         # uso_destino_cfdi_clave = Column(Integer, ForeignKey('uso_destino_cfdi.clave'), nullable=False)  # Clave del uso o destino CFDI
         lugar_expedicion = Column(String(20), default='CIUDAD DE MÉXICO', nullable=False)  # Lugar de expedición de la factura
@@ -178,6 +180,7 @@ class Recibo(Base):
         sello_digital_sat = Column(Text, nullable=False)  # Sello digital SAT
         cadena_original_complemento_certificacion = Column(Text, nullable=False)  # Cadena original complemento certificación
         codigo_qr = Column(String, nullable=False)  # Código QR
+        xml_sha256 = Column(String(64))  # SHA-256 del XML sellado en el almacén de documentos
     
         # Relaciones con otras tablas
         empleado = relationship("Empleado", back_populates="recibos_nomina")
@@ -0,0 +1,318 @@
+# services/agregados.py
+
+"""
+Este archivo define los agregados de ventas e impuestos de las facturas para los reportes.
+
+La tabla resumen_ventas guarda, por mes × producto o servicio × forma de pago × método de pago, el
+número de facturas, la cantidad vendida y la suma de sus importes. Se actualiza de forma incremental
+en la misma transacción en que se insertan las facturas (crear_factura y crear_facturas_lote): las
+facturas nuevas se agrupan en memoria y se suman con un solo INSERT ... ON CONFLICT DO UPDATE. Los
+reportes leen únicamente esta tabla, así que su costo depende del número de meses y productos, no
+del número de facturas.
+
+Para conciliar, el resumen se puede recalcular desde cero a partir de facturas. Se ejecuta desde el
+directorio app:
+
+    python -m services.agregados --reconstruir
+    python -m services.agregados --verificar
+"""
+
+import argparse
+import sys
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import Date, Integer, Numeric, column, delete, extract, func, select, table, text
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.orm import Session
+
+from models import Factura
+from services.database import get_db
+
+# Columnas que identifican cada fila del resumen
+LLAVE_RESUMEN = ['mes', 'clave_producto_servicio', 'forma_pago_clave', 'metodo_pago_clave']
+
+# Importes de las facturas que se suman en el resumen
+IMPORTES_RESUMEN = ['subtotal', 'ieps', 'iva', 'retenciones', 'total']
+
+# Campos de una factura que se necesitan para sumarla al resumen
+CAMPOS_RESUMEN = ['fecha_expedicion', 'clave_producto_servicio', 'forma_pago_clave', 'metodo_pago_clave', 'cantidad', *IMPORTES_RESUMEN]
+
+# Tabla del resumen con las columnas definidas en Database.sql
+resumen_ventas = table(
+    'resumen_ventas',
+    column('mes', Date),
+    column('clave_producto_servicio'),
+    column('forma_pago_clave'),
+    column('metodo_pago_clave'),
+    column('facturas', Integer),
+    column('cantidad', Integer),
+    *[column(importe, Numeric(14, 2)) for importe in IMPORTES_RESUMEN],
+)
+
+# INSERT ... ON CONFLICT de cada controlador (las dos variantes tienen la misma interfaz)
+INSERCIONES = {
+    'postgresql': insert_postgresql,
+    'sqlite': insert_sqlite,
+}
+
+
+def _mes(fecha):
+    """
+    Obtiene el primer día del mes de una fecha.
+    """
+    return date(fecha.year, fecha.month, 1)
+
+
+def agrupar_facturas(facturas):
+    """
+    Agrupa facturas por la llave del resumen y suma sus importes.
+
+    Args:
+        facturas (iterable): Diccionarios con los campos de CAMPOS_RESUMEN.
+
+    Returns:
+        dict: Un diccionario de llave (mes, producto, forma de pago, método de pago) a los valores sumados.
+    """
+    grupos = {}
+    for factura in facturas:
+        llave = (_mes(factura['fecha_expedicion']), factura['clave_producto_servicio'], factura['forma_pago_clave'], factura['metodo_pago_clave'])
+        grupo = grupos.get(llave)
+        if grupo is None:
+            grupo = grupos[llave] = {'facturas': 0, 'cantidad': 0, **{importe: Decimal(0) for importe in IMPORTES_RESUMEN}}
+        grupo['facturas'] += 1
+        grupo['cantidad'] += int(factura['cantidad'])
+        for importe in IMPORTES_RESUMEN:
+            grupo[importe] += Decimal(str(factura.get(importe) or 0))
+    return grupos
+
+
+def _filas_resumen(grupos):
+    # Ordenadas por llave para que dos transacciones concurrentes bloqueen las filas en el mismo orden
+    return [dict(zip(LLAVE_RESUMEN, llave), **valores) for llave, valores in sorted(grupos.items())]
+
+
+def acumular_facturas(db: Session, facturas):
+    """
+    Suma facturas recién insertadas al resumen de ventas, en la transacción de la sesión.
+
+    Debe llamarse antes del commit que guarda las facturas, para que el resumen y las facturas se
+    confirmen (o se descarten) juntos.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        facturas (iterable): Las facturas insertadas (ver agrupar_facturas).
+
+    Returns:
+        int: El número de filas del resumen actualizadas.
+    """
+    filas = _filas_resumen(agrupar_facturas(facturas))
+    if not filas:
+        return 0
+    sentencia = INSERCIONES[db.get_bind().dialect.name](resumen_ventas)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=LLAVE_RESUMEN,
+        set_={
+            nombre: resumen_ventas.c[nombre] + sentencia.excluded[nombre]
+            for nombre in ['facturas', 'cantidad', *IMPORTES_RESUMEN]
+        },
+    )
+    db.execute(sentencia, filas)
+    return len(filas)
+
+
+def calcular_resumen(db: Session):
+    """
+    Calcula el resumen de ventas desde cero con una consulta agrupada sobre facturas.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+
+    Returns:
+        dict: Un diccionario de llave (mes, producto, forma de pago, método de pago) a los valores sumados.
+    """
+    año = extract('year', Factura.fecha_expedicion)
+    mes = extract('month', Factura.fecha_expedicion)
+    consulta = select(
+        año, mes, Factura.clave_producto_servicio, Factura.forma_pago_clave, Factura.metodo_pago_clave,
+        func.count(), func.sum(Factura.cantidad), *[func.sum(getattr(Factura, importe)) for importe in IMPORTES_RESUMEN],
+    ).group_by(año, mes, Factura.clave_producto_servicio, Factura.forma_pago_clave, Factura.metodo_pago_clave)
+
+    grupos = {}
+    for año_fila, mes_fila, producto, forma_pago, metodo_pago, facturas, cantidad, *importes in db.execute(consulta):
+        grupos[(date(int(año_fila), int(mes_fila), 1), producto, forma_pago, metodo_pago)] = {
+            'facturas': facturas,
+            'cantidad': int(cantidad),
+            **{nombre: Decimal(str(valor)).quantize(Decimal('0.01')) for nombre, valor in zip(IMPORTES_RESUMEN, importes)},
+        }
+    return grupos
+
+
+def leer_resumen(db: Session):
+    """
+    Lee el resumen de ventas guardado.
+
+    Returns:
+        dict: Un diccionario de llave a valores, con el formato de calcular_resumen().
+    """
+    return {
+        tuple(fila[nombre] for nombre in LLAVE_RESUMEN): {nombre: fila[nombre] for nombre in ['facturas', 'cantidad', *IMPORTES_RESUMEN]}
+        for fila in db.execute(select(resumen_ventas)).mappings()
+    }
+
+
+def diferencias_resumen(guardado, calculado):
+    """
+    Obtiene las llaves cuyo resumen guardado no coincide con el calculado desde cero.
+
+    Returns:
+        list: Las llaves con diferencias, ordenadas.
+    """
+    return sorted(llave for llave in guardado.keys() | calculado.keys() if guardado.get(llave) != calculado.get(llave))
+
+
+def reconstruir_resumen(db: Session):
+    """
+    Recalcula el resumen de ventas desde cero y reemplaza el guardado, en una sola transacción.
+
+    En PostgreSQL la tabla del resumen se bloquea (EXCLUSIVE) antes de leer las facturas: las
+    transacciones que crean facturas esperan en su actualización del resumen hasta que termina la
+    reconstrucción, así que ninguna factura se cuenta dos veces ni se pierde.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+
+    Returns:
+        dict: 'filas' (las filas del resumen nuevo) y 'diferencias' (las llaves que no coincidían).
+    """
+    try:
+        if db.get_bind().dialect.name == 'postgresql':
+            db.execute(text("LOCK TABLE resumen_ventas IN EXCLUSIVE MODE"))
+        guardado = leer_resumen(db)
+        calculado = calcular_resumen(db)
+        db.execute(delete(resumen_ventas))
+        filas = _filas_resumen(calculado)
+        if filas:
+            db.execute(resumen_ventas.insert(), filas)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {'filas': len(filas), 'diferencias': diferencias_resumen(guardado, calculado)}
+
+
+def _periodo(consulta, desde: date = None, hasta: date = None):
+    if desde is not None:
+        consulta = consulta.where(resumen_ventas.c.mes >= _mes(desde))
+    if hasta is not None:
+        consulta = consulta.where(resumen_ventas.c.mes <= _mes(hasta))
+    return consulta
+
+
+def ventas_por_mes_producto(db: Session, desde: date = None, hasta: date = None):
+    """
+    Obtiene las ventas de cada producto o servicio por mes.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): Solo los meses a partir del de esta fecha.
+        hasta (date): Solo los meses hasta el de esta fecha.
+
+    Returns:
+        list: Diccionarios con mes, clave_producto_servicio, facturas, cantidad, subtotal y total.
+    """
+    consulta = select(
+        resumen_ventas.c.mes,
+        resumen_ventas.c.clave_producto_servicio,
+        func.sum(resumen_ventas.c.facturas).label('facturas'),
+        func.sum(resumen_ventas.c.cantidad).label('cantidad'),
+        func.sum(resumen_ventas.c.subtotal).label('subtotal'),
+        func.sum(resumen_ventas.c.total).label('total'),
+    ).group_by(resumen_ventas.c.mes, resumen_ventas.c.clave_producto_servicio).order_by(resumen_ventas.c.mes, resumen_ventas.c.clave_producto_servicio)
+    return [dict(fila) for fila in db.execute(_periodo(consulta, desde, hasta)).mappings()]
+
+
+def ventas_por_producto(db: Session, desde: date = None, hasta: date = None, limite: int = None):
+    """
+    Obtiene las ventas de cada producto o servicio en el periodo, de la mayor a la menor.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): Solo los meses a partir del de esta fecha.
+        hasta (date): Solo los meses hasta el de esta fecha.
+        limite (int): El número máximo de productos (None para todos).
+
+    Returns:
+        list: Diccionarios con clave_producto_servicio, facturas, cantidad y total.
+    """
+    total = func.sum(resumen_ventas.c.total).label('total')
+    consulta = select(
+        resumen_ventas.c.clave_producto_servicio,
+        func.sum(resumen_ventas.c.facturas).label('facturas'),
+        func.sum(resumen_ventas.c.cantidad).label('cantidad'),
+        total,
+    ).group_by(resumen_ventas.c.clave_producto_servicio).order_by(total.desc(), resumen_ventas.c.clave_producto_servicio).limit(limite)
+    return [dict(fila) for fila in db.execute(_periodo(consulta, desde, hasta)).mappings()]
+
+
+def impuestos_por_mes(db: Session, desde: date = None, hasta: date = None):
+    """
+    Obtiene por mes el número de facturas, las ventas y los impuestos (IVA trasladado, IEPS y retenciones).
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): Solo los meses a partir del de esta fecha.
+        hasta (date): Solo los meses hasta el de esta fecha.
+
+    Returns:
+        list: Diccionarios con mes, facturas, subtotal, ieps, iva, retenciones y total.
+    """
+    consulta = select(
+        resumen_ventas.c.mes,
+        func.sum(resumen_ventas.c.facturas).label('facturas'),
+        *[func.sum(resumen_ventas.c[importe]).label(importe) for importe in IMPORTES_RESUMEN],
+    ).group_by(resumen_ventas.c.mes).order_by(resumen_ventas.c.mes)
+    return [dict(fila) for fila in db.execute(_periodo(consulta, desde, hasta)).mappings()]
+
+
+def totales_por_pago(db: Session, desde: date = None, hasta: date = None):
+    """
+    Obtiene el total facturado por forma de pago y método de pago.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): Solo los meses a partir del de esta fecha.
+        hasta (date): Solo los meses hasta el de esta fecha.
+
+    Returns:
+        list: Diccionarios con forma_pago_clave, metodo_pago_clave, facturas y total.
+    """
+    consulta = select(
+        resumen_ventas.c.forma_pago_clave,
+        resumen_ventas.c.metodo_pago_clave,
+        func.sum(resumen_ventas.c.facturas).label('facturas'),
+        func.sum(resumen_ventas.c.total).label('total'),
+    ).group_by(resumen_ventas.c.forma_pago_clave, resumen_ventas.c.metodo_pago_clave).order_by(resumen_ventas.c.forma_pago_clave, resumen_ventas.c.metodo_pago_clave)
+    return [dict(fila) for fila in db.execute(_periodo(consulta, desde, hasta)).mappings()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula o verifica el resumen de ventas a partir de las facturas.")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--reconstruir', action='store_true', help="Recalcula el resumen desde cero y lo reemplaza")
+    grupo.add_argument('--verificar', action='store_true', help="Solo compara el resumen guardado con el recalculado")
+    argumentos = parser.parse_args()
+
+    with get_db() as db:
+        if argumentos.reconstruir:
+            resultado = reconstruir_resumen(db)
+            diferencias = resultado['diferencias']
+            print(f"Resumen reconstruido: {resultado['filas']} filas")
+        else:
+            diferencias = diferencias_resumen(leer_resumen(db), calcular_resumen(db))
+
+    for mes, producto, forma_pago, metodo_pago in diferencias:
+        print(f"Diferencia: {mes:%Y-%m} producto {producto} forma de pago {forma_pago} método de pago {metodo_pago}")
+    print(f"Diferencias: {len(diferencias)}")
+    sys.exit(1 if argumentos.verificar and diferencias else 0)
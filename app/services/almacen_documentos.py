@@ -0,0 +1,234 @@
+# services/almacen_documentos.py
+
+"""
+Este archivo define el almacén de documentos (PDF de facturas y recibos) fuera de la base de datos.
+
+Los documentos se guardan por contenido: su nombre es el SHA-256 de sus bytes, por lo que un mismo
+PDF se guarda una sola vez. Las tablas facturas_pdf y recibos_pdf solo registran ese hash. El almacén
+se elige con DOCUMENTOS_ALMACEN (por ahora solo 'local') y el directorio con DOCUMENTOS_RUTA.
+
+Los PDF que todavía están como BYTEA en la base de datos se mueven al almacén con (desde el directorio app):
+
+    python -m services.almacen_documentos --lote 200
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+
+from sqlalchemy import LargeBinary, column, select, table, update
+
+from services.database import get_db
+
+TAMAÑO_BLOQUE = 64 * 1024  # Bytes por bloque al leer documentos
+
+# Tablas de PDF con las columnas definidas en Database.sql
+facturas_pdf = table(
+    'facturas_pdf',
+    column('id'),
+    column('id_factura'),
+    column('version_plantilla'),
+    column('pdf', LargeBinary),
+    column('hash_sha256'),
+)
+
+recibos_pdf = table(
+    'recibos_pdf',
+    column('id'),
+    column('id_recibo'),
+    column('pdf', LargeBinary),
+    column('hash_sha256'),
+)
+
+
+class AlmacenDocumentos(ABC):
+    """
+    Interfaz de los almacenes de documentos. Cada documento se identifica por el SHA-256 de su contenido.
+    """
+
+    @abstractmethod
+    def guardar(self, contenido):
+        """
+        Guarda un documento si no existe todavía.
+
+        Args:
+            contenido (bytes): Los bytes del documento.
+
+        Returns:
+            str: El SHA-256 del documento en hexadecimal.
+        """
+
+    @abstractmethod
+    def existe(self, hash_sha256):
+        """
+        Indica si un documento está en el almacén.
+        """
+
+    @abstractmethod
+    def leer_bloques(self, hash_sha256, tamaño_bloque=TAMAÑO_BLOQUE):
+        """
+        Lee un documento por bloques, sin cargarlo completo en memoria.
+
+        Args:
+            hash_sha256 (str): El SHA-256 del documento.
+            tamaño_bloque (int): El número de bytes de cada bloque.
+
+        Returns:
+            iterator: Los bloques de bytes del documento.
+        """
+
+    def leer(self, hash_sha256):
+        """
+        Lee un documento completo.
+
+        Args:
+            hash_sha256 (str): El SHA-256 del documento.
+
+        Returns:
+            bytes: Los bytes del documento.
+        """
+        return b''.join(self.leer_bloques(hash_sha256))
+
+
+class AlmacenLocal(AlmacenDocumentos):
+    """
+    Almacén de documentos en el sistema de archivos local.
+
+    Los archivos se reparten en subdirectorios por los primeros caracteres del hash
+    (por ejemplo, ab/cd/abcd...) para no acumular miles de archivos en un mismo directorio.
+    """
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+
+    def ruta(self, hash_sha256):
+        """
+        Obtiene la ruta del archivo de un documento.
+
+        Args:
+            hash_sha256 (str): El SHA-256 del documento.
+
+        Returns:
+            str: La ruta absoluta del archivo.
+        """
+        if len(hash_sha256) != 64 or not all(caracter in '0123456789abcdef' for caracter in hash_sha256):
+            raise ValueError(f"Hash de documento no válido: {hash_sha256}")
+        return os.path.join(self.raiz, hash_sha256[:2], hash_sha256[2:4], hash_sha256)
+
+    def guardar(self, contenido):
+        hash_sha256 = hashlib.sha256(contenido).hexdigest()
+        ruta = self.ruta(hash_sha256)
+        if os.path.exists(ruta):
+            # El mismo contenido ya está guardado
+            return hash_sha256
+
+        directorio = os.path.dirname(ruta)
+        os.makedirs(directorio, exist_ok=True)
+        # Escribir en un archivo temporal del mismo directorio y renombrarlo, para que nunca
+        # se pueda leer un documento a medio escribir
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=directorio, prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                archivo.write(contenido)
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            os.replace(ruta_temporal, ruta)
+        except BaseException:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+            raise
+        return hash_sha256
+
+    def existe(self, hash_sha256):
+        return os.path.exists(self.ruta(hash_sha256))
+
+    def leer_bloques(self, hash_sha256, tamaño_bloque=TAMAÑO_BLOQUE):
+        with open(self.ruta(hash_sha256), 'rb') as archivo:
+            while True:
+                bloque = archivo.read(tamaño_bloque)
+                if not bloque:
+                    break
+                yield bloque
+
+
+# Almacenes disponibles por nombre
+ALMACENES = {
+    'local': lambda: AlmacenLocal(os.getenv('DOCUMENTOS_RUTA', 'documentos')),
+}
+
+
+def crear_almacen(nombre=None):
+    """
+    Crea el almacén de documentos configurado.
+
+    Args:
+        nombre (str): El nombre del almacén. Por omisión, el de la variable DOCUMENTOS_ALMACEN.
+
+    Returns:
+        AlmacenDocumentos: El almacén de documentos.
+    """
+    nombre = nombre or os.getenv('DOCUMENTOS_ALMACEN', 'local')
+    if nombre not in ALMACENES:
+        raise ValueError(f"Almacén de documentos no soportado: {nombre}")
+    return ALMACENES[nombre]()
+
+
+# Almacén compartido por todo el proceso
+almacen = crear_almacen()
+
+
+def migrar_tabla(db, tabla, tamaño_lote=200, al_progresar=None):
+    """
+    Mueve al almacén los PDF guardados como BYTEA en una tabla, por lotes.
+
+    Cada lote se confirma en su propia transacción, así que la migración se puede interrumpir
+    y reanudar: solo se procesan las filas que todavía no tienen hash.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        tabla (TableClause): La tabla de PDF (facturas_pdf o recibos_pdf).
+        tamaño_lote (int): El número de filas por transacción.
+        al_progresar (callable): Función que recibe el número de filas migradas después de cada lote.
+
+    Returns:
+        int: El número de filas migradas.
+    """
+    migradas = 0
+    ultimo_id = 0
+    while True:
+        consulta = (
+            select(tabla.c.id, tabla.c.pdf)
+            .where(tabla.c.id > ultimo_id, tabla.c.hash_sha256.is_(None), tabla.c.pdf.is_not(None))
+            .order_by(tabla.c.id)
+            .limit(tamaño_lote)
+        )
+        filas = db.execute(consulta).all()
+        if not filas:
+            break
+
+        for id_fila, pdf in filas:
+            hash_sha256 = almacen.guardar(bytes(pdf))
+            db.execute(update(tabla).where(tabla.c.id == id_fila).values(hash_sha256=hash_sha256, pdf=None))
+        db.commit()
+
+        ultimo_id = filas[-1][0]
+        migradas += len(filas)
+        if al_progresar:
+            al_progresar(migradas)
+    return migradas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mueve los PDF guardados en la base de datos al almacén de documentos.")
+    parser.add_argument('--lote', type=int, default=200, help="Filas por transacción")
+    argumentos = parser.parse_args()
+
+    with get_db() as db:
+        for tabla in (facturas_pdf, recibos_pdf):
+            def mostrar_progreso(migradas, nombre=tabla.name):
+                print(f"{nombre}: {migradas} PDF migrados")
+
+            total = migrar_tabla(db, tabla, argumentos.lote, mostrar_progreso)
+            print(f"{tabla.name}: migración terminada ({total} PDF)")
@@ -0,0 +1,153 @@
+# services/catalogo_cache.py
+
+"""
+Este archivo define una caché en memoria, compartida por todo el proceso, para los catálogos del SAT.
+
+Cada catálogo se consulta una sola vez y después se sirve desde memoria. Para detectar cambios
+hechos directamente en la base de datos se consulta la tabla `catalogos_version` (mantenida por
+disparadores, ver Database.sql) como máximo una vez cada CATALOGOS_INTERVALO_VERIFICACION segundos.
+Si la tabla no existe, los catálogos simplemente se recargan al cumplirse ese intervalo. Si la
+consulta falla por otra causa (por ejemplo una desconexión), se conservan los catálogos en memoria
+y se vuelve a consultar en la siguiente verificación.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from services.database import engine
+
+
+# SQLSTATE de PostgreSQL para una tabla inexistente (undefined_table)
+TABLA_INEXISTENTE = '42P01'
+
+
+def _tabla_inexistente(error):
+    """
+    Indica si un error de la base de datos se debe a que la tabla consultada no existe.
+
+    Args:
+        error (Exception): El error de la consulta.
+
+    Returns:
+        bool: True para undefined_table de PostgreSQL o "no such table" de SQLite.
+    """
+    if not isinstance(error, (ProgrammingError, OperationalError)):
+        return False
+    original = error.orig
+    codigo = getattr(original, 'sqlstate', None) or getattr(original, 'pgcode', None)
+    if codigo is not None:
+        return codigo == TABLA_INEXISTENTE
+    mensaje = str(original).lower()
+    return 'no such table' in mensaje or ('relation' in mensaje and 'does not exist' in mensaje)
+
+
+class CacheCatalogos:
+    """
+    Caché de catálogos indexada por tabla y por nombre de la vista en memoria.
+    """
+
+    def __init__(self, intervalo_verificacion=30.0):
+        self.intervalo_verificacion = intervalo_verificacion  # Segundos entre verificaciones de versión
+        self._candado = threading.RLock()
+        self._entradas = {}  # (tabla, nombre) -> (versión, valor)
+        self._versiones = {}  # tabla -> versión vigente en la base de datos
+        self._ultima_verificacion = 0.0
+        self._versiones_disponibles = True
+
+    def obtener(self, db, tabla, cargador, nombre='opciones'):
+        """
+        Obtiene un catálogo desde la caché, cargándolo de la base de datos si es necesario.
+
+        Args:
+            db (Session): La sesión de la base de datos.
+            tabla (str): El nombre de la tabla de la que depende el catálogo.
+            cargador (callable): Función que recibe la sesión y devuelve el valor a almacenar.
+            nombre (str): El nombre de la vista del catálogo, para tablas con más de una.
+
+        Returns:
+            object: El valor almacenado para el catálogo.
+        """
+        self._verificar_versiones()
+        with self._candado:
+            version = self._versiones.get(tabla, 0)
+            entrada = self._entradas.get((tabla, nombre))
+            if entrada is not None and entrada[0] == version:
+                return entrada[1]
+
+        valor = cargador(db)
+        with self._candado:
+            self._entradas[(tabla, nombre)] = (version, valor)
+        return valor
+
+    def invalidar(self, tabla=None):
+        """
+        Elimina de la caché los catálogos de una tabla, o todos si no se indica ninguna.
+
+        Args:
+            tabla (str): El nombre de la tabla a invalidar.
+
+        Returns:
+            None
+        """
+        with self._candado:
+            if tabla is None:
+                self._entradas.clear()
+                self._versiones.clear()
+            else:
+                for clave in [clave for clave in self._entradas if clave[0] == tabla]:
+                    del self._entradas[clave]
+            self._ultima_verificacion = 0.0
+
+    def _verificar_versiones(self):
+        """
+        Consulta las versiones de los catálogos si ya transcurrió el intervalo de verificación.
+        """
+        ahora = time.monotonic()
+        with self._candado:
+            if ahora - self._ultima_verificacion < self.intervalo_verificacion:
+                return
+            self._ultima_verificacion = ahora
+
+        if not self._versiones_disponibles:
+            # Sin tabla de versiones, se recargan todos los catálogos al cumplirse el intervalo
+            self.invalidar()
+            with self._candado:
+                self._ultima_verificacion = ahora
+            return
+
+        try:
+            # Se usa una conexión propia para no afectar la transacción de la sesión del usuario
+            with engine.connect() as conexion:
+                filas = conexion.execute(text("SELECT tabla, version FROM catalogos_version")).all()
+        except Exception as error:
+            if _tabla_inexistente(error):
+                self._versiones_disponibles = False
+                self.invalidar()
+                with self._candado:
+                    self._ultima_verificacion = ahora
+            # Con cualquier otro error se conservan los catálogos y se reintenta en la siguiente verificación
+            return
+
+        with self._candado:
+            self._versiones = {tabla: version for tabla, version in filas}
+
+
+# Caché de catálogos compartida por todo el proceso
+catalogos = CacheCatalogos(float(os.environ.get('CATALOGOS_INTERVALO_VERIFICACION', 30)))
+
+
+def invalidar_catalogos(tabla=None):
+    """
+    Invalida la caché de catálogos del proceso.
+
+    Args:
+        tabla (str): El nombre de la tabla a invalidar. Si no se indica, se invalidan todas.
+
+    Returns:
+        None
+    """
+    catalogos.invalidar(tabla)
@@ -0,0 +1,191 @@
+# services/documentos.py
+
+"""
+Este archivo define la carga de los datos de las facturas y los recibos de nómina para generar sus PDF.
+
+Cada lote de documentos se lee con una sola consulta que proyecta solo las columnas que usa el PDF,
+sin construir objetos del ORM ni recorrer sus relaciones. Las descripciones de los catálogos (uso de
+CFDI, forma de pago, etc.) se toman de la caché de catálogos del proceso (ver services/catalogo_cache.py)
+y cada documento se devuelve como un diccionario con las mismas llaves que esperan las plantillas.
+"""
+
+from sqlalchemy import column, select, table
+from sqlalchemy.orm import Session
+
+from models import Factura
+from services.catalogo_cache import catalogos
+from services.tablas_nomina import empleados, recibos_nomina
+
+# Documentos que se leen por consulta al cargar muchos a la vez
+TAMAÑO_LOTE = 500
+
+# Catálogos cuya descripción aparece en el PDF de la factura: prefijo de la llave -> (tabla, columna clave, columna de la factura)
+CATALOGOS_FACTURA = {
+    'uso_destino_cfdi': ('uso_destino_cfdi', 'clave', Factura.uso_destino_cfdi_clave),
+    'tipo_comprobante': ('tipo_comprobante', 'clave', Factura.tipo_comprobante_clave),
+    'regimen_fiscal': ('regimen_fiscal', 'clave', Factura.regimen_fiscal_clave),
+    'metodo_pago': ('metodos_pago', 'clave', Factura.metodo_pago_clave),
+    'forma_pago': ('formas_pago', 'clave', Factura.forma_pago_clave),
+}
+
+# Columnas de la factura que usa el PDF (sin relaciones ni columnas que no se dibujan)
+COLUMNAS_FACTURA = [
+    Factura.id,
+    Factura.nombre_empresa,
+    Factura.lugar_expedicion,
+    Factura.fecha_expedicion,
+    Factura.rfc_emisor,
+    Factura.rfc_receptor,
+    Factura.clave_producto_servicio,
+    Factura.cantidad,
+    Factura.importe,
+    Factura.subtotal,
+    Factura.iva,
+    Factura.total,
+    Factura.total_con_letra,
+    Factura.moneda,
+    Factura.tipo_cambio,
+    Factura.sello_digital_cfdi,
+    Factura.sello_digital_sat,
+    Factura.cadena_original_complemento_certificacion,
+    Factura.codigo_qr,
+] + [columna for _, _, columna in CATALOGOS_FACTURA.values()]
+
+# Columnas del empleado que se muestran en el recibo
+COLUMNAS_EMPLEADO = [
+    'numero_empleado', 'curp', 'nss', 'fecha_ingreso', 'sueldo_base', 'puesto_id', 'departamento_id',
+    'riesgo_id', 'tipo_jornada', 'tipo_contrato', 'periodicidad_pago',
+]
+
+# Columnas del recibo que usa el PDF (sin el folio fiscal ni el XML sellado)
+COLUMNAS_RECIBO = [columna for columna in recibos_nomina.c if columna.name not in ('uuid', 'xml_sha256')]
+
+
+def descripciones_catalogo(db: Session, tabla: str, columna_clave: str = 'clave'):
+    """
+    Obtiene la descripción de cada clave de un catálogo, desde la caché de catálogos.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        tabla (str): El nombre de la tabla del catálogo.
+        columna_clave (str): El nombre de la columna con la clave.
+
+    Returns:
+        dict: Un diccionario de clave a descripción.
+    """
+    catalogo = table(tabla, column(columna_clave), column('descripcion'))
+
+    def cargar(db):
+        return dict(db.execute(select(catalogo.c[columna_clave], catalogo.c.descripcion)).all())
+
+    return catalogos.obtener(db, tabla, cargar, nombre='descripciones')
+
+
+def _a_bytes(valor):
+    return bytes(valor) if valor is not None else None
+
+
+def cargar_facturas(db: Session, ids_factura):
+    """
+    Carga los datos para el PDF de varias facturas con una sola consulta.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        ids_factura (list): Los IDs de las facturas.
+
+    Returns:
+        dict: Un diccionario de ID de factura a sus datos (las facturas que no existen no aparecen).
+    """
+    descripciones = {prefijo: descripciones_catalogo(db, tabla, clave) for prefijo, (tabla, clave, _) in CATALOGOS_FACTURA.items()}
+    productos = descripciones_catalogo(db, 'productos_servicios', 'clave_producto_servicio')
+
+    facturas = {}
+    for fila in db.execute(select(*COLUMNAS_FACTURA).where(Factura.id.in_(list(ids_factura)))).mappings():
+        datos = dict(fila)
+        for prefijo, (_, _, columna) in CATALOGOS_FACTURA.items():
+            clave = datos.pop(columna.key)
+            datos[f"{prefijo}_clave"] = clave
+            datos[f"{prefijo}_descripcion"] = descripciones[prefijo].get(clave)
+        datos['descripcion_producto_servicio'] = productos.get(datos['clave_producto_servicio'])
+        datos['codigo_qr'] = _a_bytes(datos['codigo_qr'])
+        facturas[datos.pop('id')] = datos
+    return facturas
+
+
+def cargar_factura(db: Session, id_factura: int):
+    """
+    Carga los datos para el PDF de una factura.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        id_factura (int): El ID de la factura.
+
+    Returns:
+        dict: Los datos de la factura, o None si no existe.
+    """
+    return cargar_facturas(db, [id_factura]).get(id_factura)
+
+
+def cargar_recibos(db: Session, ids_recibo):
+    """
+    Carga los datos para el PDF de varios recibos de nómina, con los de su empleado, en una sola consulta.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        ids_recibo (list): Los IDs de los recibos.
+
+    Returns:
+        dict: Un diccionario de ID de recibo a sus datos (los recibos que no existen no aparecen).
+    """
+    consulta = (
+        select(
+            *COLUMNAS_RECIBO,
+            *[empleados.c[nombre].label(f"empleado_{nombre}") for nombre in COLUMNAS_EMPLEADO],
+        )
+        .join_from(recibos_nomina, empleados, empleados.c.numero_empleado == recibos_nomina.c.empleado)
+        .where(recibos_nomina.c.id.in_(list(ids_recibo)))
+    )
+
+    recibos = {}
+    for fila in db.execute(consulta).mappings():
+        datos = {nombre: valor for nombre, valor in fila.items() if not nombre.startswith('empleado_')}
+        datos['empleado'] = {nombre: fila[f"empleado_{nombre}"] for nombre in COLUMNAS_EMPLEADO}
+        datos['codigo_qr'] = _a_bytes(datos['codigo_qr'])
+        recibos[datos['id']] = datos
+    return recibos
+
+
+def cargar_recibo(db: Session, id_recibo: int):
+    """
+    Carga los datos para el PDF de un recibo de nómina.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        id_recibo (int): El ID del recibo de nómina.
+
+    Returns:
+        dict: Los datos del recibo, o None si no existe.
+    """
+    return cargar_recibos(db, [id_recibo]).get(id_recibo)
+
+
+def por_lotes(ids, cargar, db: Session, tamaño_lote: int = TAMAÑO_LOTE):
+    """
+    Carga los datos de muchos documentos por lotes, una consulta por lote.
+
+    Args:
+        ids (iterable): Los IDs de los documentos.
+        cargar (callable): cargar_facturas o cargar_recibos.
+        db (Session): La sesión de la base de datos.
+        tamaño_lote (int): El número de documentos por consulta.
+
+    Yields:
+        tuple: (id, datos) de cada documento que existe, en el orden de ids.
+    """
+    ids = list(ids)
+    for inicio in range(0, len(ids), tamaño_lote):
+        lote = ids[inicio:inicio + tamaño_lote]
+        documentos = cargar(db, lote)
+        for id_documento in lote:
+            if id_documento in documentos:
+                yield id_documento, documentos[id_documento]
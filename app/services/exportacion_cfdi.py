@@ -0,0 +1,172 @@
+# services/exportacion_cfdi.py
+
+"""
+Este archivo define la exportación masiva del XML de los CFDI (facturas y recibos de nómina) a un ZIP.
+
+Los comprobantes de un rango de fechas se leen con un cursor del servidor por lotes de filas y cada
+XML, el que se guardó al sellar el comprobante, se escribe directamente en su entrada del ZIP, sin
+guardar los XML ni las filas en memoria. Lo único que crece con el número de comprobantes es el índice del ZIP (unos
+cien bytes por archivo). Se ejecuta desde el directorio app:
+
+    python -m services.exportacion_cfdi --desde 2024-01-01 --hasta 2024-01-31 --salida facturas.zip
+    python -m services.exportacion_cfdi --recibos --desde 2024-01-01 --hasta 2024-01-31 --salida recibos.zip
+"""
+
+import argparse
+import zipfile
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Factura
+from services.database import get_db
+from services.factura_service import xml_factura
+from services.nomina_service import xml_recibo
+from services.tablas_nomina import empleados, recibos_nomina
+
+TAMAÑO_LOTE = 1000  # Filas que se traen de la base de datos a la vez
+
+# Columnas de las facturas que forman el XML (sin el código QR)
+COLUMNAS_FACTURA = [columna for columna in Factura.__table__.columns if columna.name != 'codigo_qr']
+
+
+def rango_fechas(columna, desde: date, hasta: date):
+    """
+    Condición para las fechas de desde a hasta, ambas incluidas. La usan también los extractos contables.
+
+    Args:
+        columna (ColumnElement): La columna de fecha y hora.
+        desde (date): La primera fecha.
+        hasta (date): La última fecha (incluida).
+
+    Returns:
+        ColumnElement: La condición.
+    """
+    return (columna >= datetime.combine(desde, time())) & (columna < datetime.combine(hasta + timedelta(days=1), time()))
+
+
+def consulta_facturas(desde: date, hasta: date):
+    """
+    Consulta de las facturas expedidas en un rango de fechas, en orden de expedición.
+
+    Args:
+        desde (date): La primera fecha de expedición.
+        hasta (date): La última fecha de expedición (incluida).
+
+    Returns:
+        Select: La consulta.
+    """
+    return (
+        select(*COLUMNAS_FACTURA)
+        .where(rango_fechas(Factura.fecha_expedicion, desde, hasta))
+        .order_by(Factura.fecha_expedicion, Factura.id)
+    )
+
+
+def consulta_recibos(desde: date, hasta: date):
+    """
+    Consulta de los recibos de nómina expedidos en un rango de fechas, con los datos de su empleado.
+
+    Args:
+        desde (date): La primera fecha de expedición.
+        hasta (date): La última fecha de expedición (incluida).
+
+    Returns:
+        Select: La consulta.
+    """
+    return (
+        select(
+            *[columna for columna in recibos_nomina.c if columna.name != 'codigo_qr'],
+            empleados.c.curp, empleados.c.nss, empleados.c.fecha_ingreso, empleados.c.tipo_contrato,
+            empleados.c.tipo_jornada, empleados.c.riesgo_id, empleados.c.periodicidad_pago,
+        )
+        .join_from(recibos_nomina, empleados, empleados.c.numero_empleado == recibos_nomina.c.empleado)
+        .where(rango_fechas(recibos_nomina.c.fecha_expedicion, desde, hasta))
+        .order_by(recibos_nomina.c.fecha_expedicion, recibos_nomina.c.id)
+    )
+
+
+def _exportar(db: Session, consulta, destino, obtener_xml, carpeta, tamaño_lote, al_progresar):
+    """
+    Escribe en un ZIP el XML de los comprobantes que devuelve una consulta.
+
+    Returns:
+        dict: 'exportados' (el número de XML escritos) y 'omitidos' (comprobantes aún sin sellar o
+        cuyo XML no puede reconstruirse).
+    """
+    exportados = omitidos = 0
+    filas = db.execute(consulta.execution_options(yield_per=tamaño_lote)).mappings()
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archivo_zip:
+        for fila in filas:
+            xml = obtener_xml(fila)
+            if xml is None:
+                omitidos += 1
+                continue
+
+            entrada = zipfile.ZipInfo(f"{carpeta}/{fila['uuid']}.xml", date_time=fila['fecha_expedicion'].timetuple()[:6])
+            entrada.compress_type = zipfile.ZIP_DEFLATED
+            with archivo_zip.open(entrada, 'w') as salida:
+                salida.write(xml)
+
+            exportados += 1
+            if al_progresar and exportados % tamaño_lote == 0:
+                al_progresar(exportados)
+    return {'exportados': exportados, 'omitidos': omitidos}
+
+
+def exportar_facturas_zip(db: Session, desde: date, hasta: date, destino, tamaño_lote: int = TAMAÑO_LOTE, al_progresar=None):
+    """
+    Exporta a un ZIP el XML de las facturas expedidas en un rango de fechas.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): La primera fecha de expedición.
+        hasta (date): La última fecha de expedición (incluida).
+        destino (str | file): La ruta del ZIP o un archivo binario abierto para escritura.
+        tamaño_lote (int): El número de filas que se leen a la vez.
+        al_progresar (callable): Función que recibe el número de XML exportados después de cada lote.
+
+    Returns:
+        dict: 'exportados' (el número de XML escritos) y 'omitidos' (facturas aún sin sellar o cuyo XML no
+        puede reconstruirse).
+    """
+    return _exportar(db, consulta_facturas(desde, hasta), destino, lambda fila: xml_factura(db, fila), 'facturas', tamaño_lote, al_progresar)
+
+
+def exportar_recibos_zip(db: Session, desde: date, hasta: date, destino, tamaño_lote: int = TAMAÑO_LOTE, al_progresar=None):
+    """
+    Exporta a un ZIP el XML de los recibos de nómina expedidos en un rango de fechas.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): La primera fecha de expedición.
+        hasta (date): La última fecha de expedición (incluida).
+        destino (str | file): La ruta del ZIP o un archivo binario abierto para escritura.
+        tamaño_lote (int): El número de filas que se leen a la vez.
+        al_progresar (callable): Función que recibe el número de XML exportados después de cada lote.
+
+    Returns:
+        dict: 'exportados' (el número de XML escritos) y 'omitidos' (recibos sin sellar o cuyo XML no puede
+        reconstruirse).
+    """
+    return _exportar(db, consulta_recibos(desde, hasta), destino, xml_recibo, 'recibos', tamaño_lote, al_progresar)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta a un ZIP el XML de los CFDI de un rango de fechas.")
+    parser.add_argument('--desde', type=date.fromisoformat, required=True, help="Primera fecha en formato AAAA-MM-DD")
+    parser.add_argument('--hasta', type=date.fromisoformat, required=True, help="Última fecha en formato AAAA-MM-DD")
+    parser.add_argument('--salida', required=True, help="Ruta del archivo ZIP")
+    parser.add_argument('--recibos', action='store_true', help="Exporta los recibos de nómina en lugar de las facturas")
+    parser.add_argument('--lote', type=int, default=TAMAÑO_LOTE, help="Filas que se leen a la vez")
+    argumentos = parser.parse_args()
+
+    def mostrar_progreso(exportados):
+        print(f"{exportados} XML exportados")
+
+    exportar = exportar_recibos_zip if argumentos.recibos else exportar_facturas_zip
+    with get_db() as db:
+        resultado = exportar(db, argumentos.desde, argumentos.hasta, argumentos.salida, argumentos.lote, mostrar_progreso)
+
+    print(f"XML exportados: {resultado['exportados']} (omitidos: {resultado['omitidos']})")
@@ -0,0 +1,243 @@
+# services/extractos.py
+
+"""
+Este archivo define los extractos contables de facturas y recibos de nómina en CSV o Parquet.
+
+Las filas de un rango de fechas se leen con un cursor del servidor (yield_per) y se escriben por
+lotes: en CSV fila por fila y en Parquet un grupo de filas por lote, así que la memoria usada no
+depende del tamaño del rango. El extracto puede dividirse en un archivo por mes. Se ejecuta desde
+el directorio app:
+
+    python -m services.extractos facturas --desde 2024-01-01 --hasta 2024-03-31 --formato parquet --por-mes --directorio extractos
+"""
+
+import argparse
+import csv
+import io
+import os
+import zipfile
+from datetime import date
+from itertools import groupby
+
+from sqlalchemy import Date, DateTime, Float, Integer, Numeric, select
+from sqlalchemy.orm import Session
+
+from models import Factura
+from services.database import get_db
+from services.exportacion_cfdi import rango_fechas
+from services.tablas_nomina import recibos_nomina
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+TAMAÑO_LOTE = 5000  # Filas que se traen de la base de datos (y se escriben) a la vez
+
+# Columnas que no forman parte de los extractos (binarias o solo para el CFDI)
+COLUMNAS_EXCLUIDAS = {'codigo_qr', 'sello_digital_cfdi', 'sello_digital_sat', 'cadena_original_complemento_certificacion'}
+
+# Tablas de los extractos: tipo -> tabla
+TABLAS = {
+    'facturas': Factura.__table__,
+    'recibos': recibos_nomina,
+}
+
+
+class EscritorCSV:
+    """
+    Escribe las filas de un extracto como CSV en UTF-8, con encabezado.
+    """
+
+    extension = 'csv'
+
+    def __init__(self, salida, columnas):
+        self._texto = io.TextIOWrapper(salida, encoding='utf-8', newline='', write_through=True)
+        self._csv = csv.writer(self._texto)
+        self._csv.writerow([columna.name for columna in columnas])
+
+    def escribir(self, filas):
+        self._csv.writerows(filas)
+
+    def cerrar(self):
+        self._texto.flush()
+        # Devolver el archivo sin cerrarlo
+        self._texto.detach()
+
+
+class EscritorParquet:
+    """
+    Escribe las filas de un extracto como Parquet, un grupo de filas por lote.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, salida, columnas):
+        if pa is None:
+            raise RuntimeError("Para exportar a Parquet instala pyarrow")
+        self._esquema = pa.schema([(columna.name, _tipo_arrow(columna.type)) for columna in columnas])
+        self._escritor = pq.ParquetWriter(salida, self._esquema, compression='zstd')
+
+    def escribir(self, filas):
+        columnas = list(zip(*filas)) or [[] for _ in self._esquema]
+        self._escritor.write_table(pa.Table.from_arrays(
+            [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, self._esquema)],
+            schema=self._esquema,
+        ))
+
+    def cerrar(self):
+        self._escritor.close()
+
+
+ESCRITORES = {
+    'csv': EscritorCSV,
+    'parquet': EscritorParquet,
+}
+
+
+def _tipo_arrow(tipo):
+    """
+    Obtiene el tipo de Parquet de una columna a partir de su tipo de SQLAlchemy.
+    """
+    if isinstance(tipo, Integer):
+        return pa.int64()
+    if isinstance(tipo, Numeric) and not isinstance(tipo, Float):
+        return pa.decimal128(tipo.precision or 18, tipo.scale or 2)
+    if isinstance(tipo, Float):
+        return pa.float64()
+    if isinstance(tipo, DateTime):
+        return pa.timestamp('us')
+    if isinstance(tipo, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def columnas_extracto(tipo: str):
+    """
+    Obtiene las columnas del extracto de facturas o de recibos.
+
+    Args:
+        tipo (str): 'facturas' o 'recibos'.
+
+    Returns:
+        list: Las columnas de la tabla, sin las de COLUMNAS_EXCLUIDAS.
+    """
+    return [columna for columna in TABLAS[tipo].columns if columna.name not in COLUMNAS_EXCLUIDAS]
+
+
+def exportar_extracto(db: Session, tipo: str, desde: date, hasta: date, abrir, formato: str = 'csv',
+                      por_mes: bool = False, tamaño_lote: int = TAMAÑO_LOTE):
+    """
+    Escribe el extracto de las facturas o los recibos expedidos en un rango de fechas.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        tipo (str): 'facturas' o 'recibos'.
+        desde (date): La primera fecha de expedición.
+        hasta (date): La última fecha de expedición (incluida).
+        abrir (callable): Función que recibe el nombre de un archivo y devuelve un archivo binario abierto para escritura.
+        formato (str): 'csv' o 'parquet'.
+        por_mes (bool): Si es True se escribe un archivo por mes de expedición (solo los meses con filas).
+        tamaño_lote (int): El número de filas que se leen y se escriben a la vez.
+
+    Returns:
+        dict: Un diccionario de nombre de archivo a número de filas escritas.
+    """
+    escritor_clase = ESCRITORES[formato]
+    columnas = columnas_extracto(tipo)
+    tabla = TABLAS[tipo]
+    indice_fecha = [columna.name for columna in columnas].index('fecha_expedicion')
+
+    consulta = (
+        select(*columnas)
+        .where(rango_fechas(tabla.c.fecha_expedicion, desde, hasta))
+        .order_by(tabla.c.fecha_expedicion, tabla.c.id)
+        .execution_options(yield_per=tamaño_lote)
+    )
+
+    def nombre_archivo(mes):
+        periodo = f"{mes[0]}-{mes[1]:02d}" if por_mes else f"{desde.isoformat()}_{hasta.isoformat()}"
+        return f"{tipo}_{periodo}.{escritor_clase.extension}"
+
+    def mes_fila(fila):
+        return (fila[indice_fecha].year, fila[indice_fecha].month) if por_mes else None
+
+    archivos = {}
+    salida = escritor = None
+    mes_actual = ()
+    try:
+        for lote in db.execute(consulta).partitions():
+            for mes, filas in groupby(lote, key=mes_fila):
+                if mes != mes_actual:
+                    if escritor is not None:
+                        escritor.cerrar()
+                        salida.close()
+                    nombre = nombre_archivo(mes)
+                    salida = abrir(nombre)
+                    escritor = escritor_clase(salida, columnas)
+                    archivos[nombre] = 0
+                    mes_actual = mes
+                filas = list(filas)
+                escritor.escribir(filas)
+                archivos[nombre] += len(filas)
+
+        # Un extracto sin filas escribe un archivo vacío (solo si no se divide por mes)
+        if escritor is None and not por_mes:
+            nombre = nombre_archivo(None)
+            salida = abrir(nombre)
+            escritor = escritor_clase(salida, columnas)
+            archivos[nombre] = 0
+    finally:
+        if escritor is not None:
+            escritor.cerrar()
+            salida.close()
+    return archivos
+
+
+def exportar_extracto_directorio(db: Session, tipo: str, desde: date, hasta: date, directorio: str, **opciones):
+    """
+    Escribe el extracto en archivos dentro de un directorio (ver exportar_extracto).
+
+    Returns:
+        dict: Un diccionario de nombre de archivo a número de filas escritas.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    return exportar_extracto(db, tipo, desde, hasta, lambda nombre: open(os.path.join(directorio, nombre), 'wb'), **opciones)
+
+
+def exportar_extracto_zip(db: Session, tipo: str, desde: date, hasta: date, destino, **opciones):
+    """
+    Escribe el extracto en un ZIP, un archivo por entrada (ver exportar_extracto).
+
+    Args:
+        destino (str | file): La ruta del ZIP o un archivo binario abierto para escritura.
+
+    Returns:
+        dict: Un diccionario de nombre de archivo a número de filas escritas.
+    """
+    # El Parquet ya está comprimido; el CSV se comprime en el ZIP
+    compresion = zipfile.ZIP_STORED if opciones.get('formato') == 'parquet' else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(destino, 'w', compression=compresion, allowZip64=True) as archivo_zip:
+        return exportar_extracto(db, tipo, desde, hasta, lambda nombre: archivo_zip.open(nombre, 'w', force_zip64=True), **opciones)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta el extracto contable de facturas o recibos de nómina.")
+    parser.add_argument('tipo', choices=sorted(TABLAS), help="Documentos que se exportan")
+    parser.add_argument('--desde', type=date.fromisoformat, required=True, help="Primera fecha en formato AAAA-MM-DD")
+    parser.add_argument('--hasta', type=date.fromisoformat, required=True, help="Última fecha en formato AAAA-MM-DD")
+    parser.add_argument('--formato', choices=sorted(ESCRITORES), default='csv', help="Formato de los archivos")
+    parser.add_argument('--por-mes', action='store_true', help="Escribe un archivo por mes")
+    parser.add_argument('--directorio', default='.', help="Directorio de salida")
+    parser.add_argument('--lote', type=int, default=TAMAÑO_LOTE, help="Filas que se leen a la vez")
+    argumentos = parser.parse_args()
+
+    with get_db() as db:
+        archivos = exportar_extracto_directorio(
+            db, argumentos.tipo, argumentos.desde, argumentos.hasta, argumentos.directorio,
+            formato=argumentos.formato, por_mes=argumentos.por_mes, tamaño_lote=argumentos.lote,
+        )
+
+    for nombre, filas in archivos.items():
+        print(f"{nombre}: {filas} filas")
@@ -0,0 +1,241 @@
+# services/impuestos.py
+
+"""
+Este archivo define el motor de impuestos y totales de las facturas.
+
+Los conceptos se reciben por columnas (cantidades, valores unitarios y tasas) y los importes, el IEPS,
+el IVA y las retenciones de todos ellos se calculan de una sola vez con aritmética entera de numpy.
+Los importes se manejan en centavos y las cantidades, los valores unitarios y las tasas en millonésimas
+(los seis decimales de TasaOCuota en el catálogo del SAT), por lo que los resultados son exactos: solo
+el importe de cada concepto y cada impuesto se redondean a dos decimales, a partir de la mitad hacia
+arriba (1.5 × 10.005 = 15.0075 da un importe de 15.01). La base del IVA incluye el IEPS.
+
+Las tasas de cada producto o servicio se guardan en la tabla perfiles_impuestos; los productos sin
+perfil usan PERFIL_POR_OMISION (solo IVA al 16%).
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from sqlalchemy import Numeric, column, select, table
+
+from services.catalogo_cache import catalogos
+
+ESCALA_IMPORTE = 100  # Centavos por peso
+ESCALA_CANTIDAD = 10 ** 6  # Las cantidades admiten hasta seis decimales
+ESCALA_VALOR_UNITARIO = 10 ** 6  # Los valores unitarios admiten hasta seis decimales
+ESCALA_TASA = 10 ** 6  # Las tasas admiten hasta seis decimales
+
+# Exponente de cada escala, para convertir Decimal con scaleb()
+_EXPONENTES = {ESCALA_IMPORTE: 2, ESCALA_CANTIDAD: 6, ESCALA_VALOR_UNITARIO: 6, ESCALA_TASA: 6}
+
+# Límite de los enteros de numpy; por encima, los productos se calculan con enteros de Python
+_MAXIMO_INT64 = 2 ** 63 - 1
+
+# Impuestos que se calculan por concepto
+IMPUESTOS = ('ieps', 'iva', 'retencion_iva', 'retencion_isr')
+
+# Tasas de los productos o servicios que no tienen un perfil en perfiles_impuestos
+PERFIL_POR_OMISION = {
+    'iva': Decimal('0.160000'),
+    'ieps': Decimal('0'),
+    'retencion_iva': Decimal('0'),
+    'retencion_isr': Decimal('0'),
+}
+
+# Tabla de perfiles de impuestos con las columnas definidas en Database.sql
+perfiles_impuestos = table(
+    'perfiles_impuestos',
+    column('clave_producto_servicio'),
+    column('tasa_iva', Numeric(7, 6)),
+    column('tasa_ieps', Numeric(7, 6)),
+    column('tasa_retencion_iva', Numeric(7, 6)),
+    column('tasa_retencion_isr', Numeric(7, 6)),
+)
+
+
+def _escalar(valores, escala):
+    """
+    Convierte una columna de números en enteros multiplicados por la escala, redondeando a partir de la mitad.
+
+    Las listas de Decimal, cadenas o enteros se convierten sin pasar por float; los arreglos de numpy
+    de tipo float se redondean directamente.
+    """
+    if isinstance(valores, np.ndarray) and valores.dtype.kind in 'iu':
+        if valores.size == 0 or int(np.abs(valores).max()) * escala <= _MAXIMO_INT64:
+            return valores.astype(np.int64) * escala
+        return _a_arreglo([valor * escala for valor in valores.tolist()])
+    if isinstance(valores, np.ndarray) and valores.dtype.kind == 'f':
+        return np.floor(valores * escala + 0.5).astype(np.int64)
+
+    # Las columnas suelen repetir valores (tasas, precios), así que cada valor distinto se convierte una vez
+    convertidos = {}
+    enteros = []
+    for valor in valores:
+        entero = convertidos.get(valor)
+        if entero is None:
+            if isinstance(valor, int):
+                entero = valor * escala
+            else:
+                if isinstance(valor, Decimal):
+                    decimal = valor
+                elif isinstance(valor, float):
+                    decimal = Decimal(repr(float(valor)))
+                else:
+                    decimal = Decimal(str(valor))
+                entero = int(decimal.scaleb(_EXPONENTES[escala]).to_integral_value(ROUND_HALF_UP))
+            convertidos[valor] = entero
+        enteros.append(entero)
+    return _a_arreglo(enteros)
+
+
+def _a_arreglo(enteros):
+    """
+    Crea un arreglo de enteros de 64 bits, o de enteros de Python si algún valor no cabe.
+    """
+    try:
+        return np.array(enteros, dtype=np.int64)
+    except OverflowError:
+        return np.array(enteros, dtype=object)
+
+
+def _multiplicar(a, b):
+    """
+    Multiplica dos columnas de enteros sin desbordarse.
+    """
+    if a.dtype == np.int64 and b.dtype == np.int64 and a.size and int(a.max()) * int(b.max()) > _MAXIMO_INT64:
+        a, b = a.astype(object), b.astype(object)
+    return a * b
+
+
+def _dividir_redondeando(numerador, divisor):
+    """
+    Divide columnas de enteros no negativos, redondeando a partir de la mitad hacia arriba.
+    """
+    return (numerador + divisor // 2) // divisor
+
+
+def calcular_conceptos(cantidades, valores_unitarios, tasas_iva, tasas_ieps=None, tasas_retencion_iva=None, tasas_retencion_isr=None):
+    """
+    Calcula el importe y los impuestos de muchos conceptos a la vez.
+
+    Args:
+        cantidades (sequence): La cantidad de cada concepto.
+        valores_unitarios (sequence): El valor unitario de cada concepto, en pesos.
+        tasas_iva (sequence): La tasa de IVA de cada concepto, por ejemplo Decimal('0.16').
+        tasas_ieps (sequence): La tasa de IEPS de cada concepto (ninguno si se omite).
+        tasas_retencion_iva (sequence): La tasa de retención de IVA de cada concepto (ninguna si se omite).
+        tasas_retencion_isr (sequence): La tasa de retención de ISR de cada concepto (ninguna si se omite).
+
+    Returns:
+        dict: Arreglos con 'importe', 'ieps', 'iva', 'retencion_iva' y 'retencion_isr' de cada concepto, en centavos.
+    """
+    cantidades = _escalar(cantidades, ESCALA_CANTIDAD)
+    valores_unitarios = _escalar(valores_unitarios, ESCALA_VALOR_UNITARIO)
+    numero_conceptos = len(cantidades)
+    tasas = {}
+    for impuesto, columna in zip(IMPUESTOS, (tasas_ieps, tasas_iva, tasas_retencion_iva, tasas_retencion_isr)):
+        tasas[impuesto] = np.zeros(numero_conceptos, dtype=np.int64) if columna is None else _escalar(columna, ESCALA_TASA)
+
+    for nombre, columna in (('cantidades', cantidades), ('valores unitarios', valores_unitarios), *tasas.items()):
+        if len(columna) != numero_conceptos:
+            raise ValueError(f"Las columnas de {nombre} y cantidades tienen distinta longitud")
+        if numero_conceptos and columna.min() < 0:
+            raise ValueError(f"La columna de {nombre} tiene valores negativos")
+
+    # El producto está en millonésimas de millonésimas de peso; se redondea una sola vez, a centavos
+    importe = _dividir_redondeando(_multiplicar(cantidades, valores_unitarios), ESCALA_CANTIDAD * ESCALA_VALOR_UNITARIO // ESCALA_IMPORTE)
+    ieps = _dividir_redondeando(_multiplicar(importe, tasas['ieps']), ESCALA_TASA)
+    return {
+        'importe': importe,
+        'ieps': ieps,
+        'iva': _dividir_redondeando(_multiplicar(importe + ieps, tasas['iva']), ESCALA_TASA),
+        'retencion_iva': _dividir_redondeando(_multiplicar(importe, tasas['retencion_iva']), ESCALA_TASA),
+        'retencion_isr': _dividir_redondeando(_multiplicar(importe, tasas['retencion_isr']), ESCALA_TASA),
+    }
+
+
+def totalizar_conceptos(conceptos, facturas=None, numero_facturas=None):
+    """
+    Suma los importes e impuestos de los conceptos, en total o por factura.
+
+    Args:
+        conceptos (dict): Los arreglos que devuelve calcular_conceptos().
+        facturas (sequence): El índice de la factura de cada concepto. Si se omite, todos los conceptos son de una sola factura.
+        numero_facturas (int): El número de facturas (por omisión, el mayor índice más uno).
+
+    Returns:
+        dict: 'subtotal', 'ieps', 'iva', 'retencion_iva', 'retencion_isr' y 'total'. Sin facturas, como Decimal
+        en pesos; con facturas, como listas de Decimal en pesos, una por factura.
+    """
+    columnas = ('importe',) + IMPUESTOS
+    if facturas is None:
+        sumas = {nombre: int(conceptos[nombre].sum()) for nombre in columnas}
+    else:
+        facturas = np.asarray(facturas, dtype=np.intp)
+        if numero_facturas is None:
+            numero_facturas = int(facturas.max()) + 1 if facturas.size else 0
+        sumas = {}
+        for nombre in columnas:
+            suma = np.zeros(numero_facturas, dtype=conceptos[nombre].dtype)
+            np.add.at(suma, facturas, conceptos[nombre])
+            sumas[nombre] = suma
+
+    sumas['total'] = sumas['importe'] + sumas['ieps'] + sumas['iva'] - sumas['retencion_iva'] - sumas['retencion_isr']
+    totales = {'subtotal': sumas.pop('importe'), **sumas}
+    if facturas is None:
+        return {nombre: a_pesos(valor) for nombre, valor in totales.items()}
+    return {nombre: [a_pesos(valor) for valor in valores.tolist()] for nombre, valores in totales.items()}
+
+
+def a_pesos(centavos):
+    """
+    Convierte un importe en centavos a pesos con dos decimales.
+
+    Args:
+        centavos (int): El importe en centavos.
+
+    Returns:
+        Decimal: El importe en pesos.
+    """
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def obtener_perfiles_impuestos(db):
+    """
+    Obtiene las tasas de impuestos de los productos o servicios que tienen un perfil.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+
+    Returns:
+        dict: Un diccionario de clave del producto o servicio a sus tasas ('iva', 'ieps', 'retencion_iva' y 'retencion_isr').
+    """
+    def cargar(db):
+        consulta = select(
+            perfiles_impuestos.c.clave_producto_servicio,
+            perfiles_impuestos.c.tasa_iva,
+            perfiles_impuestos.c.tasa_ieps,
+            perfiles_impuestos.c.tasa_retencion_iva,
+            perfiles_impuestos.c.tasa_retencion_isr,
+        )
+        return {clave: dict(zip(('iva', 'ieps', 'retencion_iva', 'retencion_isr'), tasas)) for clave, *tasas in db.execute(consulta)}
+
+    return catalogos.obtener(db, 'perfiles_impuestos', cargar)
+
+
+def obtener_tasas_productos(db, claves_producto_servicio):
+    """
+    Obtiene las columnas de tasas para una lista de conceptos, según el perfil de su producto o servicio.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        claves_producto_servicio (sequence): La clave del producto o servicio de cada concepto.
+
+    Returns:
+        dict: Las columnas 'tasas_iva', 'tasas_ieps', 'tasas_retencion_iva' y 'tasas_retencion_isr',
+        listas para pasarse a calcular_conceptos().
+    """
+    perfiles = obtener_perfiles_impuestos(db)
+    perfiles_conceptos = [perfiles.get(clave, PERFIL_POR_OMISION) for clave in claves_producto_servicio]
+    return {f'tasas_{impuesto}': [perfil[impuesto] for perfil in perfiles_conceptos] for impuesto in IMPUESTOS}
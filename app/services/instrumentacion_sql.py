@@ -0,0 +1,263 @@
+# services/instrumentacion_sql.py
+
+"""
+Este archivo define la medición de las sentencias SQL que ejecuta cada vista de la aplicación.
+
+Los eventos del motor (before_cursor_execute y after_cursor_execute) suman el número de sentencias,
+el tiempo en la base de datos y las filas de cada medición activa, abierta con medir_sql() (por
+ejemplo una ejecución del script de Streamlit o una vista dentro de ella). Las mediciones pueden
+anidarse: cada sentencia se suma a todas las activas del hilo. Fuera de una medición los eventos
+no hacen nada más que consultar una variable de contexto.
+
+La configuración se lee de variables de entorno:
+
+    SQL_LENTA_MS          Duración en milisegundos a partir de la cual una sentencia se registra como
+                          lenta en el logger 'sql_lento', con los valores de sus parámetros ocultos.
+    SQL_METRICAS_ARCHIVO  Archivo donde se escriben los contadores en el formato de texto de
+                          Prometheus al cerrar cada medición (por ejemplo para el textfile collector
+                          de node_exporter). Si no se define no se escribe.
+    SQL_METRICAS_PUERTO   Puerto donde se sirven los contadores en /metrics. Si no se define no se sirve.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+
+logger = logging.getLogger('sql_lento')
+
+SQL_LENTA_MS = float(os.environ.get('SQL_LENTA_MS', '200'))
+SQL_METRICAS_ARCHIVO = os.environ.get('SQL_METRICAS_ARCHIVO')
+SQL_METRICAS_PUERTO = os.environ.get('SQL_METRICAS_PUERTO')
+
+# Contadores exportados: nombre -> (atributo de MedicionSQL, ayuda)
+METRICAS = {
+    'facturas_sql_ejecuciones_total': ('ejecuciones', "Mediciones cerradas (ejecuciones de la vista)"),
+    'facturas_sql_consultas_total': ('consultas', "Sentencias SQL ejecutadas"),
+    'facturas_sql_segundos_total': ('segundos', "Segundos en la base de datos"),
+    'facturas_sql_filas_total': ('filas', "Filas devueltas o modificadas"),
+    'facturas_sql_lentas_total': ('lentas', "Sentencias que superaron SQL_LENTA_MS"),
+}
+
+# Mediciones activas del hilo, de la más externa a la más interna
+_mediciones = ContextVar('mediciones_sql', default=())
+
+
+class MedicionSQL:
+    """
+    Acumula las sentencias, el tiempo y las filas de una vista.
+    """
+
+    def __init__(self, vista):
+        self.vista = vista
+        self.ejecuciones = 0  # Mediciones cerradas (1 para una medición; el total en los acumulados)
+        self.consultas = 0  # Sentencias ejecutadas
+        self.segundos = 0.0  # Segundos en la base de datos
+        self.filas = 0  # Filas devueltas o modificadas (según rowcount del controlador)
+        self.lentas = 0  # Sentencias que superaron SQL_LENTA_MS
+
+    def registrar(self, segundos, filas, lenta):
+        self.consultas += 1
+        self.segundos += segundos
+        self.filas += max(filas, 0)
+        self.lentas += lenta
+
+    def sumar(self, otra):
+        for atributo, _ in METRICAS.values():
+            setattr(self, atributo, getattr(self, atributo) + getattr(otra, atributo))
+
+    def como_dict(self):
+        return {'vista': self.vista, **{atributo: getattr(self, atributo) for atributo, _ in METRICAS.values()}}
+
+
+class AcumuladoSQL:
+    """
+    Acumula las mediciones cerradas por vista, para todo el proceso.
+    """
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._vistas = {}  # vista -> MedicionSQL con los totales
+
+    def agregar(self, medicion):
+        with self._candado:
+            self._vistas.setdefault(medicion.vista, MedicionSQL(medicion.vista)).sumar(medicion)
+
+    def obtener(self):
+        with self._candado:
+            return {vista: total.como_dict() for vista, total in self._vistas.items()}
+
+    def reiniciar(self):
+        with self._candado:
+            self._vistas.clear()
+
+
+acumulado_sql = AcumuladoSQL()
+
+
+def _redactar(parametros):
+    """
+    Reemplaza los valores de los parámetros de una sentencia por su tipo.
+
+    Args:
+        parametros: Los parámetros como los recibe el controlador (dict, tupla o lista de ellos).
+
+    Returns:
+        Los parámetros con cada valor reemplazado por '<tipo>' (None se conserva).
+    """
+    def ocultar(valor):
+        return None if valor is None else f"<{type(valor).__name__}>"
+
+    if isinstance(parametros, dict):
+        return {nombre: ocultar(valor) for nombre, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        if parametros and isinstance(parametros[0], (dict, list, tuple)):
+            # executemany: solo la forma del primer grupo y el número de grupos
+            return {'grupos': len(parametros), 'primero': _redactar(parametros[0])}
+        return [ocultar(valor) for valor in parametros]
+    return ocultar(parametros)
+
+
+def instrumentar_motor(motor):
+    """
+    Registra los eventos que miden las sentencias de un motor.
+
+    Args:
+        motor (Engine): El motor de base de datos.
+
+    Returns:
+        None
+    """
+    @event.listens_for(motor, 'before_cursor_execute')
+    def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        if _mediciones.get():
+            conn.info.setdefault('inicio_sentencias', []).append(time.perf_counter())
+
+    @event.listens_for(motor, 'after_cursor_execute')
+    def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        mediciones = _mediciones.get()
+        inicios = conn.info.get('inicio_sentencias')
+        if not mediciones or not inicios:
+            return
+        segundos = time.perf_counter() - inicios.pop()
+        lenta = segundos * 1000 >= SQL_LENTA_MS
+        if lenta:
+            logger.warning(
+                "Sentencia lenta (%.1f ms) en %s: %s parámetros=%s",
+                segundos * 1000, mediciones[-1].vista, ' '.join(statement.split()), _redactar(parameters),
+            )
+        for medicion in mediciones:
+            medicion.registrar(segundos, cursor.rowcount, lenta)
+
+    @event.listens_for(motor, 'handle_error')
+    def _al_fallar(contexto):
+        # La sentencia que falló no llega a after_cursor_execute
+        inicios = contexto.connection.info.get('inicio_sentencias') if contexto.connection is not None else None
+        if inicios:
+            inicios.pop()
+
+
+@contextmanager
+def medir_sql(vista: str):
+    """
+    Mide las sentencias SQL ejecutadas dentro del bloque y las suma a los acumulados de la vista.
+
+    Args:
+        vista (str): El nombre de la vista o la ejecución, usado como etiqueta de las métricas.
+
+    Yields:
+        MedicionSQL: La medición, con los contadores al cerrar el bloque.
+    """
+    medicion = MedicionSQL(vista)
+    token = _mediciones.set(_mediciones.get() + (medicion,))
+    try:
+        yield medicion
+    finally:
+        _mediciones.reset(token)
+        medicion.ejecuciones = 1
+        acumulado_sql.agregar(medicion)
+        if SQL_METRICAS_ARCHIVO and not _mediciones.get():
+            escribir_metricas(SQL_METRICAS_ARCHIVO)
+
+
+def _escapar_etiqueta(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def texto_metricas():
+    """
+    Genera los contadores acumulados en el formato de texto de Prometheus.
+
+    Returns:
+        str: Las métricas, una serie por vista.
+    """
+    vistas = acumulado_sql.obtener()
+    lineas = []
+    for nombre, (atributo, ayuda) in METRICAS.items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} counter")
+        for vista, totales in sorted(vistas.items()):
+            lineas.append(f'{nombre}{{vista="{_escapar_etiqueta(vista)}"}} {totales[atributo]}')
+    return '\n'.join(lineas) + '\n'
+
+
+def escribir_metricas(ruta: str):
+    """
+    Escribe los contadores en un archivo, reemplazándolo de forma atómica para que nunca se lea a medias.
+
+    Args:
+        ruta (str): La ruta del archivo.
+
+    Returns:
+        None
+    """
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        archivo.write(texto_metricas())
+    os.replace(temporal, ruta)
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        cuerpo = texto_metricas().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *argumentos):
+        pass
+
+
+_servidor = None
+_candado_servidor = threading.Lock()
+
+
+def iniciar_servidor_metricas(puerto: int = None):
+    """
+    Sirve los contadores en http://localhost:<puerto>/metrics desde un hilo, una sola vez por proceso.
+
+    Args:
+        puerto (int): El puerto. Si no se indica se usa SQL_METRICAS_PUERTO; sin ninguno no se inicia.
+
+    Returns:
+        bool: True si el servidor está en ejecución.
+    """
+    global _servidor
+    puerto = puerto or (int(SQL_METRICAS_PUERTO) if SQL_METRICAS_PUERTO else None)
+    if puerto is None:
+        return False
+    with _candado_servidor:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer(('127.0.0.1', puerto), _ManejadorMetricas)
+            threading.Thread(target=_servidor.serve_forever, name='metricas_sql', daemon=True).start()
+    return True
@@ -0,0 +1,337 @@
+# services/migraciones.py
+
+"""
+Este archivo define las migraciones versionadas del esquema y la verificación de los índices.
+
+Cada migración tiene un número de versión y una lista de pasos; las versiones aplicadas se registran
+en la tabla esquema_migraciones, así que aplicar las migraciones varias veces no repite ninguna. Las
+primeras migraciones llevan una base creada con el Database.sql original al esquema actual (columnas,
+tablas y disparadores nuevos) y cada uno de sus pasos se ejecuta en su propia transacción. Los
+índices se crean con CREATE INDEX CONCURRENTLY, que no bloquea las escrituras de la tabla mientras se
+construye el índice; como no puede ejecutarse dentro de una transacción, cada paso se ejecuta en modo
+autocommit. Si una creación concurrente se interrumpe, PostgreSQL deja el índice marcado como inválido:
+al reintentar la migración ese índice se elimina y se vuelve a crear. Las restricciones UNIQUE sobre
+tablas grandes se agregan igual: primero su índice único concurrente y después la restricción con
+ADD CONSTRAINT ... UNIQUE USING INDEX, que ya no recorre la tabla.
+
+La verificación ejecuta EXPLAIN sobre las consultas de los servicios y comprueba que el plan use el
+índice esperado. Se ejecuta desde el directorio app:
+
+    python -m services.migraciones
+    python -m services.migraciones --verificar
+"""
+
+import argparse
+import json
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import select, text
+
+from services.almacen_documentos import facturas_pdf, recibos_pdf
+from services.database import engine, get_db
+from services.exportacion_cfdi import consulta_facturas, consulta_recibos
+from services.factura_service import FACTURAS_POR_PAGINA, consulta_historial_facturas
+from services.tablas_nomina import recibos_nomina
+from services.trabajos import EN_PROCESO, trabajos
+from utils.factura_pdf_util import PLANTILLA_FACTURA
+
+# Llave del candado de PostgreSQL que impide aplicar migraciones desde dos procesos a la vez
+CANDADO_MIGRACIONES = 7254001
+
+
+def indice(nombre, definicion, unico=False):
+    """
+    Crea el paso de una migración que construye un índice de forma concurrente.
+
+    Args:
+        nombre (str): El nombre del índice.
+        definicion (str): La definición que sigue al nombre, por ejemplo "ON facturas (rfc_receptor)".
+        unico (bool): Si es verdadero, el índice es UNIQUE.
+
+    Returns:
+        tuple: El paso ('indice', nombre, sentencia).
+    """
+    tipo = 'UNIQUE INDEX' if unico else 'INDEX'
+    return ('indice', nombre, f"CREATE {tipo} CONCURRENTLY IF NOT EXISTS {nombre} {definicion}")
+
+
+def restriccion_unica(tabla, columna):
+    """
+    Crea los pasos de una migración que agregan una restricción UNIQUE sin bloquear la tabla mientras
+    se construye su índice. La restricción y su índice se llaman <tabla>_<columna>_key, como las que
+    crea Database.sql, así que no se repiten en una base creada con él.
+
+    Args:
+        tabla (str): El nombre de la tabla.
+        columna (str): El nombre de la columna.
+
+    Returns:
+        list: El paso del índice único concurrente y el que lo convierte en restricción.
+    """
+    nombre = f"{tabla}_{columna}_key"
+    return [
+        indice(nombre, f"ON {tabla} ({columna})", unico=True),
+        ('sql', "DO $$ BEGIN "
+                f"IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{nombre}') THEN "
+                f"ALTER TABLE {tabla} ADD CONSTRAINT {nombre} UNIQUE USING INDEX {nombre}; "
+                "END IF; END $$"),
+    ]
+
+
+# Catálogos cuya versión mantienen los disparadores de catalogos_version (ver services/catalogo_cache.py)
+CATALOGOS_VERSIONADOS = (
+    'tipo_comprobante', 'uso_destino_cfdi', 'regimen_fiscal', 'metodos_pago', 'formas_pago',
+    'productos_servicios', 'perfiles_impuestos', 'regimen_laboral', 'banco', 'percepciones', 'deducciones',
+)
+
+# Migraciones en orden: (versión, descripción, pasos). Los pasos del esquema pueden repetirse sin
+# error (IF NOT EXISTS), así que también se aplican sobre una base creada con una versión intermedia
+# de Database.sql
+MIGRACIONES = [
+    (1, 'Perfiles de impuestos', [
+        ('sql', "CREATE TABLE IF NOT EXISTS perfiles_impuestos ("
+                "clave_producto_servicio VARCHAR(10) PRIMARY KEY REFERENCES productos_servicios(clave_producto_servicio), "
+                "tasa_iva NUMERIC(7, 6) DEFAULT 0.160000 NOT NULL, tasa_ieps NUMERIC(7, 6) DEFAULT 0 NOT NULL, "
+                "tasa_retencion_iva NUMERIC(7, 6) DEFAULT 0 NOT NULL, tasa_retencion_isr NUMERIC(7, 6) DEFAULT 0 NOT NULL)"),
+    ]),
+    # Las facturas se insertan sin sellos ni código QR (los completa el trabajo procesar_factura) y los
+    # PDF se guardan en el almacén de documentos por versión de plantilla
+    (2, 'Folio fiscal, impuestos y PDF en el almacén', [
+        ('sql', "ALTER TABLE facturas ADD COLUMN IF NOT EXISTS uuid VARCHAR(36), "
+                "ADD COLUMN IF NOT EXISTS ieps DECIMAL(10, 2) DEFAULT 0 NOT NULL, "
+                "ADD COLUMN IF NOT EXISTS retenciones DECIMAL(10, 2) DEFAULT 0 NOT NULL, "
+                "ALTER COLUMN total_con_letra DROP NOT NULL, ALTER COLUMN sello_digital_cfdi DROP NOT NULL, "
+                "ALTER COLUMN sello_digital_sat DROP NOT NULL, ALTER COLUMN cadena_original_complemento_certificacion DROP NOT NULL, "
+                "ALTER COLUMN codigo_qr DROP NOT NULL"),
+        ('sql', "ALTER TABLE recibos_nomina ADD COLUMN IF NOT EXISTS uuid VARCHAR(36)"),
+        # El folio fiscal es único; su índice se construye sin bloquear las tablas
+        *restriccion_unica('facturas', 'uuid'),
+        *restriccion_unica('recibos_nomina', 'uuid'),
+        ('sql', "ALTER TABLE facturas_pdf ADD COLUMN IF NOT EXISTS hash_sha256 CHAR(64), "
+                "ADD COLUMN IF NOT EXISTS version_plantilla VARCHAR(16), ALTER COLUMN pdf DROP NOT NULL"),
+        ('sql', "DO $$ BEGIN "
+                "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'facturas_pdf_id_factura_version_plantilla_key') THEN "
+                "ALTER TABLE facturas_pdf ADD CONSTRAINT facturas_pdf_id_factura_version_plantilla_key UNIQUE (id_factura, version_plantilla); "
+                "END IF; END $$"),
+        ('sql', "ALTER TABLE recibos_pdf ADD COLUMN IF NOT EXISTS hash_sha256 CHAR(64), ALTER COLUMN pdf DROP NOT NULL"),
+        ('sql', "INSERT INTO tipo_comprobante (clave, descripcion) VALUES ('N', 'NÓMINA') ON CONFLICT (clave) DO NOTHING"),
+    ]),
+    (3, 'Cola de trabajos', [
+        ('sql', "CREATE TABLE IF NOT EXISTS trabajos ("
+                "id BIGSERIAL PRIMARY KEY, tipo VARCHAR(50) NOT NULL, clave VARCHAR(100), carga JSONB NOT NULL DEFAULT '{}', "
+                "estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', intentos INTEGER NOT NULL DEFAULT 0, "
+                "max_intentos INTEGER NOT NULL DEFAULT 5, ejecutar_despues TIMESTAMP NOT NULL DEFAULT NOW(), "
+                "bloqueado_por VARCHAR(100), bloqueado_en TIMESTAMP, error TEXT, "
+                "creado_en TIMESTAMP NOT NULL DEFAULT NOW(), terminado_en TIMESTAMP)"),
+        ('sql', "CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos (clave)"),
+        ('sql', "CREATE INDEX IF NOT EXISTS idx_trabajos_pendientes ON trabajos (id) WHERE estado = 'pendiente'"),
+    ]),
+    (4, 'Versiones de catálogos', [
+        ('sql', "CREATE TABLE IF NOT EXISTS catalogos_version (tabla VARCHAR(64) PRIMARY KEY NOT NULL, version BIGINT NOT NULL DEFAULT 1)"),
+        ('sql', "CREATE OR REPLACE FUNCTION incrementar_version_catalogo() RETURNS TRIGGER AS $$ BEGIN "
+                "INSERT INTO catalogos_version (tabla, version) VALUES (TG_TABLE_NAME, 1) "
+                "ON CONFLICT (tabla) DO UPDATE SET version = catalogos_version.version + 1; "
+                "RETURN NULL; END; $$ LANGUAGE plpgsql"),
+    ] + [
+        paso
+        for catalogo in CATALOGOS_VERSIONADOS
+        for paso in (
+            ('sql', f"INSERT INTO catalogos_version (tabla) VALUES ('{catalogo}') ON CONFLICT (tabla) DO NOTHING"),
+            ('sql', f"DROP TRIGGER IF EXISTS trg_version_{catalogo} ON {catalogo}"),
+            ('sql', f"CREATE TRIGGER trg_version_{catalogo} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {catalogo} "
+                    "FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_catalogo()"),
+        )
+    ]),
+    (5, 'Índices de las consultas frecuentes', [
+        # Historial de facturas de un receptor (paginado por fecha e id); cubre las columnas del listado
+        indice('idx_facturas_receptor_fecha',
+               "ON facturas (rfc_receptor, fecha_expedicion DESC, id DESC) INCLUDE (uuid, clave_producto_servicio, cantidad, total)"),
+        # Facturas por rango de fechas (exportación, reportes)
+        indice('idx_facturas_fecha', "ON facturas (fecha_expedicion, id)"),
+        # Recibos de un empleado, del más reciente al más antiguo
+        indice('idx_recibos_empleado_fecha', "ON recibos_nomina (empleado, fecha_pago DESC)"),
+        # Recibos por fecha de pago y por fecha de expedición (exportación)
+        indice('idx_recibos_fecha_pago', "ON recibos_nomina (fecha_pago)"),
+        indice('idx_recibos_fecha_expedicion', "ON recibos_nomina (fecha_expedicion, id)"),
+        # PDF de un recibo; facturas_pdf ya tiene el índice de UNIQUE (id_factura, version_plantilla)
+        indice('idx_recibos_pdf_recibo', "ON recibos_pdf (id_recibo) INCLUDE (hash_sha256)"),
+        # PDF que siguen como BYTEA en la base de datos (solo los pendientes de mover al almacén)
+        indice('idx_facturas_pdf_sin_migrar', "ON facturas_pdf (id) WHERE hash_sha256 IS NULL AND pdf IS NOT NULL"),
+        indice('idx_recibos_pdf_sin_migrar', "ON recibos_pdf (id) WHERE hash_sha256 IS NULL AND pdf IS NOT NULL"),
+        # Trabajos en proceso, para recuperar los abandonados
+        indice('idx_trabajos_en_proceso', "ON trabajos (bloqueado_en) WHERE estado = 'en_proceso'"),
+    ]),
+    # Después de aplicarla, llenar el resumen con python -m services.agregados --reconstruir
+    (6, 'Resumen de ventas', [
+        ('sql', "CREATE TABLE IF NOT EXISTS resumen_ventas ("
+                "mes DATE NOT NULL, clave_producto_servicio VARCHAR(10) NOT NULL, forma_pago_clave VARCHAR(2) NOT NULL, "
+                "metodo_pago_clave VARCHAR(3) NOT NULL, facturas INTEGER NOT NULL DEFAULT 0, cantidad BIGINT NOT NULL DEFAULT 0, "
+                "subtotal DECIMAL(14, 2) NOT NULL DEFAULT 0, ieps DECIMAL(14, 2) NOT NULL DEFAULT 0, iva DECIMAL(14, 2) NOT NULL DEFAULT 0, "
+                "retenciones DECIMAL(14, 2) NOT NULL DEFAULT 0, total DECIMAL(14, 2) NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (mes, clave_producto_servicio, forma_pago_clave, metodo_pago_clave))"),
+    ]),
+    # Los comprobantes sellados antes de esta versión no tienen XML guardado; su XML se reconstruye
+    # y solo se entrega si el sello sigue verificando
+    (7, 'XML sellado de los comprobantes', [
+        ('sql', "ALTER TABLE facturas ADD COLUMN IF NOT EXISTS xml_sha256 CHAR(64)"),
+        ('sql', "ALTER TABLE recibos_nomina ADD COLUMN IF NOT EXISTS xml_sha256 CHAR(64)"),
+    ]),
+]
+
+
+def _indice_invalido(conexion, nombre):
+    """
+    Indica si existe un índice marcado como inválido (una creación concurrente que no terminó).
+    """
+    return conexion.execute(text(
+        "SELECT NOT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :nombre"
+    ), {'nombre': nombre}).scalar() or False
+
+
+def _ejecutar_paso(conexion, paso):
+    """
+    Ejecuta un paso de una migración en una conexión en modo autocommit.
+    """
+    if paso[0] == 'indice':
+        _, nombre, sentencia = paso
+        if _indice_invalido(conexion, nombre):
+            conexion.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}"))
+        conexion.execute(text(sentencia))
+    else:
+        with conexion.begin():
+            conexion.execute(text(paso[1]))
+
+
+def aplicar_migraciones(al_aplicar=None):
+    """
+    Aplica las migraciones que aún no se han aplicado, en orden de versión.
+
+    Args:
+        al_aplicar (callable): Función que recibe (versión, descripción) después de aplicar cada migración.
+
+    Returns:
+        list: Las versiones aplicadas.
+    """
+    aplicadas = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexion:
+        conexion.execute(text(
+            "CREATE TABLE IF NOT EXISTS esquema_migraciones ("
+            "version INTEGER PRIMARY KEY, descripcion VARCHAR(255) NOT NULL, aplicada_en TIMESTAMP NOT NULL DEFAULT NOW())"
+        ))
+        conexion.execute(text("SELECT pg_advisory_lock(:llave)"), {'llave': CANDADO_MIGRACIONES})
+        try:
+            existentes = set(conexion.scalars(text("SELECT version FROM esquema_migraciones")))
+            for version, descripcion, pasos in MIGRACIONES:
+                if version in existentes:
+                    continue
+                for paso in pasos:
+                    _ejecutar_paso(conexion, paso)
+                conexion.execute(
+                    text("INSERT INTO esquema_migraciones (version, descripcion) VALUES (:version, :descripcion)"),
+                    {'version': version, 'descripcion': descripcion},
+                )
+                aplicadas.append(version)
+                if al_aplicar:
+                    al_aplicar(version, descripcion)
+        finally:
+            conexion.execute(text("SELECT pg_advisory_unlock(:llave)"), {'llave': CANDADO_MIGRACIONES})
+    return aplicadas
+
+
+def consultas_verificadas():
+    """
+    Consultas de los servicios cuyo plan debe usar un índice: (descripción, consulta, índice esperado).
+    """
+    hoy = date.today()
+    return [
+        ('Historial de facturas de un receptor',
+         consulta_historial_facturas('XAXX010101000', (datetime.now(), 0)).limit(FACTURAS_POR_PAGINA + 1),
+         'idx_facturas_receptor_fecha'),
+        ('Exportación de facturas por rango de fechas', consulta_facturas(hoy.replace(day=1), hoy), 'idx_facturas_fecha'),
+        ('Exportación de recibos por rango de fechas', consulta_recibos(hoy.replace(day=1), hoy), 'idx_recibos_fecha_expedicion'),
+        ('PDF de una factura',
+         select(facturas_pdf.c.hash_sha256, facturas_pdf.c.pdf)
+         .where(facturas_pdf.c.id_factura == 1, facturas_pdf.c.version_plantilla == PLANTILLA_FACTURA.version),
+         'facturas_pdf_id_factura_version_plantilla_key'),
+        ('PDF de un recibo',
+         select(recibos_pdf.c.hash_sha256, recibos_pdf.c.pdf).where(recibos_pdf.c.id_recibo == 1),
+         'idx_recibos_pdf_recibo'),
+        ('Recibos de un empleado',
+         select(recibos_nomina.c.id, recibos_nomina.c.fecha_pago)
+         .where(recibos_nomina.c.empleado == 'E1').order_by(recibos_nomina.c.fecha_pago.desc()),
+         'idx_recibos_empleado_fecha'),
+        ('Recibos por fecha de pago',
+         select(recibos_nomina.c.id).where(recibos_nomina.c.fecha_pago == datetime.combine(hoy, datetime.min.time())),
+         'idx_recibos_fecha_pago'),
+        ('PDF de facturas pendientes de mover al almacén',
+         select(facturas_pdf.c.id).where(facturas_pdf.c.id > 0, facturas_pdf.c.hash_sha256.is_(None), facturas_pdf.c.pdf.is_not(None))
+         .order_by(facturas_pdf.c.id).limit(200),
+         'idx_facturas_pdf_sin_migrar'),
+        ('Trabajos abandonados',
+         select(trabajos.c.id).where(trabajos.c.estado == EN_PROCESO, trabajos.c.bloqueado_en < datetime.now()),
+         'idx_trabajos_en_proceso'),
+    ]
+
+
+def _indices_plan(plan):
+    """
+    Obtiene los nombres de los índices que usa un plan de EXPLAIN (FORMAT JSON).
+    """
+    indices = set()
+    pendientes = [plan]
+    while pendientes:
+        nodo = pendientes.pop()
+        if 'Index Name' in nodo:
+            indices.add(nodo['Index Name'])
+        pendientes.extend(nodo.get('Plans', []))
+    return indices
+
+
+def verificar_indices(db):
+    """
+    Comprueba con EXPLAIN que las consultas de los servicios usen sus índices.
+
+    Con tablas pequeñas PostgreSQL prefiere recorrer la tabla completa aunque exista el índice, así que
+    la verificación desactiva el recorrido secuencial (solo en su transacción) para comprobar que el
+    índice es utilizable por la consulta.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+
+    Returns:
+        list: Un diccionario por consulta con 'consulta', 'indice', 'usado' e 'indices' (los del plan).
+    """
+    resultados = []
+    try:
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        for descripcion, consulta, indice_esperado in consultas_verificadas():
+            sql = consulta.compile(dialect=db.bind.dialect, compile_kwargs={'literal_binds': True})
+            plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            indices = _indices_plan(plan[0]['Plan'])
+            resultados.append({'consulta': descripcion, 'indice': indice_esperado, 'usado': indice_esperado in indices, 'indices': sorted(indices)})
+    finally:
+        db.rollback()
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica las migraciones del esquema y verifica los índices.")
+    parser.add_argument('--verificar', action='store_true', help="Solo verifica con EXPLAIN que las consultas usen sus índices")
+    argumentos = parser.parse_args()
+
+    if not argumentos.verificar:
+        def mostrar_migracion(version, descripcion):
+            print(f"Migración {version} aplicada: {descripcion}")
+
+        if not aplicar_migraciones(mostrar_migracion):
+            print("El esquema ya está al día")
+        sys.exit(0)
+
+    with get_db() as db:
+        resultados = verificar_indices(db)
+    for resultado in resultados:
+        estado = 'OK' if resultado['usado'] else 'SIN ÍNDICE'
+        print(f"[{estado}] {resultado['consulta']}: {resultado['indice']} (plan: {', '.join(resultado['indices']) or 'ninguno'})")
+    sys.exit(0 if all(resultado['usado'] for resultado in resultados) else 1)
@@ -0,0 +1,356 @@
+# services/nomina_service.py
+
+"""
+Este archivo define el motor de corridas de nómina: genera los recibos de todos los empleados
+de una periodicidad de pago (por ejemplo, una quincena) en una sola ejecución.
+
+Los importes se calculan en memoria con Decimal, el sellado de los comprobantes (ver
+services/sellado.py) y la generación del código QR se reparten entre un pool de procesos y los recibos se insertan por bloques, con una transacción
+por bloque. Se puede ejecutar desde la línea de comandos (desde el directorio app):
+
+    python -m services.nomina_service --periodicidad 04 --fecha-pago 2024-06-15
+"""
+
+import argparse
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from services.almacen_documentos import almacen
+from services.database import get_db
+from services.recibo_service import LUGAR_EXPEDICION, NOMBRE_EMPRESA, RFC_EMISOR, RFC_RECEPTOR_GENERICO
+from services.sellado import obtener_csd, sellar_comprobante, verificar_sello
+from services.tablas_nomina import empleados, recibos_nomina
+from utils.cfdi import agregar_atributo, cadena_original, comprobante_recibo
+from utils.cfdi_xml import cfdi_a_bytes, nodo_timbre, preparar_comprobante
+from utils.importe_letra import importe_con_letra
+from utils.qr_util import generar_codigo_qr
+
+# Días que cubre cada periodicidad de pago del catálogo del SAT
+DIAS_POR_PERIODICIDAD = {
+    '01': 1,  # Diario
+    '02': 7,  # Semanal
+    '03': 14,  # Catorcenal
+    '04': 15,  # Quincenal
+    '05': 30,  # Mensual
+    '06': 60,  # Bimestral
+    '10': 10,  # Decenal
+}
+
+# Percepción principal de cada recibo: sueldos, salarios, rayas y jornales
+CLAVE_PERCEPCION_SUELDO = '001'
+
+# Deducciones por omisión, como proporción del total de percepciones
+DEDUCCIONES_POR_OMISION = {
+    '001': Decimal('0.02775'),  # Seguridad social
+    '002': Decimal('0.10'),  # ISR
+}
+
+CENTAVOS = Decimal('0.01')
+
+
+def redondear(valor):
+    """
+    Redondea un importe a centavos (mitad hacia arriba).
+
+    Args:
+        valor (Decimal): El importe a redondear.
+
+    Returns:
+        Decimal: El importe redondeado.
+    """
+    return Decimal(valor).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def calcular_recibo_empleado(sueldo_base, dias_periodo, deducciones, percepciones_adicionales=None):
+    """
+    Calcula las percepciones, deducciones e importe del recibo de un empleado.
+
+    Args:
+        sueldo_base (Decimal): El sueldo mensual del empleado.
+        dias_periodo (int): El número de días que cubre el periodo de pago.
+        deducciones (dict): Las deducciones a aplicar, de clave a proporción de las percepciones.
+        percepciones_adicionales (Decimal): Otras percepciones del periodo (bonos, horas extra, etc.).
+
+    Returns:
+        dict: Un diccionario con los valores calculados del recibo.
+    """
+    valor_percepciones = redondear(Decimal(sueldo_base) * dias_periodo / 30)
+    total_percepciones = valor_percepciones + redondear(percepciones_adicionales or 0)
+
+    valores_deducciones = [redondear(total_percepciones * tasa) for tasa in deducciones.values()]
+    valor_deducciones = valores_deducciones[0] if valores_deducciones else Decimal('0.00')
+    total_deducciones = sum(valores_deducciones, Decimal('0.00'))
+
+    return {
+        'percepciones_recibo': CLAVE_PERCEPCION_SUELDO,
+        'valor_percepciones': valor_percepciones,
+        'total_percepciones': total_percepciones,
+        'deducciones_recibo': next(iter(deducciones), None),
+        'valor_deducciones': valor_deducciones,
+        'total_deducciones': total_deducciones,
+        'importe': total_percepciones - total_deducciones,
+    }
+
+
+def datos_cfdi_recibo(recibo):
+    """
+    Reúne los datos de un recibo que forman su comprobante CFDI con el complemento de nómina (ver utils/cfdi.py).
+
+    Args:
+        recibo (dict): Los valores de las columnas del recibo (ver recibos_nomina) y de su empleado (ver empleados).
+
+    Returns:
+        dict: Los datos que recibe comprobante_recibo().
+    """
+    dias_periodo = DIAS_POR_PERIODICIDAD.get(recibo['periodicidad_pago'], 1)
+    fecha_pago = recibo['fecha_pago']
+    return {
+        **recibo,
+        'numero_empleado': recibo['empleado'],
+        # Los datos del emisor se guardan en el recibo; antes de insertarlo son los valores por omisión
+        'lugar_expedicion': recibo.get('lugar_expedicion') or LUGAR_EXPEDICION,
+        'rfc_emisor': recibo.get('rfc_emisor') or RFC_EMISOR,
+        'nombre_empresa': recibo.get('nombre_empresa') or NOMBRE_EMPRESA,
+        'rfc_receptor': RFC_RECEPTOR_GENERICO,
+        'fecha_inicial_pago': fecha_pago - timedelta(days=dias_periodo - 1),
+        'fecha_final_pago': fecha_pago,
+        'dias_pagados': dias_periodo,
+    }
+
+
+def generar_artefactos_recibo(numero_empleado, datos_cfdi):
+    """
+    Genera el folio fiscal, los sellos y el código QR de un recibo y guarda su XML sellado. Se ejecuta
+    dentro del pool de procesos.
+
+    Args:
+        numero_empleado (str): El número del empleado, para asociar el resultado.
+        datos_cfdi (dict): Los datos del comprobante que recibe comprobante_recibo().
+
+    Returns:
+        tuple: El número de empleado y un diccionario con el folio fiscal, el código QR, los sellos y el
+        SHA-256 del XML en el almacén de documentos.
+    """
+    folio_fiscal = str(uuid.uuid4()).upper()
+    sellado = sellar_comprobante(folio_fiscal, comprobante_recibo(datos_cfdi))
+    return numero_empleado, {
+        'uuid': folio_fiscal,
+        'sello_digital_cfdi': sellado['sello_digital_cfdi'],
+        'sello_digital_sat': sellado['sello_digital_sat'],
+        'cadena_original_complemento_certificacion': sellado['cadena_original_complemento_certificacion'],
+        'codigo_qr': generar_codigo_qr(folio_fiscal, RFC_EMISOR, RFC_RECEPTOR_GENERICO, datos_cfdi['importe'], sellado['sello_digital_cfdi']),
+        'xml_sha256': almacen.guardar(sellado['xml']),
+    }
+
+
+def _generar_artefactos_aislado(numero_empleado, datos_cfdi):
+    """
+    Llama a generar_artefactos_recibo() y devuelve el error en lugar de lanzarlo, para que el
+    fallo de un recibo no detenga la corrida. Se ejecuta dentro del pool de procesos.
+
+    Returns:
+        tuple: El número de empleado, los artefactos (o None) y el mensaje de error (o None).
+    """
+    try:
+        _, artefactos = generar_artefactos_recibo(numero_empleado, datos_cfdi)
+        return numero_empleado, artefactos, None
+    except Exception as error:
+        return numero_empleado, None, str(error)
+
+
+def xml_recibo(recibo):
+    """
+    Obtiene el XML sellado y timbrado de un recibo.
+
+    Es el XML que se guardó al sellarlo. Los recibos sellados antes de guardar el XML se reconstruyen
+    con los datos actuales y solo se devuelven si su sello sigue verificando con ellos.
+
+    Args:
+        recibo (dict): Los valores de las columnas del recibo y de su empleado, como en datos_cfdi_recibo().
+
+    Returns:
+        bytes: El XML en UTF-8, o None si el recibo no está sellado o no puede reconstruirse.
+    """
+    if not recibo.get('sello_digital_cfdi'):
+        return None
+    if recibo.get('xml_sha256'):
+        return almacen.leer(recibo['xml_sha256'])
+
+    _, no_certificado, certificado = obtener_csd()
+    comprobante = agregar_atributo(comprobante_recibo(datos_cfdi_recibo(recibo)), 'NoCertificado', no_certificado, antes_de='SubTotal')
+    if not verificar_sello(cadena_original(comprobante), recibo['sello_digital_cfdi']):
+        return None
+    return cfdi_a_bytes(preparar_comprobante(
+        comprobante,
+        recibo['sello_digital_cfdi'],
+        no_certificado,
+        certificado,
+        nodo_timbre(recibo['cadena_original_complemento_certificacion'], recibo['sello_digital_sat']),
+    ))
+
+
+def obtener_empleados_periodicidad(db: Session, periodicidad_pago: str):
+    """
+    Obtiene los datos de los empleados con una periodicidad de pago que se usan en sus recibos.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        periodicidad_pago (str): La clave de la periodicidad de pago.
+
+    Returns:
+        list: Filas con el número de empleado, el sueldo base y los datos del empleado del complemento de nómina.
+    """
+    consulta = (
+        select(
+            empleados.c.numero_empleado, empleados.c.sueldo_base, empleados.c.curp, empleados.c.nss, empleados.c.fecha_ingreso,
+            empleados.c.tipo_contrato, empleados.c.tipo_jornada, empleados.c.riesgo_id, empleados.c.periodicidad_pago,
+        )
+        .where(empleados.c.periodicidad_pago == periodicidad_pago)
+        .order_by(empleados.c.numero_empleado)
+    )
+    return db.execute(consulta).all()
+
+
+def _insertar_recibos(db: Session, filas):
+    """
+    Inserta un bloque de recibos con una sola sentencia por lotes.
+
+    Returns:
+        dict: El ID de recibo generado por número de empleado.
+    """
+    sentencia = insert(recibos_nomina).returning(recibos_nomina.c.id, recibos_nomina.c.empleado)
+    return {empleado: id_recibo for id_recibo, empleado in db.execute(sentencia, filas)}
+
+
+def ejecutar_nomina(db: Session, periodicidad_pago: str, fecha_pago: date = None, deducciones: dict = None,
+                    percepciones_adicionales: dict = None, regimen_laboral_clave: str = '02',
+                    banco_clave: str = None, tamaño_bloque: int = 200, procesos: int = None, al_progresar=None):
+    """
+    Genera los recibos de nómina de todos los empleados de una periodicidad de pago.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        periodicidad_pago (str): La clave de la periodicidad de pago (por ejemplo '04' para quincenal).
+        fecha_pago (date): La fecha de pago del periodo. Por omisión, hoy.
+        deducciones (dict): Las deducciones a aplicar, de clave a proporción de las percepciones.
+        percepciones_adicionales (dict): Percepciones extra del periodo por número de empleado.
+        regimen_laboral_clave (str): La clave del régimen laboral de los recibos.
+        banco_clave (str): La clave del banco pagador, si aplica.
+        tamaño_bloque (int): El número de recibos que se insertan por transacción.
+        procesos (int): El número de procesos para sellar y generar los QR (1 para no usar el pool).
+        al_progresar (callable): Función que recibe (procesados, total) después de cada bloque.
+
+    Returns:
+        dict: Un diccionario con 'total', 'ids' (ID de recibo por número de empleado)
+        y 'errores' (lista de diccionarios con 'numero_empleado' y 'error').
+    """
+    dias_periodo = DIAS_POR_PERIODICIDAD.get(periodicidad_pago)
+    if dias_periodo is None:
+        raise ValueError(f"Periodicidad de pago no soportada: {periodicidad_pago}")
+
+    deducciones = DEDUCCIONES_POR_OMISION if deducciones is None else deducciones
+    percepciones_adicionales = percepciones_adicionales or {}
+    fecha_pago = datetime.combine(fecha_pago or date.today(), time())
+    fecha_expedicion = datetime.now()
+    procesos = procesos or os.cpu_count() or 1
+
+    empleados_periodo = obtener_empleados_periodicidad(db, periodicidad_pago)
+    total = len(empleados_periodo)
+    ids = {}
+    errores = []
+    procesados = 0
+
+    # Cargar el CSD antes de iniciar el pool; cada proceso lo carga una sola vez al iniciar
+    obtener_csd()
+    pool = ProcessPoolExecutor(max_workers=procesos, initializer=obtener_csd) if procesos > 1 else None
+    try:
+        for inicio in range(0, total, tamaño_bloque):
+            bloque = empleados_periodo[inicio:inicio + tamaño_bloque]
+
+            # Calcular los importes de todo el bloque
+            filas = {}
+            datos_cfdi = {}
+            for empleado in bloque:
+                numero_empleado = empleado.numero_empleado
+                try:
+                    valores = calcular_recibo_empleado(empleado.sueldo_base, dias_periodo, deducciones, percepciones_adicionales.get(numero_empleado))
+                    valores['importe_con_letra'] = importe_con_letra(valores['importe'])
+                    filas[numero_empleado] = {
+                        'uso_destino_cfdi_clave': 'CN01',
+                        'fecha_expedicion': fecha_expedicion,
+                        'tipo_comprobante_clave': 'N',
+                        'regimen_laboral_clave': regimen_laboral_clave,
+                        'empleado': numero_empleado,
+                        'fecha_pago': fecha_pago,
+                        'metodo_pago_clave': 'PUE',
+                        'forma_pago_clave': '99',
+                        'banco_clave': banco_clave,
+                        **valores,
+                    }
+                    datos_cfdi[numero_empleado] = datos_cfdi_recibo({**empleado._asdict(), **filas[numero_empleado]})
+                except Exception as error:
+                    errores.append({'numero_empleado': numero_empleado, 'error': str(error)})
+
+            # Repartir el sellado y la generación de QR entre los procesos; un recibo que falla se
+            # registra como error y no se inserta
+            numeros = list(filas)
+            datos_bloque = [datos_cfdi[numero_empleado] for numero_empleado in numeros]
+            artefactos = pool.map(_generar_artefactos_aislado, numeros, datos_bloque, chunksize=16) if pool else map(_generar_artefactos_aislado, numeros, datos_bloque)
+            for numero_empleado, datos, error in artefactos:
+                if error is not None:
+                    errores.append({'numero_empleado': numero_empleado, 'error': error})
+                    del filas[numero_empleado]
+                else:
+                    filas[numero_empleado].update(datos)
+
+            # Insertar el bloque en una sola transacción; si falla, aislar los recibos erróneos
+            if filas:
+                try:
+                    ids.update(_insertar_recibos(db, list(filas.values())))
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    for numero_empleado, fila in filas.items():
+                        try:
+                            ids.update(_insertar_recibos(db, [fila]))
+                            db.commit()
+                        except Exception as error:
+                            db.rollback()
+                            errores.append({'numero_empleado': numero_empleado, 'error': str(getattr(error, 'orig', error))})
+
+            procesados += len(bloque)
+            if al_progresar:
+                al_progresar(procesados, total)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return {'total': total, 'ids': ids, 'errores': errores}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera los recibos de nómina de una periodicidad de pago.")
+    parser.add_argument('--periodicidad', required=True, help="Clave de la periodicidad de pago (por ejemplo 04 para quincenal)")
+    parser.add_argument('--fecha-pago', type=date.fromisoformat, default=None, help="Fecha de pago en formato AAAA-MM-DD")
+    parser.add_argument('--bloque', type=int, default=200, help="Recibos por transacción")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos para sellar y generar los QR")
+    argumentos = parser.parse_args()
+
+    def mostrar_progreso(procesados, total):
+        print(f"{procesados}/{total} empleados procesados")
+
+    with get_db() as db:
+        resultado = ejecutar_nomina(
+            db, argumentos.periodicidad, fecha_pago=argumentos.fecha_pago,
+            tamaño_bloque=argumentos.bloque, procesos=argumentos.procesos, al_progresar=mostrar_progreso
+        )
+
+    print(f"Recibos generados: {len(resultado['ids'])} de {resultado['total']}")
+    for error in resultado['errores']:
+        print(f"Empleado {error['numero_empleado']}: {error['error']}")
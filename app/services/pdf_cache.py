@@ -0,0 +1,113 @@
+# services/pdf_cache.py
+
+"""
+Este archivo define una caché en memoria, compartida por todo el proceso, para los PDF generados.
+
+Los PDF se guardan por (ID del documento, versión de la plantilla) y, cuando se supera el límite
+de memoria (PDF_CACHE_MAX_BYTES) o de entradas (PDF_CACHE_MAX_ENTRADAS), se descartan los que
+llevan más tiempo sin usarse. Si varios usuarios piden el mismo PDF a la vez, solo uno lo genera
+y los demás esperan su resultado.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class CachePDF:
+    """
+    Caché LRU de PDF indexada por (ID del documento, versión de la plantilla).
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entradas=2048):
+        self.max_bytes = max_bytes  # Tamaño máximo total de los PDF en memoria
+        self.max_entradas = max_entradas  # Número máximo de PDF en memoria
+        self._candado = threading.Lock()
+        self._entradas = OrderedDict()  # (id, versión) -> bytes, del menos al más reciente
+        self._bytes = 0
+        self._generando = {}  # (id, versión) -> candado de la generación en curso
+
+    def obtener(self, clave, generador):
+        """
+        Obtiene un PDF desde la caché, generándolo si es necesario.
+
+        Args:
+            clave (tuple): El ID del documento y la versión de la plantilla.
+            generador (callable): Función sin argumentos que devuelve los bytes del PDF, o None si no existe.
+
+        Returns:
+            bytes: Los bytes del PDF, o None si el generador no devolvió ninguno.
+        """
+        pdf_bytes = self._buscar(clave)
+        if pdf_bytes is not None:
+            return pdf_bytes
+
+        with self._candado:
+            candado_generacion = self._generando.setdefault(clave, threading.Lock())
+        with candado_generacion:
+            # Otro hilo pudo haberlo generado mientras se esperaba
+            pdf_bytes = self._buscar(clave)
+            if pdf_bytes is None:
+                try:
+                    pdf_bytes = generador()
+                    if pdf_bytes is not None:
+                        self.guardar(clave, pdf_bytes)
+                finally:
+                    with self._candado:
+                        self._generando.pop(clave, None)
+        return pdf_bytes
+
+    def guardar(self, clave, pdf_bytes):
+        """
+        Guarda un PDF en la caché y descarta los menos usados si se supera el límite.
+
+        Args:
+            clave (tuple): El ID del documento y la versión de la plantilla.
+            pdf_bytes (bytes): Los bytes del PDF.
+
+        Returns:
+            None
+        """
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        with self._candado:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[clave] = pdf_bytes
+            self._bytes += len(pdf_bytes)
+            while self._bytes > self.max_bytes or len(self._entradas) > self.max_entradas:
+                _, descartado = self._entradas.popitem(last=False)
+                self._bytes -= len(descartado)
+
+    def invalidar(self, id_documento=None):
+        """
+        Elimina de la caché los PDF de un documento, o todos si no se indica ninguno.
+
+        Args:
+            id_documento (int): El ID del documento.
+
+        Returns:
+            None
+        """
+        with self._candado:
+            if id_documento is None:
+                self._entradas.clear()
+                self._bytes = 0
+            else:
+                for clave in [clave for clave in self._entradas if clave[0] == id_documento]:
+                    self._bytes -= len(self._entradas.pop(clave))
+
+    def _buscar(self, clave):
+        with self._candado:
+            pdf_bytes = self._entradas.get(clave)
+            if pdf_bytes is not None:
+                self._entradas.move_to_end(clave)
+            return pdf_bytes
+
+
+# Caché de los PDF de facturas
+pdfs_factura = CachePDF(
+    max_bytes=int(os.getenv('PDF_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    max_entradas=int(os.getenv('PDF_CACHE_MAX_ENTRADAS', 2048)),
+)
@@ -0,0 +1,272 @@
+# services/sellado.py
+
+"""
+Este archivo define el sellado de los comprobantes CFDI con el Certificado de Sello Digital (CSD).
+
+El sello es la firma RSA-SHA256 de la cadena original, codificada en base64. La llave privada y el
+certificado se cargan una sola vez por proceso: de CSD_LLAVE (.key del SAT en DER cifrado con
+CSD_CONTRASENA, o PEM) y CSD_CERTIFICADO (.cer en DER o PEM). Si no se configuran, se usa un CSD de
+prueba (llave y certificado autofirmado en CSD_PRUEBA) que se genera la primera vez.
+
+Como no hay un proveedor de certificación, el timbre (sello del SAT y cadena original del complemento
+de certificación) se simula firmándolo con el mismo CSD.
+
+Para firmar muchos comprobantes (corridas de nómina, facturación por lote) sellar_lote() reparte el
+trabajo entre un pool de procesos. Para generar el CSD de prueba (desde el directorio app):
+
+    python -m services.sellado --generar-prueba
+"""
+
+import argparse
+import base64
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+
+from utils.cfdi import agregar_atributo, cadena_original, cadena_original_timbre
+from utils.cfdi_xml import cfdi_a_bytes, nodo_timbre, preparar_comprobante
+
+# RFC del proveedor de certificación con el que se simula el timbre
+RFC_PROVEEDOR_CERTIFICACION = 'SAT970701NN3'
+
+# Número de certificado del CSD de prueba (el SAT codifica el número como dígitos ASCII en el serial)
+NO_CERTIFICADO_PRUEBA = '30001000000500003416'
+
+# CSD del proceso: (llave privada, número de certificado, certificado en base64)
+_csd = None
+_candado = threading.Lock()
+
+
+def generar_csd_prueba(ruta):
+    """
+    Genera una llave RSA y un certificado autofirmado de prueba y los guarda juntos en un archivo PEM.
+
+    Si el archivo ya existe no se modifica, aunque otro proceso lo cree al mismo tiempo.
+
+    Args:
+        ruta (str): La ruta del archivo PEM.
+
+    Returns:
+        str: La ruta del archivo.
+    """
+    llave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nombre = x509.Name([
+        x509.NameAttribute(NameOID.COMMON_NAME, 'CSD DE PRUEBA'),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'FARMACIAS DE DIOS'),
+        x509.NameAttribute(NameOID.X500_UNIQUE_IDENTIFIER, 'FARA2402035H8'),
+    ])
+    ahora = datetime.now(timezone.utc)
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(nombre)
+        .issuer_name(nombre)
+        .public_key(llave.public_key())
+        .serial_number(int.from_bytes(NO_CERTIFICADO_PRUEBA.encode('ascii'), 'big'))
+        .not_valid_before(ahora - timedelta(days=1))
+        .not_valid_after(ahora + timedelta(days=4 * 365))
+        .sign(llave, hashes.SHA256())
+    )
+    contenido = llave.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ) + certificado.public_bytes(serialization.Encoding.PEM)
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, ruta_temporal = tempfile.mkstemp(dir=directorio, prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        # link() falla si el archivo ya existe, así que nunca se reemplaza un CSD creado por otro proceso
+        os.link(ruta_temporal, ruta)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(ruta_temporal)
+    return ruta
+
+
+def _cargar_llave(datos, contraseña):
+    if datos.lstrip().startswith(b'-----'):
+        return serialization.load_pem_private_key(datos, contraseña)
+    return serialization.load_der_private_key(datos, contraseña)
+
+
+def _cargar_certificado(datos):
+    if datos.lstrip().startswith(b'-----'):
+        return x509.load_pem_x509_certificate(datos)
+    return x509.load_der_x509_certificate(datos)
+
+
+def numero_certificado(certificado):
+    """
+    Obtiene el número de certificado (NoCertificado) de un certificado del SAT.
+
+    Args:
+        certificado (Certificate): El certificado.
+
+    Returns:
+        str: El número de certificado de 20 dígitos.
+    """
+    serial = certificado.serial_number
+    try:
+        return serial.to_bytes((serial.bit_length() + 7) // 8, 'big').decode('ascii')
+    except UnicodeDecodeError:
+        return str(serial)
+
+
+def obtener_csd():
+    """
+    Obtiene el CSD del proceso, cargándolo la primera vez.
+
+    Returns:
+        tuple: La llave privada, el número de certificado y el certificado en base64 (DER).
+    """
+    global _csd
+    if _csd is None:
+        with _candado:
+            if _csd is None:
+                ruta_llave = os.getenv('CSD_LLAVE')
+                if ruta_llave:
+                    contraseña = os.getenv('CSD_CONTRASENA')
+                    with open(ruta_llave, 'rb') as archivo:
+                        llave = _cargar_llave(archivo.read(), contraseña.encode() if contraseña else None)
+                    with open(os.environ['CSD_CERTIFICADO'], 'rb') as archivo:
+                        certificado = _cargar_certificado(archivo.read())
+                else:
+                    ruta_prueba = os.getenv('CSD_PRUEBA', os.path.join('csd', 'prueba.pem'))
+                    if not os.path.exists(ruta_prueba):
+                        generar_csd_prueba(ruta_prueba)
+                    with open(ruta_prueba, 'rb') as archivo:
+                        datos = archivo.read()
+                    llave = _cargar_llave(datos, None)
+                    certificado = x509.load_pem_x509_certificate(datos[datos.index(b'-----BEGIN CERTIFICATE-----'):])
+                _csd = (
+                    llave,
+                    numero_certificado(certificado),
+                    base64.b64encode(certificado.public_bytes(serialization.Encoding.DER)).decode('ascii'),
+                )
+    return _csd
+
+
+def sellar_cadena(cadena):
+    """
+    Firma una cadena original con la llave del CSD.
+
+    Args:
+        cadena (str): La cadena original.
+
+    Returns:
+        str: El sello (firma RSA-SHA256 en base64).
+    """
+    llave = obtener_csd()[0]
+    return base64.b64encode(llave.sign(cadena.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256())).decode('ascii')
+
+
+def verificar_sello(cadena, sello):
+    """
+    Verifica que un sello corresponda a una cadena original y al CSD del proceso.
+
+    Args:
+        cadena (str): La cadena original.
+        sello (str): El sello en base64.
+
+    Returns:
+        bool: True si el sello es válido.
+    """
+    try:
+        obtener_csd()[0].public_key().verify(base64.b64decode(sello), cadena.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256())
+        return True
+    except Exception:
+        return False
+
+
+def sellar_comprobante(uuid, comprobante):
+    """
+    Sella un comprobante y simula su timbre.
+
+    Args:
+        uuid (str): El folio fiscal del comprobante.
+        comprobante (tuple): El nodo raíz cfdi:Comprobante (ver utils/cfdi.py).
+
+    Returns:
+        dict: 'no_certificado', 'certificado', 'cadena_original', 'sello_digital_cfdi', 'fecha_timbrado',
+        'sello_digital_sat', 'cadena_original_complemento_certificacion' y 'xml' (el comprobante sellado
+        y timbrado en bytes, que debe guardarse tal cual porque el sello solo verifica con estos datos).
+    """
+    _, no_certificado, certificado = obtener_csd()
+    comprobante = agregar_atributo(comprobante, 'NoCertificado', no_certificado, antes_de='SubTotal')
+    cadena = cadena_original(comprobante)
+    sello = sellar_cadena(cadena)
+
+    fecha_timbrado = datetime.now().replace(microsecond=0)
+    cadena_timbre = cadena_original_timbre(uuid, fecha_timbrado, RFC_PROVEEDOR_CERTIFICACION, sello, no_certificado)
+    sello_sat = sellar_cadena(cadena_timbre)
+    xml = cfdi_a_bytes(preparar_comprobante(comprobante, sello, no_certificado, certificado, nodo_timbre(cadena_timbre, sello_sat)))
+    return {
+        'no_certificado': no_certificado,
+        'certificado': certificado,
+        'cadena_original': cadena,
+        'sello_digital_cfdi': sello,
+        'fecha_timbrado': fecha_timbrado,
+        'sello_digital_sat': sello_sat,
+        'cadena_original_complemento_certificacion': cadena_timbre,
+        'xml': xml,
+    }
+
+
+def _sellar(argumentos):
+    return sellar_comprobante(*argumentos)
+
+
+def _sellar_aislado(argumentos):
+    """
+    Llama a sellar_comprobante() y devuelve el error en lugar de lanzarlo, para que el fallo de un
+    comprobante no detenga el lote. Se ejecuta dentro del pool de procesos.
+    """
+    try:
+        return sellar_comprobante(*argumentos)
+    except Exception as error:
+        return error
+
+
+def sellar_lote(comprobantes, procesos=None, chunksize=32, aislar=False):
+    """
+    Sella muchos comprobantes repartiéndolos entre un pool de procesos. Cada proceso carga el CSD una sola vez.
+
+    Args:
+        comprobantes (list): Tuplas (uuid, comprobante).
+        procesos (int): El número de procesos (1 para sellar en este proceso). Por omisión, uno por CPU.
+        chunksize (int): El número de comprobantes que se envían a un proceso a la vez.
+        aislar (bool): Si es verdadero, el error de un comprobante se devuelve en su posición en lugar
+            de lanzarse.
+
+    Returns:
+        list: Los resultados de sellar_comprobante() (o la excepción de cada comprobante que falló, si
+        aislar es verdadero), en el mismo orden.
+    """
+    sellar = _sellar_aislado if aislar else _sellar
+    obtener_csd()  # Genera el CSD de prueba antes de iniciar los procesos, si hace falta
+    procesos = procesos or os.cpu_count() or 1
+    if procesos <= 1 or len(comprobantes) < 2 * chunksize:
+        return [sellar(argumentos) for argumentos in comprobantes]
+    with ProcessPoolExecutor(max_workers=procesos, initializer=obtener_csd) as pool:
+        return list(pool.map(sellar, comprobantes, chunksize=chunksize))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Administra el CSD con el que se sellan los comprobantes.")
+    parser.add_argument('--generar-prueba', action='store_true', help="Genera el CSD de prueba si no existe")
+    argumentos = parser.parse_args()
+
+    if argumentos.generar_prueba:
+        ruta = os.getenv('CSD_PRUEBA', os.path.join('csd', 'prueba.pem'))
+        generar_csd_prueba(ruta)
+    _, no_certificado, _ = obtener_csd()
+    print(f"CSD cargado, NoCertificado {no_certificado}")
@@ -0,0 +1,87 @@
+# services/sesion_cache.py
+
+"""
+Este archivo define una caché en memoria, compartida por todo el proceso, para las sesiones iniciadas.
+
+Al iniciar sesión se guarda una copia de los datos del usuario bajo un identificador aleatorio;
+la interfaz solo conserva ese identificador, así que las recargas de la página no vuelven a consultar
+la tabla `usuarios`. Cada sesión vence tras AUTH_SESION_DURACION segundos sin usarse y, si se supera
+AUTH_SESIONES_MAX, se descartan las que llevan más tiempo sin usarse.
+"""
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheSesiones:
+    """
+    Caché LRU de sesiones con vencimiento por inactividad.
+    """
+
+    def __init__(self, duracion=1800.0, max_entradas=10000):
+        self.duracion = duracion  # Segundos de inactividad antes de que venza una sesión
+        self.max_entradas = max_entradas  # Número máximo de sesiones en memoria
+        self._candado = threading.Lock()
+        self._entradas = OrderedDict()  # identificador -> (vencimiento, usuario), de la menos a la más reciente
+
+    def crear(self, usuario):
+        """
+        Crea una sesión para un usuario.
+
+        Args:
+            usuario (dict): Los datos del usuario que se guardan en la sesión.
+
+        Returns:
+            str: El identificador de la sesión.
+        """
+        identificador = secrets.token_urlsafe(32)
+        with self._candado:
+            self._entradas[identificador] = (time.monotonic() + self.duracion, usuario)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return identificador
+
+    def obtener(self, identificador):
+        """
+        Obtiene los datos del usuario de una sesión y extiende su vencimiento.
+
+        Args:
+            identificador (str): El identificador de la sesión.
+
+        Returns:
+            dict: Los datos del usuario, o None si la sesión no existe o ya venció.
+        """
+        ahora = time.monotonic()
+        with self._candado:
+            entrada = self._entradas.get(identificador)
+            if entrada is None:
+                return None
+            if entrada[0] <= ahora:
+                del self._entradas[identificador]
+                return None
+            self._entradas[identificador] = (ahora + self.duracion, entrada[1])
+            self._entradas.move_to_end(identificador)
+            return entrada[1]
+
+    def eliminar(self, identificador):
+        """
+        Elimina una sesión.
+
+        Args:
+            identificador (str): El identificador de la sesión.
+
+        Returns:
+            None
+        """
+        with self._candado:
+            self._entradas.pop(identificador, None)
+
+
+# Sesiones iniciadas en este proceso
+sesiones = CacheSesiones(
+    duracion=float(os.getenv('AUTH_SESION_DURACION', 1800)),
+    max_entradas=int(os.getenv('AUTH_SESIONES_MAX', 10000)),
+)
@@ -0,0 +1,59 @@
+# services/tablas_nomina.py
+
+"""
+Este archivo define las tablas de empleados y recibos de nómina para las consultas de SQLAlchemy Core,
+con todas las columnas de Database.sql (el modelo Recibo no corresponde a la tabla recibos_nomina).
+
+Los servicios que consultan o insertan empleados y recibos (nómina, documentos, exportación, extractos,
+migraciones y registro de usuarios) importan estas tablas en lugar de declarar las suyas.
+"""
+
+from sqlalchemy import Date, DateTime, Integer, LargeBinary, Numeric, column, table
+
+empleados = table(
+    'empleados',
+    column('numero_empleado'),
+    column('curp'),
+    column('nss'),
+    column('fecha_ingreso', Date),
+    column('sueldo_base', Numeric(10, 2)),
+    column('puesto_id', Integer),
+    column('departamento_id'),
+    column('riesgo_id'),
+    column('tipo_jornada'),
+    column('tipo_contrato'),
+    column('periodicidad_pago'),
+)
+
+recibos_nomina = table(
+    'recibos_nomina',
+    column('id', Integer),
+    column('uuid'),
+    column('nombre_empresa'),
+    column('uso_destino_cfdi_clave'),
+    column('lugar_expedicion'),
+    column('fecha_expedicion', DateTime),
+    column('rfc_emisor'),
+    column('tipo_comprobante_clave'),
+    column('regimen_laboral_clave'),
+    column('empleado'),
+    column('fecha_pago', DateTime),
+    column('metodo_pago_clave'),
+    column('forma_pago_clave'),
+    column('banco_clave'),
+    column('percepciones_recibo'),
+    column('valor_percepciones', Numeric(10, 2)),
+    column('total_percepciones', Numeric(10, 2)),
+    column('deducciones_recibo'),
+    column('valor_deducciones', Numeric(10, 2)),
+    column('total_deducciones', Numeric(10, 2)),
+    column('importe', Numeric(10, 2)),
+    column('importe_con_letra'),
+    column('moneda'),
+    column('tipo_cambio', Numeric(10, 2)),
+    column('sello_digital_cfdi'),
+    column('sello_digital_sat'),
+    column('cadena_original_complemento_certificacion'),
+    column('codigo_qr', LargeBinary),
+    column('xml_sha256'),
+)
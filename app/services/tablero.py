@@ -0,0 +1,100 @@
+# services/tablero.py
+
+"""
+Este archivo define los datos del tablero de ventas: las series de facturas, ventas e IVA en el
+tiempo y los productos o servicios más vendidos.
+
+Los datos salen del resumen de ventas (ver services/agregados.py), nunca de las facturas. Las series
+se reducen en el servidor a un máximo de MAX_PUNTOS puntos juntando meses consecutivos (bimestres,
+trimestres, semestres o años), así que el navegador recibe lo mismo para un año que para diez.
+"""
+
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from services.agregados import impuestos_por_mes, ventas_por_producto
+from services.documentos import descripciones_catalogo
+
+MAX_PUNTOS = 48  # Puntos máximos de cada serie
+
+# Meses que puede juntar cada punto, de menor a mayor (todos dividen al año)
+MESES_POR_PUNTO = (1, 2, 3, 6, 12)
+
+# Valores que se suman en cada punto de la serie
+VALORES_SERIE = ('facturas', 'subtotal', 'iva', 'total')
+
+
+def _meses_entre(inicio: date, fin: date):
+    return (fin.year - inicio.year) * 12 + fin.month - inicio.month + 1
+
+
+def reducir_serie(filas, max_puntos: int = MAX_PUNTOS):
+    """
+    Junta los meses de una serie mensual en periodos del calendario hasta que no pase de max_puntos.
+
+    Args:
+        filas (list): Diccionarios con 'mes' (date, en orden) y los valores de VALORES_SERIE.
+        max_puntos (int): El número máximo de puntos.
+
+    Returns:
+        tuple: (meses_por_punto, lista de diccionarios con 'periodo' (ISO) y los valores sumados como float).
+    """
+    if not filas:
+        return 1, []
+    meses_totales = _meses_entre(filas[0]['mes'], filas[-1]['mes'])
+    meses = next((meses for meses in MESES_POR_PUNTO if -(-meses_totales // meses) <= max_puntos), MESES_POR_PUNTO[-1])
+
+    puntos = {}
+    for fila in filas:
+        periodo = date(fila['mes'].year, (fila['mes'].month - 1) // meses * meses + 1, 1)
+        punto = puntos.setdefault(periodo, dict.fromkeys(VALORES_SERIE, 0))
+        for valor in VALORES_SERIE:
+            punto[valor] += fila[valor] or 0
+    return meses, [
+        {'periodo': periodo.isoformat(), **{valor: float(punto[valor]) for valor in VALORES_SERIE}}
+        for periodo, punto in puntos.items()
+    ]
+
+
+def serie_ventas(db: Session, desde: date = None, hasta: date = None, max_puntos: int = MAX_PUNTOS):
+    """
+    Obtiene la serie de facturas, ventas e IVA del periodo, reducida a max_puntos puntos.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): Solo los meses a partir del de esta fecha.
+        hasta (date): Solo los meses hasta el de esta fecha.
+        max_puntos (int): El número máximo de puntos.
+
+    Returns:
+        dict: 'meses_por_punto' y 'serie' (ver reducir_serie).
+    """
+    meses, serie = reducir_serie(impuestos_por_mes(db, desde, hasta), max_puntos)
+    return {'meses_por_punto': meses, 'serie': serie}
+
+
+def productos_principales(db: Session, desde: date = None, hasta: date = None, limite: int = 10):
+    """
+    Obtiene los productos o servicios más vendidos del periodo, con su descripción.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        desde (date): Solo los meses a partir del de esta fecha.
+        hasta (date): Solo los meses hasta el de esta fecha.
+        limite (int): El número de productos.
+
+    Returns:
+        list: Diccionarios con clave_producto_servicio, descripcion, facturas, cantidad y total (float).
+    """
+    descripciones = descripciones_catalogo(db, 'productos_servicios', 'clave_producto_servicio')
+    return [
+        {
+            'clave_producto_servicio': producto['clave_producto_servicio'],
+            'descripcion': descripciones.get(producto['clave_producto_servicio'], producto['clave_producto_servicio']),
+            'facturas': int(producto['facturas']),
+            'cantidad': int(producto['cantidad']),
+            'total': float(producto['total']),
+        }
+        for producto in ventas_por_producto(db, desde, hasta, limite)
+    ]
@@ -0,0 +1,294 @@
+# services/trabajos.py
+
+"""
+Este archivo define una cola de trabajos en segundo plano guardada en la tabla `trabajos` de PostgreSQL.
+
+Los pasos pesados (código QR, sellos, importe con letra, PDF) se encolan en la misma transacción
+que crea la factura, así que el trabajo solo es visible cuando la factura ya está confirmada.
+Los trabajadores toman trabajos con SELECT ... FOR UPDATE SKIP LOCKED, de modo que varios
+procesos (o varias máquinas) pueden trabajar a la vez sin tomar el mismo trabajo. Los trabajos
+fallidos se reintentan con espera exponencial hasta `max_intentos`.
+
+Para iniciar los trabajadores (desde el directorio app):
+
+    python -m services.trabajos --procesos 4
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import JSON, DateTime, Integer, column, insert, select, table, update
+from sqlalchemy.orm import Session
+
+from services.database import get_db
+from services.trazas import traza
+
+# Estados de un trabajo
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+TERMINADO = 'terminado'
+FALLIDO = 'fallido'
+
+# Módulos que registran tareas; el trabajador los importa al iniciar
+MODULOS_TAREAS = (
+    'services.factura_service',
+)
+
+# Un trabajo en proceso por más tiempo que esto se considera abandonado (el trabajador murió)
+VENCIMIENTO_TRABAJO = timedelta(seconds=int(os.getenv('TRABAJOS_VENCIMIENTO', 600)))
+
+# Tabla de trabajos con las columnas definidas en Database.sql
+trabajos = table(
+    'trabajos',
+    column('id'),
+    column('tipo'),
+    column('clave'),
+    column('carga', JSON),
+    column('estado'),
+    column('intentos', Integer),
+    column('max_intentos', Integer),
+    column('ejecutar_despues', DateTime),
+    column('bloqueado_por'),
+    column('bloqueado_en', DateTime),
+    column('error'),
+    column('creado_en', DateTime),
+    column('terminado_en', DateTime),
+)
+
+# Funciones de cada tipo de trabajo: tipo -> función(db, **carga)
+TAREAS = {}
+
+
+def tarea(tipo):
+    """
+    Registra una función como la tarea que ejecuta los trabajos de un tipo.
+
+    Args:
+        tipo (str): El tipo de trabajo.
+
+    Returns:
+        callable: El decorador que registra la función.
+    """
+    def registrar(funcion):
+        TAREAS[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(db: Session, tipo: str, carga: dict, clave: str = None, max_intentos: int = 5):
+    """
+    Agrega un trabajo a la cola. No confirma la transacción: el trabajo se vuelve visible
+    para los trabajadores junto con el resto de los cambios de quien lo encola.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        tipo (str): El tipo de trabajo (debe existir una tarea registrada con ese tipo).
+        carga (dict): Los argumentos de la tarea; deben poder serializarse como JSON.
+        clave (str): Un identificador para consultar el trabajo después, por ejemplo 'factura:15'.
+        max_intentos (int): El número máximo de intentos antes de marcarlo como fallido.
+
+    Returns:
+        int: El ID del trabajo.
+    """
+    sentencia = insert(trabajos).values(
+        tipo=tipo,
+        clave=clave,
+        carga=carga,
+        estado=PENDIENTE,
+        intentos=0,
+        max_intentos=max_intentos,
+        ejecutar_despues=datetime.now(),
+        creado_en=datetime.now(),
+    ).returning(trabajos.c.id)
+    return db.execute(sentencia).scalar_one()
+
+
+def obtener_estado_trabajo(db: Session, clave: str):
+    """
+    Obtiene el estado del trabajo más reciente con una clave.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        clave (str): La clave con la que se encoló el trabajo.
+
+    Returns:
+        dict: Un diccionario con 'id', 'estado', 'intentos' y 'error', o None si no hay trabajos con esa clave.
+    """
+    consulta = (
+        select(trabajos.c.id, trabajos.c.estado, trabajos.c.intentos, trabajos.c.error)
+        .where(trabajos.c.clave == clave)
+        .order_by(trabajos.c.id.desc())
+        .limit(1)
+    )
+    fila = db.execute(consulta).first()
+    return dict(fila._mapping) if fila else None
+
+
+def tomar_trabajos(db: Session, trabajador: str, limite: int = 1):
+    """
+    Toma trabajos pendientes y los marca como en proceso, saltando los que otro trabajador tiene bloqueados.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        trabajador (str): El identificador del trabajador.
+        limite (int): El número máximo de trabajos a tomar.
+
+    Returns:
+        list: Los trabajos tomados, como diccionarios con 'id', 'tipo', 'carga', 'intentos' y 'max_intentos'.
+    """
+    ahora = datetime.now()
+    disponibles = (
+        select(trabajos.c.id)
+        .where(trabajos.c.estado == PENDIENTE, trabajos.c.ejecutar_despues <= ahora)
+        .order_by(trabajos.c.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    )
+    sentencia = (
+        update(trabajos)
+        .where(trabajos.c.id.in_(disponibles.scalar_subquery()))
+        .values(estado=EN_PROCESO, bloqueado_por=trabajador, bloqueado_en=ahora, intentos=trabajos.c.intentos + 1)
+        .returning(trabajos.c.id, trabajos.c.tipo, trabajos.c.carga, trabajos.c.intentos, trabajos.c.max_intentos)
+    )
+    tomados = [dict(fila._mapping) for fila in db.execute(sentencia)]
+    db.commit()
+    return tomados
+
+
+def ejecutar_trabajo(db: Session, trabajo: dict):
+    """
+    Ejecuta un trabajo tomado y registra el resultado. Si falla, se reprograma con espera
+    exponencial o se marca como fallido si ya agotó sus intentos.
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        trabajo (dict): El trabajo, tal como lo devuelve tomar_trabajos().
+
+    Returns:
+        bool: True si el trabajo terminó correctamente.
+    """
+    try:
+        funcion = TAREAS.get(trabajo['tipo'])
+        if funcion is None:
+            raise LookupError(f"No hay una tarea registrada para el tipo {trabajo['tipo']}")
+        with traza(f"trabajo.{trabajo['tipo']}", **{'trabajo.id': trabajo['id'], 'trabajo.intento': trabajo['intentos']}):
+            funcion(db, **(trabajo['carga'] or {}))
+        db.execute(
+            update(trabajos).where(trabajos.c.id == trabajo['id'])
+            .values(estado=TERMINADO, error=None, bloqueado_por=None, terminado_en=datetime.now())
+        )
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        error = traceback.format_exc(limit=5)
+        if trabajo['intentos'] >= trabajo['max_intentos']:
+            valores = {'estado': FALLIDO, 'terminado_en': datetime.now()}
+        else:
+            valores = {'estado': PENDIENTE, 'ejecutar_despues': datetime.now() + timedelta(seconds=2 ** trabajo['intentos'])}
+        db.execute(update(trabajos).where(trabajos.c.id == trabajo['id']).values(error=error, bloqueado_por=None, **valores))
+        db.commit()
+        return False
+
+
+def recuperar_trabajos_abandonados(db: Session, vencimiento: timedelta = VENCIMIENTO_TRABAJO):
+    """
+    Regresa a pendientes los trabajos que llevan demasiado tiempo en proceso (su trabajador terminó sin registrarlos).
+
+    Args:
+        db (Session): La sesión de la base de datos.
+        vencimiento (timedelta): El tiempo máximo que un trabajo puede estar en proceso.
+
+    Returns:
+        int: El número de trabajos recuperados.
+    """
+    resultado = db.execute(
+        update(trabajos)
+        .where(trabajos.c.estado == EN_PROCESO, trabajos.c.bloqueado_en < datetime.now() - vencimiento)
+        .values(estado=PENDIENTE, bloqueado_por=None, ejecutar_despues=datetime.now())
+    )
+    db.commit()
+    return resultado.rowcount
+
+
+def cargar_tareas():
+    """
+    Importa los módulos que registran tareas.
+    """
+    for modulo in MODULOS_TAREAS:
+        importlib.import_module(modulo)
+
+
+def trabajar(trabajador: str, lote: int = 10, espera: float = 1.0, una_vez: bool = False):
+    """
+    Ciclo de un trabajador: toma trabajos, los ejecuta y espera cuando no hay pendientes.
+
+    Args:
+        trabajador (str): El identificador del trabajador.
+        lote (int): El número de trabajos que toma en cada consulta.
+        espera (float): Los segundos que espera cuando la cola está vacía.
+        una_vez (bool): Si es True, termina cuando la cola queda vacía.
+
+    Returns:
+        int: El número de trabajos ejecutados.
+    """
+    cargar_tareas()
+    ejecutados = 0
+    ultima_recuperacion = 0.0
+    with get_db() as db:
+        while True:
+            if time.monotonic() - ultima_recuperacion > VENCIMIENTO_TRABAJO.total_seconds() / 2:
+                recuperar_trabajos_abandonados(db)
+                ultima_recuperacion = time.monotonic()
+
+            tomados = tomar_trabajos(db, trabajador, lote)
+            for trabajo in tomados:
+                ejecutar_trabajo(db, trabajo)
+                ejecutados += 1
+
+            if not tomados:
+                if una_vez:
+                    return ejecutados
+                time.sleep(espera)
+
+
+def _proceso_trabajador(indice, lote, espera):
+    """
+    Punto de entrada de cada proceso trabajador.
+    """
+    # Usar el módulo importado (no __main__) para compartir el registro de tareas con los módulos que las definen
+    from services.trabajos import trabajar
+    try:
+        trabajar(f"{socket.gethostname()}:{os.getpid()}:{indice}", lote, espera)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta los trabajos en segundo plano de la cola.")
+    parser.add_argument('--procesos', type=int, default=1, help="Número de procesos trabajadores")
+    parser.add_argument('--lote', type=int, default=10, help="Trabajos que toma cada trabajador por consulta")
+    parser.add_argument('--espera', type=float, default=1.0, help="Segundos de espera cuando la cola está vacía")
+    argumentos = parser.parse_args()
+
+    # Cada proceso crea su propio pool de conexiones
+    contexto = multiprocessing.get_context('spawn')
+    procesos = [
+        contexto.Process(target=_proceso_trabajador, args=(indice, argumentos.lote, argumentos.espera))
+        for indice in range(argumentos.procesos)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    print(f"{len(procesos)} trabajadores iniciados")
+    try:
+        for proceso in procesos:
+            proceso.join()
+    except KeyboardInterrupt:
+        for proceso in procesos:
+            proceso.terminate()
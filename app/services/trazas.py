@@ -0,0 +1,262 @@
+# services/trazas.py
+
+"""
+Este archivo define trazas ligeras de las etapas de generación de una factura (consultas de
+catálogos, alta, sellado, importe con letra, código QR, datos y generación del PDF, etc.).
+
+Una traza empieza con traza() (una ejecución de la vista o un trabajo en segundo plano) y cada etapa
+dentro de ella se mide con tramo(); fuera de una traza, tramo() no hace nada. Al terminar la traza
+sus tramos se guardan en memoria (las últimas TRAZAS_MAXIMO, para el panel de depuración) y, si se
+define TRAZAS_ARCHIVO, se agregan a ese archivo como una línea JSON con el formato OTLP/JSON de
+OpenTelemetry (resourceSpans), que puede importarse en un colector o en Jaeger.
+
+    TRAZAS_ACTIVAS  Si es falso, traza() y tramo() no registran nada (por omisión están activas).
+    TRAZAS_ARCHIVO  Archivo JSON Lines donde se exporta cada traza. Si no se define no se exporta.
+    TRAZAS_MAXIMO   Número de trazas que se conservan en memoria (por omisión 50).
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRAZAS_ACTIVAS = os.environ.get('TRAZAS_ACTIVAS', 'true').strip().lower() in ('1', 'true', 'si', 'sí', 'yes', 'on')
+TRAZAS_ARCHIVO = os.environ.get('TRAZAS_ARCHIVO')
+TRAZAS_MAXIMO = int(os.environ.get('TRAZAS_MAXIMO', '50'))
+
+SERVICIO = 'facturas-cfdi'
+ALCANCE = 'services.trazas'
+
+# Tipo INTERNAL y estados OK y ERROR de OpenTelemetry
+TIPO_INTERNO = 1
+ESTADO_OK = 1
+ESTADO_ERROR = 2
+
+# Tramo activo del hilo (None fuera de una traza)
+_tramo_actual = ContextVar('tramo_actual', default=None)
+
+
+class Tramo:
+    """
+    Una etapa medida dentro de una traza.
+    """
+
+    def __init__(self, nombre, id_traza, id_padre, tramos, atributos):
+        self.nombre = nombre
+        self.id_traza = id_traza
+        self.id_tramo = secrets.token_hex(8)
+        self.id_padre = id_padre
+        self.tramos = tramos  # Lista de tramos terminados de la traza (compartida)
+        self.atributos = dict(atributos)
+        self.inicio_ns = time.time_ns()
+        self._inicio_contador = time.perf_counter_ns()
+        self.fin_ns = None
+        self.error = None
+
+    def agregar_atributos(self, **atributos):
+        self.atributos.update(atributos)
+
+    def terminar(self):
+        self.fin_ns = self.inicio_ns + time.perf_counter_ns() - self._inicio_contador
+        self.tramos.append(self)
+
+    def como_otlp(self):
+        return {
+            'traceId': self.id_traza,
+            'spanId': self.id_tramo,
+            'parentSpanId': self.id_padre or '',
+            'name': self.nombre,
+            'kind': TIPO_INTERNO,
+            'startTimeUnixNano': str(self.inicio_ns),
+            'endTimeUnixNano': str(self.fin_ns),
+            'attributes': [{'key': clave, 'value': _valor_otlp(valor)} for clave, valor in self.atributos.items()],
+            'status': {'code': ESTADO_ERROR, 'message': self.error} if self.error else {'code': ESTADO_OK},
+        }
+
+
+def _valor_otlp(valor):
+    """
+    Convierte el valor de un atributo al formato AnyValue de OTLP/JSON.
+    """
+    if isinstance(valor, bool):
+        return {'boolValue': valor}
+    if isinstance(valor, int):
+        return {'intValue': str(valor)}
+    if isinstance(valor, float):
+        return {'doubleValue': valor}
+    return {'stringValue': str(valor)}
+
+
+class RegistroTrazas:
+    """
+    Conserva las últimas trazas terminadas del proceso y las exporta al archivo configurado.
+    """
+
+    def __init__(self, maximo=TRAZAS_MAXIMO, archivo=TRAZAS_ARCHIVO):
+        self.archivo = archivo
+        self._candado = threading.Lock()
+        self._trazas = deque(maxlen=maximo)  # Documentos OTLP/JSON, de la más antigua a la más reciente
+
+    def agregar(self, tramos):
+        documento = {
+            'resourceSpans': [{
+                'resource': {'attributes': [
+                    {'key': 'service.name', 'value': {'stringValue': SERVICIO}},
+                    {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+                ]},
+                'scopeSpans': [{
+                    'scope': {'name': ALCANCE},
+                    'spans': [tramo.como_otlp() for tramo in sorted(tramos, key=lambda tramo: tramo.inicio_ns)],
+                }],
+            }],
+        }
+        with self._candado:
+            self._trazas.append(documento)
+            if self.archivo:
+                # Una sola escritura por línea para que los procesos que comparten el archivo no se mezclen
+                with open(self.archivo, 'a', encoding='utf-8') as archivo:
+                    archivo.write(json.dumps(documento, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def ultimas(self, cantidad):
+        """
+        Obtiene las últimas trazas terminadas, de la más reciente a la más antigua.
+
+        Si hay archivo de exportación se leen de él, así que incluyen las de otros procesos (por
+        ejemplo los trabajadores de la cola); si no, solo las de este proceso.
+
+        Args:
+            cantidad (int): El número de trazas.
+
+        Returns:
+            list: Documentos OTLP/JSON, uno por traza.
+        """
+        if self.archivo and os.path.exists(self.archivo):
+            return [json.loads(linea) for linea in reversed(_ultimas_lineas(self.archivo, cantidad))]
+        with self._candado:
+            return list(self._trazas)[::-1][:cantidad]
+
+
+registro_trazas = RegistroTrazas()
+
+
+def _ultimas_lineas(ruta, cantidad, tamaño_bloque=64 * 1024):
+    """
+    Lee las últimas líneas de un archivo desde el final, sin recorrerlo completo.
+    """
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(0, os.SEEK_END)
+        posicion = archivo.tell()
+        datos = b''
+        while posicion > 0 and datos.count(b'\n') <= cantidad:
+            leer = min(tamaño_bloque, posicion)
+            posicion -= leer
+            archivo.seek(posicion)
+            datos = archivo.read(leer) + datos
+    lineas = [linea for linea in datos.decode('utf-8', errors='replace').splitlines() if linea.strip()]
+    if posicion > 0:
+        # La primera línea leída puede estar incompleta
+        lineas = lineas[1:]
+    return lineas[-cantidad:]
+
+
+@contextmanager
+def _medir(tramo):
+    token = _tramo_actual.set(tramo)
+    try:
+        yield tramo
+    except Exception as error:
+        # Las excepciones de control de Streamlit (st.rerun) no heredan de Exception y no se marcan como error
+        tramo.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        _tramo_actual.reset(token)
+        tramo.terminar()
+
+
+@contextmanager
+def traza(nombre: str, **atributos):
+    """
+    Inicia una traza con su tramo raíz. Dentro de otra traza se comporta como tramo().
+
+    Args:
+        nombre (str): El nombre de la traza (por ejemplo 'generar_factura' o 'trabajo.procesar_factura').
+        **atributos: Atributos del tramo raíz (str, int, float o bool).
+
+    Yields:
+        Tramo: El tramo raíz, o None si las trazas no están activas.
+    """
+    if not TRAZAS_ACTIVAS:
+        yield None
+        return
+    if _tramo_actual.get() is not None:
+        with tramo(nombre, **atributos) as actual:
+            yield actual
+        return
+
+    raiz = Tramo(nombre, secrets.token_hex(16), None, [], atributos)
+    try:
+        with _medir(raiz):
+            yield raiz
+    finally:
+        registro_trazas.agregar(raiz.tramos)
+
+
+@contextmanager
+def tramo(nombre: str, **atributos):
+    """
+    Mide una etapa dentro de la traza activa. Fuera de una traza no hace nada.
+
+    Args:
+        nombre (str): El nombre de la etapa.
+        **atributos: Atributos del tramo (str, int, float o bool).
+
+    Yields:
+        Tramo: El tramo, o None si no hay una traza activa.
+    """
+    padre = _tramo_actual.get()
+    if padre is None:
+        yield None
+        return
+    with _medir(Tramo(nombre, padre.id_traza, padre.id_tramo, padre.tramos, atributos)) as actual:
+        yield actual
+
+
+def linea_de_tiempo(documento):
+    """
+    Obtiene los tramos de una traza exportada, con tiempos relativos a su inicio, para mostrarlos.
+
+    Args:
+        documento (dict): Un documento OTLP/JSON como los que devuelve registro_trazas.ultimas().
+
+    Returns:
+        list: Diccionarios con 'tramo', 'profundidad', 'inicio_ms', 'fin_ms', 'duracion_ms' y 'error',
+        en orden de inicio.
+    """
+    tramos = [tramo for recurso in documento['resourceSpans'] for alcance in recurso['scopeSpans'] for tramo in alcance['spans']]
+    if not tramos:
+        return []
+    inicio = min(int(tramo['startTimeUnixNano']) for tramo in tramos)
+    padres = {tramo['spanId']: tramo['parentSpanId'] for tramo in tramos}
+
+    def profundidad(id_tramo):
+        nivel = 0
+        while padres.get(id_tramo):
+            id_tramo = padres[id_tramo]
+            nivel += 1
+        return nivel
+
+    return [
+        {
+            'tramo': tramo['name'],
+            'profundidad': profundidad(tramo['spanId']),
+            'inicio_ms': (int(tramo['startTimeUnixNano']) - inicio) / 1e6,
+            'fin_ms': (int(tramo['endTimeUnixNano']) - inicio) / 1e6,
+            'duracion_ms': (int(tramo['endTimeUnixNano']) - int(tramo['startTimeUnixNano'])) / 1e6,
+            'error': tramo['status'].get('message', ''),
+        }
+        for tramo in sorted(tramos, key=lambda tramo: int(tramo['startTimeUnixNano']))
+    ]
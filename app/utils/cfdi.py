@@ -0,0 +1,371 @@
+# utils/cfdi.py
+
+"""
+Este archivo define la estructura de los comprobantes CFDI 3.3 (facturas y recibos de nómina con el
+complemento Nómina 1.2) y la construcción de su cadena original.
+
+Un comprobante se representa como un árbol de nodos (etiqueta, atributos, hijos), donde los atributos
+son una lista de pares (nombre, valor) en el orden del esquema del SAT y los atributos sin valor se
+omiten. La cadena original se obtiene recorriendo el árbol en el mismo orden que la hoja de
+transformación cadenaoriginal_3_3.xslt: "||" + valores separados por "|" + "||", con los espacios
+normalizados.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+VERSION_CFDI = '3.3'
+VERSION_NOMINA = '1.2'
+VERSION_TIMBRE = '1.1'
+
+# Claves del SAT usadas en los comprobantes
+MONEDA = 'MXN'
+IMPUESTO_ISR = '001'
+IMPUESTO_IVA = '002'
+IMPUESTO_IEPS = '003'
+CLAVE_UNIDAD_POR_OMISION = 'H87'  # Pieza
+CLAVE_PRODUCTO_NOMINA = '84111505'  # Servicios de contabilidad de sueldos y salarios
+CLAVE_UNIDAD_NOMINA = 'ACT'  # Actividad
+USO_CFDI_NOMINA = 'P01'  # Por definir
+REGIMEN_FISCAL_EMISOR = '601'  # General de Ley Personas Morales
+
+CENTAVOS = Decimal('0.01')
+MILLONESIMAS = Decimal('0.000001')
+
+
+def nodo(etiqueta, atributos, hijos=()):
+    """
+    Crea un nodo del comprobante.
+
+    Args:
+        etiqueta (str): El nombre del elemento XML, con prefijo (por ejemplo 'cfdi:Emisor').
+        atributos (list): Pares (nombre, valor) en el orden del esquema; los valores None o '' se omiten.
+        hijos (iterable): Los nodos hijos.
+
+    Returns:
+        tuple: El nodo (etiqueta, atributos, hijos).
+    """
+    return (etiqueta, [(nombre, valor) for nombre, valor in atributos if valor not in (None, '')], list(hijos))
+
+
+def _decimal(valor):
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(repr(valor)) if isinstance(valor, float) else Decimal(str(valor))
+
+
+def formatear_importe(valor):
+    """
+    Formatea un importe con dos decimales, por ejemplo "1160.00".
+    """
+    return str(_decimal(valor).quantize(CENTAVOS, ROUND_HALF_UP))
+
+
+def formatear_tasa(valor):
+    """
+    Formatea una tasa con seis decimales, como en el catálogo TasaOCuota, por ejemplo "0.160000".
+    """
+    return str(_decimal(valor).quantize(MILLONESIMAS, ROUND_HALF_UP))
+
+
+def formatear_cantidad(valor):
+    """
+    Formatea una cantidad con hasta seis decimales, sin ceros de más, por ejemplo "3" o "1.5".
+    """
+    texto = str(_decimal(valor).quantize(MILLONESIMAS, ROUND_HALF_UP))
+    return texto.rstrip('0').rstrip('.') if '.' in texto else texto
+
+
+def formatear_fecha(valor):
+    """
+    Formatea una fecha y hora como en el CFDI (AAAA-MM-DDThh:mm:ss), o una fecha sola (AAAA-MM-DD).
+    """
+    if isinstance(valor, datetime):
+        return valor.replace(microsecond=0).isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _impuestos_concepto(traslados, retenciones):
+    """
+    Crea el nodo de impuestos de un concepto. Cada impuesto es un diccionario con 'impuesto', 'base', 'tasa' e 'importe'.
+    """
+    hijos = []
+    if traslados:
+        hijos.append(nodo('cfdi:Traslados', [], [
+            nodo('cfdi:Traslado', [
+                ('Base', formatear_importe(traslado['base'])),
+                ('Impuesto', traslado['impuesto']),
+                ('TipoFactor', 'Tasa'),
+                ('TasaOCuota', formatear_tasa(traslado['tasa'])),
+                ('Importe', formatear_importe(traslado['importe'])),
+            ])
+            for traslado in traslados
+        ]))
+    if retenciones:
+        hijos.append(nodo('cfdi:Retenciones', [], [
+            nodo('cfdi:Retencion', [
+                ('Base', formatear_importe(retencion['base'])),
+                ('Impuesto', retencion['impuesto']),
+                ('TipoFactor', 'Tasa'),
+                ('TasaOCuota', formatear_tasa(retencion['tasa'])),
+                ('Importe', formatear_importe(retencion['importe'])),
+            ])
+            for retencion in retenciones
+        ]))
+    return nodo('cfdi:Impuestos', [], hijos)
+
+
+def _impuestos_comprobante(traslados, retenciones):
+    """
+    Crea el nodo de impuestos del comprobante, con los impuestos de los conceptos agrupados.
+    """
+    atributos = []
+    hijos = []
+    if retenciones:
+        por_impuesto = {}
+        for retencion in retenciones:
+            por_impuesto[retencion['impuesto']] = por_impuesto.get(retencion['impuesto'], Decimal(0)) + _decimal(retencion['importe'])
+        hijos.append(nodo('cfdi:Retenciones', [], [
+            nodo('cfdi:Retencion', [('Impuesto', impuesto), ('Importe', formatear_importe(importe))])
+            for impuesto, importe in por_impuesto.items()
+        ]))
+        atributos.append(('TotalImpuestosRetenidos', formatear_importe(sum(por_impuesto.values()))))
+    if traslados:
+        por_tasa = {}
+        for traslado in traslados:
+            clave = (traslado['impuesto'], formatear_tasa(traslado['tasa']))
+            por_tasa[clave] = por_tasa.get(clave, Decimal(0)) + _decimal(traslado['importe'])
+        hijos.append(nodo('cfdi:Traslados', [], [
+            nodo('cfdi:Traslado', [('Impuesto', impuesto), ('TipoFactor', 'Tasa'), ('TasaOCuota', tasa), ('Importe', formatear_importe(importe))])
+            for (impuesto, tasa), importe in por_tasa.items()
+        ]))
+        atributos.append(('TotalImpuestosTrasladados', formatear_importe(sum(por_tasa.values()))))
+    return nodo('cfdi:Impuestos', atributos, hijos)
+
+
+def comprobante_factura(datos):
+    """
+    Crea el comprobante CFDI 3.3 de una factura de un solo concepto.
+
+    Args:
+        datos (dict): Los datos de la factura: 'fecha_expedicion', 'forma_pago_clave', 'metodo_pago_clave',
+            'tipo_comprobante_clave', 'lugar_expedicion', 'rfc_emisor', 'nombre_empresa', 'regimen_fiscal_clave',
+            'rfc_receptor', 'uso_destino_cfdi_clave', 'clave_producto_servicio', 'cantidad', 'unidad',
+            'descripcion', 'valor_unitario', 'importe', 'subtotal', 'total', y las listas 'traslados' y
+            'retenciones' (diccionarios con 'impuesto', 'base', 'tasa' e 'importe').
+
+    Returns:
+        tuple: El nodo raíz cfdi:Comprobante, sin sello ni certificado.
+    """
+    traslados = datos.get('traslados') or []
+    retenciones = datos.get('retenciones') or []
+    concepto = nodo('cfdi:Concepto', [
+        ('ClaveProdServ', datos['clave_producto_servicio']),
+        ('Cantidad', formatear_cantidad(datos['cantidad'])),
+        ('ClaveUnidad', datos.get('clave_unidad') or CLAVE_UNIDAD_POR_OMISION),
+        ('Unidad', datos.get('unidad')),
+        ('Descripcion', datos['descripcion']),
+        ('ValorUnitario', formatear_importe(datos['valor_unitario'])),
+        ('Importe', formatear_importe(datos['importe'])),
+    ], [_impuestos_concepto(traslados, retenciones)] if traslados or retenciones else [])
+
+    hijos = [
+        nodo('cfdi:Emisor', [('Rfc', datos['rfc_emisor']), ('Nombre', datos.get('nombre_empresa')), ('RegimenFiscal', datos['regimen_fiscal_clave'])]),
+        nodo('cfdi:Receptor', [('Rfc', datos['rfc_receptor']), ('UsoCFDI', datos['uso_destino_cfdi_clave'])]),
+        nodo('cfdi:Conceptos', [], [concepto]),
+    ]
+    if traslados or retenciones:
+        hijos.append(_impuestos_comprobante(traslados, retenciones))
+
+    return nodo('cfdi:Comprobante', [
+        ('Version', VERSION_CFDI),
+        ('Folio', datos.get('folio')),
+        ('Fecha', formatear_fecha(datos['fecha_expedicion'])),
+        ('FormaPago', datos.get('forma_pago_clave')),
+        ('NoCertificado', datos.get('no_certificado')),
+        ('SubTotal', formatear_importe(datos['subtotal'])),
+        ('Moneda', MONEDA),
+        ('Total', formatear_importe(datos['total'])),
+        ('TipoDeComprobante', datos['tipo_comprobante_clave']),
+        ('MetodoPago', datos.get('metodo_pago_clave')),
+        ('LugarExpedicion', datos['lugar_expedicion']),
+    ], hijos)
+
+
+def comprobante_recibo(datos):
+    """
+    Crea el comprobante CFDI 3.3 de un recibo de nómina, con el complemento Nómina 1.2.
+
+    Args:
+        datos (dict): Los datos del recibo: 'fecha_expedicion', 'lugar_expedicion', 'rfc_emisor', 'nombre_empresa',
+            'rfc_receptor', 'fecha_pago', 'fecha_inicial_pago', 'fecha_final_pago', 'dias_pagados',
+            'percepciones_recibo', 'total_percepciones', 'deducciones_recibo', 'total_deducciones', 'importe',
+            'regimen_laboral_clave' y los datos del empleado: 'numero_empleado', 'curp', 'nss', 'fecha_ingreso',
+            'tipo_contrato', 'tipo_jornada', 'periodicidad_pago', 'riesgo_id', 'departamento', 'puesto'
+            (los que falten se omiten).
+
+    Returns:
+        tuple: El nodo raíz cfdi:Comprobante, sin sello ni certificado.
+    """
+    total_percepciones = _decimal(datos['total_percepciones'])
+    total_deducciones = _decimal(datos['total_deducciones'])
+
+    nomina = nodo('nomina12:Nomina', [
+        ('Version', VERSION_NOMINA),
+        ('TipoNomina', 'O'),
+        ('FechaPago', formatear_fecha(datos['fecha_pago'].date() if isinstance(datos['fecha_pago'], datetime) else datos['fecha_pago'])),
+        ('FechaInicialPago', formatear_fecha(datos.get('fecha_inicial_pago') or datos['fecha_pago'])[:10]),
+        ('FechaFinalPago', formatear_fecha(datos.get('fecha_final_pago') or datos['fecha_pago'])[:10]),
+        ('NumDiasPagados', formatear_cantidad(datos.get('dias_pagados') or 1)),
+        ('TotalPercepciones', formatear_importe(total_percepciones)),
+        ('TotalDeducciones', formatear_importe(total_deducciones) if total_deducciones else None),
+    ], [
+        nodo('nomina12:Receptor', [
+            ('Curp', datos.get('curp')),
+            ('NumSeguridadSocial', datos.get('nss')),
+            ('FechaInicioRelLaboral', formatear_fecha(datos['fecha_ingreso']) if datos.get('fecha_ingreso') else None),
+            ('TipoContrato', datos.get('tipo_contrato')),
+            ('TipoJornada', datos.get('tipo_jornada')),
+            ('TipoRegimen', datos['regimen_laboral_clave']),
+            ('NumEmpleado', datos['numero_empleado']),
+            ('Departamento', datos.get('departamento')),
+            ('Puesto', datos.get('puesto')),
+            ('RiesgoPuesto', datos.get('riesgo_id')),
+            ('PeriodicidadPago', datos.get('periodicidad_pago')),
+            ('ClaveEntFed', datos.get('clave_entidad', 'CMX')),
+        ]),
+        nodo('nomina12:Percepciones', [
+            ('TotalSueldos', formatear_importe(total_percepciones)),
+            ('TotalGravado', formatear_importe(total_percepciones)),
+            ('TotalExento', formatear_importe(0)),
+        ], [
+            nodo('nomina12:Percepcion', [
+                ('TipoPercepcion', datos['percepciones_recibo']),
+                ('Clave', datos['percepciones_recibo']),
+                ('Concepto', datos.get('concepto_percepcion', 'SUELDO')),
+                ('ImporteGravado', formatear_importe(total_percepciones)),
+                ('ImporteExento', formatear_importe(0)),
+            ]),
+        ]),
+    ] + ([
+        nodo('nomina12:Deducciones', [('TotalOtrasDeducciones', formatear_importe(total_deducciones))], [
+            nodo('nomina12:Deduccion', [
+                ('TipoDeduccion', datos['deducciones_recibo']),
+                ('Clave', datos['deducciones_recibo']),
+                ('Concepto', datos.get('concepto_deduccion', 'DEDUCCIONES')),
+                ('Importe', formatear_importe(total_deducciones)),
+            ]),
+        ]),
+    ] if total_deducciones and datos.get('deducciones_recibo') else []))
+
+    return nodo('cfdi:Comprobante', [
+        ('Version', VERSION_CFDI),
+        ('Fecha', formatear_fecha(datos['fecha_expedicion'])),
+        ('FormaPago', datos.get('forma_pago_clave')),
+        ('NoCertificado', datos.get('no_certificado')),
+        ('SubTotal', formatear_importe(total_percepciones)),
+        ('Descuento', formatear_importe(total_deducciones) if total_deducciones else None),
+        ('Moneda', MONEDA),
+        ('Total', formatear_importe(datos['importe'])),
+        ('TipoDeComprobante', 'N'),
+        ('MetodoPago', 'PUE'),
+        ('LugarExpedicion', datos['lugar_expedicion']),
+    ], [
+        nodo('cfdi:Emisor', [('Rfc', datos['rfc_emisor']), ('Nombre', datos.get('nombre_empresa')), ('RegimenFiscal', REGIMEN_FISCAL_EMISOR)]),
+        nodo('cfdi:Receptor', [('Rfc', datos['rfc_receptor']), ('UsoCFDI', USO_CFDI_NOMINA)]),
+        nodo('cfdi:Conceptos', [], [
+            nodo('cfdi:Concepto', [
+                ('ClaveProdServ', CLAVE_PRODUCTO_NOMINA),
+                ('Cantidad', '1'),
+                ('ClaveUnidad', CLAVE_UNIDAD_NOMINA),
+                ('Descripcion', 'Pago de nómina'),
+                ('ValorUnitario', formatear_importe(total_percepciones)),
+                ('Importe', formatear_importe(total_percepciones)),
+                ('Descuento', formatear_importe(total_deducciones) if total_deducciones else None),
+            ]),
+        ]),
+        nodo('cfdi:Complemento', [], [nomina]),
+    ])
+
+
+def agregar_atributo(comprobante, nombre, valor, antes_de=None):
+    """
+    Agrega (o reemplaza) un atributo en el nodo raíz de un comprobante.
+
+    Args:
+        comprobante (tuple): El nodo raíz.
+        nombre (str): El nombre del atributo.
+        valor (str): El valor del atributo.
+        antes_de (str): El atributo antes del cual se inserta (al final si se omite o no existe).
+
+    Returns:
+        tuple: Un nuevo nodo raíz con el atributo.
+    """
+    etiqueta, atributos, hijos = comprobante
+    atributos = [(n, v) for n, v in atributos if n != nombre]
+    indice = next((i for i, (n, _) in enumerate(atributos) if n == antes_de), len(atributos))
+    atributos.insert(indice, (nombre, valor))
+    return (etiqueta, atributos, hijos)
+
+
+def _normalizar(valor):
+    """
+    Normaliza los espacios de un valor como normalize-space() de XSLT.
+    """
+    return ' '.join(str(valor).split())
+
+
+def _valores_cadena(elemento, valores):
+    """
+    Agrega a la lista los valores de un nodo y sus hijos en el orden de la cadena original.
+    """
+    etiqueta, atributos, hijos = elemento
+    if etiqueta == 'cfdi:Impuestos' and any(nombre.startswith('TotalImpuestos') for nombre, _ in atributos):
+        # En los impuestos del comprobante, cada total va después de sus impuestos
+        totales = dict(atributos)
+        for hijo in hijos:
+            _valores_cadena(hijo, valores)
+            if hijo[0] == 'cfdi:Retenciones' and 'TotalImpuestosRetenidos' in totales:
+                valores.append(totales['TotalImpuestosRetenidos'])
+            elif hijo[0] == 'cfdi:Traslados' and 'TotalImpuestosTrasladados' in totales:
+                valores.append(totales['TotalImpuestosTrasladados'])
+        return
+    for nombre, valor in atributos:
+        if nombre not in ('Sello', 'Certificado') and not nombre.startswith('xmlns') and ':' not in nombre:
+            valores.append(_normalizar(valor))
+    for hijo in hijos:
+        _valores_cadena(hijo, valores)
+
+
+def cadena_original(comprobante):
+    """
+    Construye la cadena original de un comprobante.
+
+    Args:
+        comprobante (tuple): El nodo raíz cfdi:Comprobante.
+
+    Returns:
+        str: La cadena original, por ejemplo "||3.3|2024-06-15T10:00:00|...||".
+    """
+    valores = []
+    _valores_cadena(comprobante, valores)
+    return '||' + '|'.join(valores) + '||'
+
+
+def cadena_original_timbre(uuid, fecha_timbrado, rfc_proveedor, sello_cfd, no_certificado_sat):
+    """
+    Construye la cadena original del complemento de certificación (TimbreFiscalDigital 1.1).
+
+    Args:
+        uuid (str): El folio fiscal.
+        fecha_timbrado (datetime): La fecha del timbrado.
+        rfc_proveedor (str): El RFC del proveedor de certificación.
+        sello_cfd (str): El sello digital del comprobante.
+        no_certificado_sat (str): El número del certificado con el que se selló el timbre.
+
+    Returns:
+        str: La cadena original del timbre.
+    """
+    return f"||{VERSION_TIMBRE}|{uuid}|{formatear_fecha(fecha_timbrado)}|{rfc_proveedor}|{sello_cfd}|{no_certificado_sat}||"
@@ -0,0 +1,152 @@
+# utils/cfdi_xml.py
+
+"""
+Este archivo define la escritura del XML de los comprobantes CFDI 3.3 sellados y timbrados.
+
+El XML se escribe de forma incremental con XMLGenerator (elemento por elemento, directamente sobre
+el archivo de salida) a partir del árbol de nodos de utils/cfdi.py, sin construir un DOM; así se
+pueden escribir muchos comprobantes seguidos, por ejemplo dentro de un ZIP, con memoria constante.
+"""
+
+import io
+from xml.sax.saxutils import XMLGenerator
+
+from utils.cfdi import VERSION_TIMBRE, agregar_atributo, nodo
+
+ESPACIOS_NOMBRES = {
+    'cfdi': 'http://www.sat.gob.mx/cfd/3',
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+    'nomina12': 'http://www.sat.gob.mx/nomina12',
+    'tfd': 'http://www.sat.gob.mx/TimbreFiscalDigital',
+}
+
+UBICACION_ESQUEMAS = {
+    'cfdi': 'http://www.sat.gob.mx/cfd/3 http://www.sat.gob.mx/sitio_internet/cfd/3/cfdv33.xsd',
+    'nomina12': 'http://www.sat.gob.mx/nomina12 http://www.sat.gob.mx/sitio_internet/cfd/nomina/nomina12.xsd',
+    'tfd': 'http://www.sat.gob.mx/TimbreFiscalDigital http://www.sat.gob.mx/sitio_internet/cfd/TimbreFiscalDigital/TimbreFiscalDigitalv11.xsd',
+}
+
+
+def leer_cadena_timbre(cadena):
+    """
+    Obtiene los datos del timbre a partir de la cadena original del complemento de certificación.
+
+    Args:
+        cadena (str): La cadena "||1.1|UUID|FechaTimbrado|RfcProvCertif|SelloCFD|NoCertificadoSAT||".
+
+    Returns:
+        dict: 'uuid', 'fecha_timbrado', 'rfc_proveedor', 'sello_cfd' y 'no_certificado_sat'.
+    """
+    _, uuid, fecha_timbrado, rfc_proveedor, sello_cfd, no_certificado_sat = cadena.strip('|').split('|')[:6]
+    return {
+        'uuid': uuid,
+        'fecha_timbrado': fecha_timbrado,
+        'rfc_proveedor': rfc_proveedor,
+        'sello_cfd': sello_cfd,
+        'no_certificado_sat': no_certificado_sat,
+    }
+
+
+def nodo_timbre(cadena_timbre, sello_sat):
+    """
+    Crea el nodo tfd:TimbreFiscalDigital de un comprobante timbrado.
+
+    Args:
+        cadena_timbre (str): La cadena original del complemento de certificación.
+        sello_sat (str): El sello del SAT.
+
+    Returns:
+        tuple: El nodo del timbre.
+    """
+    timbre = leer_cadena_timbre(cadena_timbre)
+    return nodo('tfd:TimbreFiscalDigital', [
+        ('xmlns:tfd', ESPACIOS_NOMBRES['tfd']),
+        ('xsi:schemaLocation', UBICACION_ESQUEMAS['tfd']),
+        ('Version', VERSION_TIMBRE),
+        ('UUID', timbre['uuid']),
+        ('FechaTimbrado', timbre['fecha_timbrado']),
+        ('RfcProvCertif', timbre['rfc_proveedor']),
+        ('SelloCFD', timbre['sello_cfd']),
+        ('NoCertificadoSAT', timbre['no_certificado_sat']),
+        ('SelloSAT', sello_sat),
+    ])
+
+
+def preparar_comprobante(comprobante, sello, no_certificado, certificado, timbre=None):
+    """
+    Agrega al comprobante los espacios de nombres, el sello, el certificado y el timbre.
+
+    Args:
+        comprobante (tuple): El nodo raíz cfdi:Comprobante (ver utils/cfdi.py).
+        sello (str): El sello digital del comprobante.
+        no_certificado (str): El número del certificado con que se selló.
+        certificado (str): El certificado en base64.
+        timbre (tuple): El nodo tfd:TimbreFiscalDigital, si el comprobante está timbrado.
+
+    Returns:
+        tuple: El nodo raíz listo para escribirse.
+    """
+    etiqueta, atributos, hijos = comprobante
+    prefijos = ['cfdi', 'xsi'] + (['nomina12'] if any(hijo[0] == 'cfdi:Complemento' for hijo in hijos) else [])
+    atributos = [(f'xmlns:{prefijo}', ESPACIOS_NOMBRES[prefijo]) for prefijo in prefijos] + [
+        ('xsi:schemaLocation', ' '.join(UBICACION_ESQUEMAS[prefijo] for prefijo in prefijos if prefijo != 'xsi')),
+    ] + atributos
+    comprobante = (etiqueta, atributos, list(hijos))
+    comprobante = agregar_atributo(comprobante, 'NoCertificado', no_certificado, antes_de='SubTotal')
+    comprobante = agregar_atributo(comprobante, 'Sello', sello, antes_de='NoCertificado')
+    comprobante = agregar_atributo(comprobante, 'Certificado', certificado, antes_de='SubTotal')
+
+    if timbre is not None:
+        etiqueta, atributos, hijos = comprobante
+        complemento = next((hijo for hijo in hijos if hijo[0] == 'cfdi:Complemento'), None)
+        if complemento is None:
+            hijos.append(nodo('cfdi:Complemento', [], [timbre]))
+        else:
+            hijos[hijos.index(complemento)] = (complemento[0], complemento[1], complemento[2] + [timbre])
+    return comprobante
+
+
+def _escribir_nodo(generador, elemento):
+    etiqueta, atributos, hijos = elemento
+    generador.startElement(etiqueta, {nombre: str(valor) for nombre, valor in atributos})
+    for hijo in hijos:
+        _escribir_nodo(generador, hijo)
+    generador.endElement(etiqueta)
+
+
+def escribir_cfdi(salida, comprobante):
+    """
+    Escribe el XML de un comprobante, elemento por elemento.
+
+    Args:
+        salida (file): Un archivo binario abierto para escritura (por ejemplo una entrada de un ZIP).
+        comprobante (tuple): El nodo raíz, como lo devuelve preparar_comprobante().
+
+    Returns:
+        None
+    """
+    texto = io.TextIOWrapper(salida, encoding='utf-8', write_through=True)
+    try:
+        generador = XMLGenerator(texto, encoding='UTF-8', short_empty_elements=True)
+        generador.startDocument()
+        _escribir_nodo(generador, comprobante)
+        generador.endDocument()
+        texto.flush()
+    finally:
+        # Devolver el archivo sin cerrarlo
+        texto.detach()
+
+
+def cfdi_a_bytes(comprobante):
+    """
+    Obtiene el XML de un comprobante como bytes.
+
+    Args:
+        comprobante (tuple): El nodo raíz, como lo devuelve preparar_comprobante().
+
+    Returns:
+        bytes: El XML en UTF-8.
+    """
+    salida = io.BytesIO()
+    escribir_cfdi(salida, comprobante)
+    return salida.getvalue()
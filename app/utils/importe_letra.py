@@ -0,0 +1,118 @@
+# utils/importe_letra.py
+
+"""
+Este archivo define la conversión de importes a letra con la leyenda que se usa en los CFDI,
+por ejemplo "MIL DOSCIENTOS TREINTA Y CUATRO PESOS 45/100 M.N.".
+
+Las palabras de los números del 0 al 999 se calculan una sola vez al importar el módulo; un importe
+se arma uniendo las de sus grupos de tres cifras (unidades, miles y millones), así que convertir un
+importe no repite el trabajo de deletrear cada grupo. Los importes más recientes también se guardan
+en memoria, porque en las corridas de nómina se repiten mucho.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+_UNIDADES = (
+    '', 'UNO', 'DOS', 'TRES', 'CUATRO', 'CINCO', 'SEIS', 'SIETE', 'OCHO', 'NUEVE',
+    'DIEZ', 'ONCE', 'DOCE', 'TRECE', 'CATORCE', 'QUINCE', 'DIECISÉIS', 'DIECISIETE', 'DIECIOCHO', 'DIECINUEVE',
+    'VEINTE', 'VEINTIUNO', 'VEINTIDÓS', 'VEINTITRÉS', 'VEINTICUATRO', 'VEINTICINCO', 'VEINTISÉIS', 'VEINTISIETE', 'VEINTIOCHO', 'VEINTINUEVE',
+)
+_DECENAS = ('', '', '', 'TREINTA', 'CUARENTA', 'CINCUENTA', 'SESENTA', 'SETENTA', 'OCHENTA', 'NOVENTA')
+_CENTENAS = ('', 'CIENTO', 'DOSCIENTOS', 'TRESCIENTOS', 'CUATROCIENTOS', 'QUINIENTOS', 'SEISCIENTOS', 'SETECIENTOS', 'OCHOCIENTOS', 'NOVECIENTOS')
+
+CENTAVOS = Decimal('0.01')
+
+
+def _deletrear_grupo(numero):
+    """
+    Deletrea un número del 1 al 999 (terminado en "UNO" cuando corresponde).
+    """
+    if numero == 100:
+        return 'CIEN'
+    centenas, resto = divmod(numero, 100)
+    palabras = [_CENTENAS[centenas]] if centenas else []
+    if resto < 30:
+        if resto:
+            palabras.append(_UNIDADES[resto])
+    else:
+        decenas, unidades = divmod(resto, 10)
+        palabras.append(_DECENAS[decenas] + (' Y ' + _UNIDADES[unidades] if unidades else ''))
+    return ' '.join(palabras)
+
+
+def _apocopar(palabras):
+    """
+    Cambia la terminación "UNO" por "UN" (o "VEINTIUNO" por "VEINTIÚN"), la forma que se usa antes de un sustantivo.
+    """
+    if palabras.endswith('VEINTIUNO'):
+        return palabras[:-3] + 'ÚN'
+    if palabras.endswith('UNO'):
+        return palabras[:-1]
+    return palabras
+
+
+# Palabras de cada grupo de tres cifras, precalculadas: índice 0 sin uso, del 1 al 999
+_GRUPOS = ('',) + tuple(_apocopar(_deletrear_grupo(numero)) for numero in range(1, 1000))
+
+
+def _deletrear_miles(numero):
+    """
+    Deletrea un número del 1 al 999,999 antes de un sustantivo ("VEINTIÚN MIL CIENTO UN").
+    """
+    miles, unidades = divmod(numero, 1000)
+    palabras = []
+    if miles:
+        palabras.append('MIL' if miles == 1 else _GRUPOS[miles] + ' MIL')
+    if unidades:
+        palabras.append(_GRUPOS[unidades])
+    return ' '.join(palabras)
+
+
+@lru_cache(maxsize=4096)
+def numero_a_letras(numero):
+    """
+    Deletrea un número entero de pesos en la forma que precede a la moneda ("UN", "VEINTIÚN", "UN MILLÓN DE").
+
+    Args:
+        numero (int): El número, de 0 a 999,999,999,999.
+
+    Returns:
+        str: El número con letra, en mayúsculas.
+    """
+    if numero == 0:
+        return 'CERO'
+    if not 0 < numero < 10 ** 12:
+        raise ValueError(f"Importe fuera de rango: {numero}")
+
+    millones, unidades = divmod(numero, 10 ** 6)
+    palabras = []
+    if millones:
+        palabras.append('UN MILLÓN' if millones == 1 else _deletrear_miles(millones) + ' MILLONES')
+        if not unidades:
+            # "UN MILLÓN DE PESOS", "DOS MILLONES DE PESOS"
+            palabras.append('DE')
+    if unidades:
+        palabras.append(_deletrear_miles(unidades))
+    return ' '.join(palabras)
+
+
+def importe_con_letra(importe, moneda='PESOS', moneda_singular='PESO', sufijo='M.N.'):
+    """
+    Convierte un importe a la leyenda con letra del CFDI, por ejemplo "CIENTO UN PESOS 45/100 M.N.".
+
+    Args:
+        importe (Decimal | float | int | str): El importe; se redondea a centavos.
+        moneda (str): El nombre de la moneda en plural.
+        moneda_singular (str): El nombre de la moneda para un importe de exactamente una unidad.
+        sufijo (str): El texto que sigue a los centavos.
+
+    Returns:
+        str: El importe con letra.
+    """
+    if not isinstance(importe, Decimal):
+        importe = Decimal(repr(importe)) if isinstance(importe, float) else Decimal(str(importe))
+    if importe < 0:
+        raise ValueError(f"El importe no puede ser negativo: {importe}")
+    pesos, centavos = divmod(int(importe.quantize(CENTAVOS, ROUND_HALF_UP).scaleb(2)), 100)
+    return f"{numero_a_letras(pesos)} {moneda_singular if pesos == 1 else moneda} {centavos:02d}/100 {sufijo}"
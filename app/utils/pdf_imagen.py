@@ -0,0 +1,112 @@
+# utils/pdf_imagen.py
+
+"""
+Este archivo proporciona funciones para insertar imágenes PNG en un PDF directamente desde memoria.
+
+FPDF solo sabe leer imágenes desde un archivo, por lo que aquí se interpretan los bytes PNG
+almacenados en la base de datos (por ejemplo, el código QR) y se registran en el PDF sin
+escribir archivos temporales ni decodificar la imagen con PIL.
+"""
+
+import struct
+
+FIRMA_PNG = b'\x89PNG\r\n\x1a\n'
+
+# Espacio de color de PDF según el tipo de color del PNG
+ESPACIOS_COLOR = {
+    0: 'DeviceGray',  # Escala de grises
+    2: 'DeviceRGB',  # Color verdadero
+    3: 'Indexed',  # Paleta
+}
+
+
+def leer_png(datos):
+    """
+    Interpreta una imagen PNG y obtiene la información que FPDF necesita para incrustarla.
+
+    Los datos comprimidos (IDAT) se copian tal cual al PDF, sin descomprimirlos.
+
+    Args:
+        datos (bytes): Los bytes de la imagen PNG.
+
+    Returns:
+        dict: La información de la imagen en el formato interno de FPDF.
+    """
+    datos = bytes(datos)
+    if datos[:8] != FIRMA_PNG:
+        raise ValueError("Los datos no corresponden a una imagen PNG")
+
+    ancho, alto, bits, tipo_color, compresion, filtro, entrelazado = struct.unpack('>IIBBBBB', datos[16:29])
+    if datos[12:16] != b'IHDR':
+        raise ValueError("Imagen PNG incorrecta: falta el encabezado IHDR")
+    if bits > 8:
+        raise ValueError("No se admiten imágenes PNG de 16 bits")
+    if tipo_color not in ESPACIOS_COLOR:
+        raise ValueError("No se admiten imágenes PNG con canal alfa")
+    if compresion != 0 or filtro != 0 or entrelazado != 0:
+        raise ValueError("No se admiten imágenes PNG entrelazadas o con compresión desconocida")
+
+    espacio_color = ESPACIOS_COLOR[tipo_color]
+    colores = 3 if espacio_color == 'DeviceRGB' else 1
+    paleta = ''
+    transparencia = ''
+    idat = []
+
+    posicion = 8
+    while posicion < len(datos):
+        longitud, = struct.unpack('>I', datos[posicion:posicion + 4])
+        tipo = datos[posicion + 4:posicion + 8]
+        contenido = datos[posicion + 8:posicion + 8 + longitud]
+        posicion += 12 + longitud
+
+        if tipo == b'PLTE':
+            paleta = contenido
+        elif tipo == b'tRNS':
+            if tipo_color == 0:
+                transparencia = [contenido[1]]
+            elif tipo_color == 2:
+                transparencia = [contenido[1], contenido[3], contenido[5]]
+            elif b'\x00' in contenido:
+                transparencia = [contenido.index(b'\x00')]
+        elif tipo == b'IDAT':
+            idat.append(contenido)
+        elif tipo == b'IEND':
+            break
+
+    if espacio_color == 'Indexed' and not paleta:
+        raise ValueError("Imagen PNG con paleta incompleta")
+
+    return {
+        'w': ancho,
+        'h': alto,
+        'cs': espacio_color,
+        'bpc': bits,
+        'f': 'FlateDecode',
+        'dp': f'/Predictor 15 /Colors {colores} /BitsPerComponent {bits} /Columns {ancho}',
+        'pal': paleta,
+        'trns': transparencia,
+        'data': b''.join(idat),
+    }
+
+
+def insertar_png(pdf, nombre, datos, x=None, y=None, w=0, h=0):
+    """
+    Inserta en el PDF una imagen PNG que se encuentra en memoria.
+
+    Args:
+        pdf (FPDF): El documento PDF.
+        nombre (str): Un nombre único para la imagen dentro del documento.
+        datos (bytes): Los bytes de la imagen PNG.
+        x (float): La posición horizontal. Si es None se usa la posición actual.
+        y (float): La posición vertical. Si es None se usa la posición actual.
+        w (float): El ancho de la imagen.
+        h (float): El alto de la imagen.
+
+    Returns:
+        None
+    """
+    if nombre not in pdf.images:
+        info = leer_png(datos)
+        info['i'] = len(pdf.images) + 1
+        pdf.images[nombre] = info
+    pdf.image(nombre, x=x, y=y, w=w, h=h)
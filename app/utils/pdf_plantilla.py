@@ -0,0 +1,440 @@
+# utils/pdf_plantilla.py
+
+"""
+Este archivo proporciona plantillas PDF precompiladas para facturas y recibos de nómina.
+
+Una plantilla se compila una sola vez por proceso: la función de diseño se ejecuta con marcadores
+en lugar de los datos y se guardan tal cual las instrucciones PDF de las partes fijas (bordes,
+líneas, recuadros y títulos). Las celdas que contienen datos se registran como campos con su
+posición, tipo de letra y alineación ya resueltos. Al generar cada documento solo se escriben
+los campos con sus valores; el resto del contenido se copia de la plantilla.
+
+Los campos de altura variable (multi_cell) deben ser lo último de su página (pueden ir varios
+seguidos), porque lo que se dibuje después en esa misma página queda en la posición calculada
+al compilar.
+
+La compilación usa detalles internos de FPDF (el buffer de cada página, el estado del tipo de letra
+y las fuentes usadas), por eso requirements.txt fija fpdf==1.7.2; test/test_pdf_plantilla.py compara
+la salida de las plantillas con la del diseño dibujado directamente.
+"""
+
+import hashlib
+import re
+import threading
+from bisect import bisect_right
+from itertools import accumulate, repeat
+
+from fpdf import FPDF
+
+from utils.pdf_imagen import insertar_png
+
+_PATRON_MARCADOR = re.compile('\x00([^\x00]*)\x00')
+
+
+class _Marcador(str):
+    """
+    Texto que representa un dato de la plantilla. Admite acceso anidado (datos['empleado']['curp']).
+    """
+
+    def __new__(cls, ruta):
+        marcador = super().__new__(cls, f'\x00{ruta}\x00')
+        marcador.ruta = ruta
+        return marcador
+
+    def __getitem__(self, clave):
+        return _Marcador(f'{self.ruta}.{clave}')
+
+
+class _Marcadores(dict):
+    """
+    Diccionario que devuelve un marcador para cualquier clave.
+    """
+
+    def __missing__(self, clave):
+        return _Marcador(clave)
+
+
+def _formato_texto(texto):
+    """
+    Convierte un texto con marcadores en una cadena de formato que recibe los datos.
+
+    Por ejemplo, "RFC: <rfc_emisor>" se convierte en "RFC: {0[rfc_emisor]}". Los valores se
+    formatean igual que en una f-string de la función de diseño.
+
+    Returns:
+        str: La cadena de formato, o None si el texto no tiene marcadores.
+    """
+    partes = _PATRON_MARCADOR.split(texto)
+    if len(partes) == 1:
+        return None
+    formato = []
+    for indice, parte in enumerate(partes):
+        if indice % 2 == 0:
+            formato.append(parte.replace('{', '{{').replace('}', '}}'))
+        else:
+            formato.append('{0' + ''.join(f'[{clave}]' for clave in parte.split('.')) + '}')
+    return ''.join(formato)
+
+
+def _escapar(texto):
+    """
+    Escapa un texto para escribirlo en una cadena PDF, igual que FPDF.
+    """
+    return texto.replace('\\', '\\\\').replace(')', '\\)').replace('(', '\\(').replace('\r', '\\r')
+
+
+def _estado(pdf):
+    """
+    Obtiene el estado gráfico de FPDF que se repite al iniciar una página o al dibujar un campo.
+    """
+    return (
+        pdf.font_family, pdf.font_style, pdf.font_size_pt, pdf.line_width,
+        pdf.draw_color, pdf.fill_color, pdf.text_color, pdf.color_flag,
+    )
+
+
+def _fijar_estado(pdf, estado):
+    """
+    Actualiza el estado gráfico de FPDF sin escribir instrucciones en la página.
+
+    El contenido fijo de la plantilla ya contiene las instrucciones que producen ese estado;
+    solo hace falta que FPDF lo conozca para repetirlo en una página nueva o medir el texto.
+    """
+    familia, estilo, tamaño, pdf.line_width, pdf.draw_color, pdf.fill_color, pdf.text_color, pdf.color_flag = estado
+    pdf.font_family, pdf.font_style, pdf.font_size_pt = familia, estilo, tamaño
+    if familia:
+        pdf.font_size = tamaño / pdf.k
+        pdf.current_font = pdf.fonts[familia + estilo]
+        pdf.unifontsubset = pdf.current_font['type'] == 'TTF'
+
+
+def _partir_lineas(texto, cw, ancho_maximo):
+    """
+    Divide un texto en líneas con el mismo criterio que FPDF.multi_cell (sin justificar).
+
+    En lugar de sumar el ancho carácter por carácter, se calculan los anchos acumulados de cada
+    párrafo y se busca el punto de corte con búsqueda binaria.
+
+    Args:
+        texto (str): El texto a dividir.
+        cw (dict): Los anchos de los caracteres de la fuente, en milésimas del tamaño de letra.
+        ancho_maximo (float): El ancho disponible, en las mismas unidades que cw.
+
+    Returns:
+        list: Las líneas del texto.
+    """
+    texto = texto.replace('\r', '')
+    if texto.endswith('\n'):
+        texto = texto[:-1]
+
+    lineas = []
+    for parrafo in texto.split('\n'):
+        anchos = list(accumulate(map(cw.get, parrafo, repeat(0)), initial=0))
+        total = len(parrafo)
+        inicio = 0
+        while True:
+            # i es el primer carácter que ya no cabe en la línea
+            i = bisect_right(anchos, anchos[inicio] + ancho_maximo, lo=inicio + 1) - 1
+            while i < total and anchos[i + 1] - anchos[inicio] <= ancho_maximo:
+                i += 1
+            while i > inicio and anchos[i] - anchos[inicio] > ancho_maximo:
+                i -= 1
+            if i >= total:
+                lineas.append(parrafo[inicio:])
+                break
+            espacio = parrafo.rfind(' ', inicio, i + 1)
+            if espacio == -1:
+                fin = i + 1 if i == inicio else i
+                lineas.append(parrafo[inicio:fin])
+                inicio = fin
+            else:
+                lineas.append(parrafo[inicio:espacio])
+                inicio = espacio + 1
+    return lineas
+
+
+def _resolver(datos, ruta):
+    """
+    Obtiene un valor de los datos a partir de una ruta con puntos ("empleado.curp").
+    """
+    valor = datos
+    for clave in ruta.split('.'):
+        valor = valor[clave]
+    return valor
+
+
+class CampoTexto:
+    """
+    Celda de una sola línea cuyo texto depende de los datos.
+    """
+
+    def __init__(self, pdf, formato, x, y, w, h, align):
+        k = pdf.k
+        self.formato = formato
+        self.align = align
+        self.ancho = w
+        self.x = x
+        self.c_margin = pdf.c_margin
+        self.k = k
+        self.cw = pdf.current_font['cw']
+        self.font_size = pdf.font_size
+        self.y_texto = (pdf.h - (y + .5 * h + .3 * pdf.font_size)) * k
+        self.color = ('q ' + pdf.text_color + ' ', ' Q') if pdf.color_flag else ('', '')
+        if align not in ('R', 'C'):
+            # Con alineación izquierda la posición no depende del texto: se precalcula el inicio
+            self.prefijo = '%sBT %.2f %.2f Td (' % (self.color[0], (x + pdf.c_margin) * k, self.y_texto)
+
+    def instrucciones(self, datos):
+        """
+        Genera las instrucciones PDF del campo para unos datos.
+
+        Returns:
+            str: Las instrucciones PDF, o una cadena vacía si el texto está vacío.
+        """
+        texto = self.formato.format(datos)
+        if texto == '':
+            return ''
+        escapado = _escapar(texto)
+        if self.align not in ('R', 'C'):
+            return self.prefijo + escapado + ') Tj ET' + self.color[1] + '\n'
+
+        ancho_texto = sum(self.cw.get(caracter, 0) for caracter in texto) * self.font_size / 1000.0
+        if self.align == 'R':
+            dx = self.ancho - self.c_margin - ancho_texto
+        else:
+            dx = (self.ancho - ancho_texto) / 2.0
+        return '%sBT %.2f %.2f Td (%s) Tj ET%s\n' % (self.color[0], (self.x + dx) * self.k, self.y_texto, escapado, self.color[1])
+
+
+class CampoMultilinea:
+    """
+    Bloque de texto de varias líneas cuyo contenido depende de los datos.
+    """
+
+    def __init__(self, pdf, formato, w, h, border=0, align='J', fill=0, fluye=False):
+        self.formato = formato
+        self.w, self.h, self.border, self.align, self.fill = w, h, border, align, fill
+        self.fluye = fluye  # Continúa justo después del campo anterior, donde haya terminado
+        self.x = pdf.x
+        self.y = pdf.y
+        self.margenes = (pdf.l_margin, pdf.r_margin)
+        self.estado = _estado(pdf)
+
+    def dibujar(self, pdf, datos):
+        pdf.l_margin, pdf.r_margin = self.margenes
+        if not self.fluye:
+            pdf.x, pdf.y = self.x, self.y
+        _fijar_estado(pdf, self.estado)
+        texto = self.formato.format(datos)
+        if self.border or self.align == 'J' or pdf.unifontsubset:
+            pdf.multi_cell(self.w, self.h, texto, self.border, self.align, self.fill)
+            return
+
+        h = self.h
+        k = pdf.k
+        w = self.w if self.w != 0 else pdf.w - pdf.r_margin - pdf.x
+        ancho_maximo = (w - 2 * pdf.c_margin) * 1000.0 / pdf.font_size
+        # Las líneas alineadas a la izquierda y sin relleno se escriben directamente
+        directo = self.fill != 1 and self.align not in ('R', 'C') and not pdf.color_flag and not pdf.underline
+        for linea in _partir_lineas(texto, pdf.current_font['cw'], ancho_maximo):
+            if directo and pdf.y + h <= pdf.page_break_trigger:
+                if linea:
+                    pdf.pages[pdf.page] += 'BT %.2f %.2f Td (%s) Tj ET\n' % (
+                        (pdf.x + pdf.c_margin) * k, (pdf.h - (pdf.y + .5 * h + .3 * pdf.font_size)) * k, _escapar(linea)
+                    )
+                pdf.y += h
+                pdf.lasth = h
+            else:
+                # La celda de FPDF se encarga del salto de página automático
+                pdf.cell(w, h, linea, 0, 2, self.align, self.fill)
+        pdf.x = pdf.l_margin
+
+
+class CampoImagen:
+    """
+    Imagen PNG tomada de los datos (por ejemplo, el código QR).
+    """
+
+    def __init__(self, ruta, nombre, x, y, w, h):
+        self.ruta = ruta
+        self.nombre = nombre
+        self.x, self.y, self.w, self.h = x, y, w, h
+
+    def dibujar(self, pdf, datos):
+        imagen = _resolver(datos, self.ruta)
+        if imagen:
+            insertar_png(pdf, self.nombre, imagen, x=self.x, y=self.y, w=self.w, h=self.h)
+
+
+class _CompiladorMixin:
+    """
+    Registra el contenido de la función de diseño separando las partes fijas de los campos.
+    """
+
+    def _iniciar_compilacion(self):
+        # Por página: [estado gráfico al iniciarla, inicio del contenido, [(posición, campo), ...]]
+        self.paginas_compiladas = []
+
+    def add_page(self, *args, **kwargs):
+        estado = _estado(self)
+        super().add_page(*args, **kwargs)
+        # El encabezado lo dibuja la clase PDF en cada documento; solo se guarda lo que sigue
+        self.paginas_compiladas.append([estado, len(self.pages[self.page]), []])
+
+    def footer(self):
+        # El pie de página también lo dibuja la clase PDF en cada documento
+        pass
+
+    def _registrar(self, campo):
+        self.paginas_compiladas[-1][2].append((len(self.pages[self.page]), campo))
+
+    def cell(self, w, h=0, txt='', border=0, ln=0, align='', fill=0, link=''):
+        formato = _formato_texto(txt) if isinstance(txt, str) else None
+        if formato is None:
+            return super().cell(w, h, txt, border, ln, align, fill, link)
+        x, y = self.x, self.y
+        ancho = w if w != 0 else self.w - self.r_margin - self.x
+        campo = CampoTexto(self, formato, x, y, ancho, h, align)
+        # Dibujar bordes y relleno como contenido fijo y avanzar el cursor
+        super().cell(w, h, '', border, ln, align, fill, link)
+        self._registrar(campo)
+
+    def multi_cell(self, w, h, txt='', *args, **kwargs):
+        formato = _formato_texto(txt) if isinstance(txt, str) else None
+        if formato is None:
+            return super().multi_cell(w, h, txt, *args, **kwargs)
+        campos = self.paginas_compiladas[-1][2]
+        fluye = bool(campos) and isinstance(campos[-1][1], CampoMultilinea) and campos[-1][0] == len(self.pages[self.page])
+        self._registrar(CampoMultilinea(self, formato, w, h, *args, fluye=fluye, **kwargs))
+        self.x = self.l_margin
+        self.y += h
+
+    def imagen_png(self, nombre, datos, x=None, y=None, w=0, h=0):
+        x = self.x if x is None else x
+        if y is None:
+            y = self.y
+            self.y += h
+        self._registrar(CampoImagen(datos.ruta, nombre, x, y, w, h))
+
+
+class PDFBase(FPDF):
+    """
+    Clase base de los documentos que se dibujan con plantillas.
+    """
+
+    def imagen_png(self, nombre, datos, x=None, y=None, w=0, h=0):
+        # Insertar una imagen PNG que está en memoria; si no hay imagen no se dibuja nada
+        if datos:
+            insertar_png(self, nombre, datos, x=x, y=y, w=w, h=h)
+
+
+class PlantillaPDF:
+    """
+    Plantilla PDF que se compila una vez y se rellena para cada documento.
+    """
+
+    def __init__(self, clase_pdf, disenar):
+        """
+        Args:
+            clase_pdf (type): La clase PDF (derivada de PDFBase) con el encabezado y pie de página.
+            disenar (callable): Función que recibe (pdf, datos) y dibuja el documento.
+        """
+        self.clase_pdf = clase_pdf
+        self.disenar = disenar
+        self._candado = threading.Lock()
+        self._paginas = None
+        self._fuentes = None
+        self._version = None
+
+    def compilar(self):
+        """
+        Compila la plantilla si todavía no está compilada.
+
+        Returns:
+            PlantillaPDF: La misma plantilla.
+        """
+        if self._paginas is not None:
+            return self
+        with self._candado:
+            if self._paginas is not None:
+                return self
+            compilador = type('Compilador' + self.clase_pdf.__name__, (_CompiladorMixin, self.clase_pdf), {})()
+            compilador._iniciar_compilacion()
+            self.disenar(compilador, _Marcadores())
+
+            paginas = []
+            for numero, (estado, inicio, campos) in enumerate(compilador.paginas_compiladas, start=1):
+                contenido = compilador.pages[numero]
+                segmentos = []
+                anterior = inicio
+                for posicion, campo in campos:
+                    segmentos.append(contenido[anterior:posicion])
+                    segmentos.append(campo)
+                    anterior = posicion
+                segmentos.append(contenido[anterior:])
+                paginas.append((estado, [segmento for segmento in segmentos if segmento != '']))
+
+            # La versión resume todo lo que se dibuja: encabezados, pie de página, contenido fijo y campos
+            self.clase_pdf.footer(compilador)
+            huella = hashlib.sha256()
+            for pagina in compilador.pages.values():
+                huella.update(pagina.encode('latin1'))
+            for _, segmentos in paginas:
+                for segmento in segmentos:
+                    if not isinstance(segmento, str):
+                        huella.update(repr(sorted((clave, valor) for clave, valor in vars(segmento).items() if clave != 'cw')).encode())
+
+            self._fuentes = compilador.fonts
+            self._version = huella.hexdigest()[:16]
+            self._paginas = paginas
+        return self
+
+    @property
+    def version(self):
+        """
+        Identificador de la versión de la plantilla. Cambia cuando cambia cualquier parte del diseño.
+
+        Returns:
+            str: Los primeros 16 caracteres hexadecimales del SHA-256 del diseño compilado.
+        """
+        return self.compilar()._version
+
+    def renderizar(self, datos):
+        """
+        Genera el documento ejecutando la función de diseño completa, sin usar la plantilla compilada.
+
+        Args:
+            datos (dict): Los datos del documento.
+
+        Returns:
+            bytes: Los bytes del archivo PDF generado.
+        """
+        pdf = self.clase_pdf()
+        self.disenar(pdf, datos)
+        return pdf.output(dest='S').encode('latin1')
+
+    def rellenar(self, datos):
+        """
+        Genera el documento a partir de la plantilla compilada.
+
+        Args:
+            datos (dict): Los datos del documento.
+
+        Returns:
+            bytes: Los bytes del archivo PDF generado.
+        """
+        self.compilar()
+        pdf = self.clase_pdf()
+        pdf.fonts = {clave: dict(fuente) for clave, fuente in self._fuentes.items()}
+        for estado, segmentos in self._paginas:
+            # El estado vigente al cambiar de página se repite en la nueva, igual que al compilar
+            _fijar_estado(pdf, estado)
+            pdf.add_page()
+            for segmento in segmentos:
+                if isinstance(segmento, str):
+                    pdf.pages[pdf.page] += segmento
+                elif isinstance(segmento, CampoTexto):
+                    pdf.pages[pdf.page] += segmento.instrucciones(datos)
+                else:
+                    segmento.dibujar(pdf, datos)
+        return pdf.output(dest='S').encode('latin1')
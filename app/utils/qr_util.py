@@ -0,0 +1,130 @@
+# utils/qr_util.py
+
+"""
+Este archivo proporciona funciones para generar el código QR de verificación de los CFDI.
+
+El contenido del QR es la URL de verificación del SAT con el folio fiscal (UUID), los RFC del
+emisor y del receptor, el total y los últimos 8 caracteres del sello digital. Se codifica con la
+versión QR más pequeña que admite ese contenido y se escribe directamente como PNG de 1 bit.
+Los contenidos idénticos se sirven desde una caché en memoria.
+"""
+
+import struct
+import zlib
+from decimal import Decimal
+from functools import lru_cache
+
+import qrcode
+
+URL_VERIFICACION_SAT = 'https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx'
+
+TAMAÑO_MODULO = 4  # Pixeles por módulo del QR
+MARGEN = 4  # Módulos de zona silenciosa alrededor del QR (mínimo del estándar)
+
+# Patrón de máscara fijo. El estándar permite cualquiera de los 8 (el lector lo obtiene de la
+# información de formato); evaluar la penalización de los 8 es lo que más tiempo cuesta al codificar.
+PATRON_MASCARA = 0
+
+
+def formatear_total_qr(total):
+    """
+    Formatea el total del comprobante como lo pide el SAT para el QR (hasta 6 decimales).
+
+    Args:
+        total (float | Decimal): El total del comprobante.
+
+    Returns:
+        str: El total formateado, por ejemplo "1160.0".
+    """
+    texto = f"{Decimal(str(total)):.6f}".rstrip('0')
+    return texto + '0' if texto.endswith('.') else texto
+
+
+def construir_contenido_qr(uuid, rfc_emisor, rfc_receptor, total, sello_digital_cfdi):
+    """
+    Construye el contenido del QR de verificación de un CFDI 3.3.
+
+    Args:
+        uuid (str): El folio fiscal del comprobante.
+        rfc_emisor (str): El RFC del emisor.
+        rfc_receptor (str): El RFC del receptor.
+        total (float | Decimal): El total del comprobante.
+        sello_digital_cfdi (str): El sello digital del comprobante.
+
+    Returns:
+        str: La URL de verificación del SAT.
+    """
+    return (
+        f"{URL_VERIFICACION_SAT}?id={uuid}&re={rfc_emisor}&rr={rfc_receptor}"
+        f"&tt={formatear_total_qr(total)}&fe={sello_digital_cfdi[-8:]}"
+    )
+
+
+def _png_1bit(matriz, escala):
+    """
+    Escribe una matriz de módulos como imagen PNG en escala de grises de 1 bit.
+
+    Args:
+        matriz (list): Filas de valores booleanos (True = módulo negro).
+        escala (int): Pixeles por módulo.
+
+    Returns:
+        bytes: Los bytes de la imagen PNG.
+    """
+    ancho = len(matriz[0]) * escala
+    filas = bytearray()
+    for fila in matriz:
+        # En escala de grises de 1 bit, 0 es negro y 1 es blanco
+        bits = ''.join(('0' if modulo else '1') * escala for modulo in fila)
+        bits += '1' * (-len(bits) % 8)
+        linea = b'\x00' + int(bits, 2).to_bytes(len(bits) // 8, 'big')
+        filas += linea * escala
+
+    def bloque(tipo, contenido):
+        return struct.pack('>I', len(contenido)) + tipo + contenido + struct.pack('>I', zlib.crc32(tipo + contenido))
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + bloque(b'IHDR', struct.pack('>IIBBBBB', ancho, len(matriz) * escala, 1, 0, 0, 0, 0))
+        + bloque(b'IDAT', zlib.compress(bytes(filas), 9))
+        + bloque(b'IEND', b'')
+    )
+
+
+@lru_cache(maxsize=1024)
+def codificar_qr(contenido):
+    """
+    Codifica un texto como código QR en PNG, con la versión más pequeña posible.
+
+    Args:
+        contenido (str): El texto a codificar.
+
+    Returns:
+        bytes: Los bytes de la imagen PNG del código QR.
+    """
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        border=MARGEN,
+        mask_pattern=PATRON_MASCARA,
+    )
+    qr.add_data(contenido)
+    qr.make(fit=True)
+    return _png_1bit(qr.get_matrix(), TAMAÑO_MODULO)
+
+
+def generar_codigo_qr(uuid, rfc_emisor, rfc_receptor, total, sello_digital_cfdi):
+    """
+    Genera el código QR de verificación de un CFDI.
+
+    Args:
+        uuid (str): El folio fiscal del comprobante.
+        rfc_emisor (str): El RFC del emisor.
+        rfc_receptor (str): El RFC del receptor.
+        total (float | Decimal): El total del comprobante.
+        sello_digital_cfdi (str): El sello digital del comprobante.
+
+    Returns:
+        bytes: Los bytes de la imagen PNG del código QR.
+    """
+    return codificar_qr(construir_contenido_qr(uuid, rfc_emisor, rfc_receptor, total, sello_digital_cfdi))
@@ -0,0 +1,81 @@
+# benchmarks/benchmark_importe_letra.py
+
+"""
+Este archivo mide cuántos importes por segundo se convierten a letra, antes (num2words más la
+leyenda fija) y después (utils.importe_letra), con importes de facturas y de una corrida de nómina.
+
+num2words ya no es una dependencia de la aplicación; si no está instalado solo se mide el
+conversor nuevo. Se ejecuta desde la raíz del proyecto:
+
+    python benchmarks/benchmark_importe_letra.py --importes 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from utils.importe_letra import importe_con_letra, numero_a_letras  # noqa: E402
+
+try:
+    from num2words import num2words
+except ImportError:
+    num2words = None
+
+
+def importes_facturas(cantidad):
+    """
+    Genera importes de facturas distintos entre sí.
+    """
+    return [Decimal(random.randint(1, 10 ** 9)).scaleb(-2) for _ in range(cantidad)]
+
+
+def importes_nomina(cantidad):
+    """
+    Genera importes netos de nómina: pocos sueldos base, así que muchos importes se repiten.
+    """
+    sueldos = [Decimal(random.randint(600000, 4000000)).scaleb(-2) for _ in range(200)]
+    return [random.choice(sueldos) for _ in range(cantidad)]
+
+
+def con_num2words(importe):
+    """
+    La conversión anterior de la aplicación.
+    """
+    return num2words(importe, lang='es').upper() + ", 00/100 M.N."
+
+
+def medir(funcion, importes):
+    """
+    Mide los importes por segundo de una función de conversión.
+    """
+    inicio = time.perf_counter()
+    for importe in importes:
+        funcion(importe)
+    return len(importes) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide la conversión de importes a letra.")
+    parser.add_argument('--importes', type=int, default=50000, help="Importes a convertir por caso")
+    argumentos = parser.parse_args()
+
+    for nombre, generar_importes in (('facturas', importes_facturas), ('nómina', importes_nomina)):
+        importes = generar_importes(argumentos.importes)
+        numero_a_letras.cache_clear()
+
+        despues = medir(importe_con_letra, importes)
+        if num2words is None:
+            print(f"{nombre}: después {despues:,.0f} importes/s (num2words no está instalado)")
+            continue
+
+        antes = medir(con_num2words, importes)
+        print(f"{nombre}: antes {antes:,.0f} importes/s | después {despues:,.0f} importes/s | {despues / antes:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# benchmarks/benchmark_pdf.py
+
+"""
+Este archivo mide cuántos PDF de facturas y recibos de nómina se generan por segundo,
+antes (ejecutando todo el diseño en cada documento) y después (rellenando la plantilla compilada).
+
+También comprueba que ambos caminos producen el mismo contenido. Se ejecuta desde la raíz del proyecto:
+
+    python benchmarks/benchmark_pdf.py --documentos 2000
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from utils.factura_pdf_util import PLANTILLA_FACTURA  # noqa: E402
+from utils.qr_util import generar_codigo_qr  # noqa: E402
+from utils.recibo_pdf_util import PLANTILLA_RECIBO  # noqa: E402
+
+
+def cadena_aleatoria(longitud):
+    """
+    Genera una cadena aleatoria para simular sellos digitales.
+    """
+    return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(longitud))
+
+
+def datos_factura(indice):
+    """
+    Genera los datos de una factura de prueba.
+    """
+    sello = cadena_aleatoria(344)
+    return {
+        "nombre_empresa": "FARMACIAS DE DIOS",
+        "uso_destino_cfdi_clave": "G01",
+        "uso_destino_cfdi_descripcion": "ADQUISICIÓN DE MERCANCÍAS",
+        "lugar_expedicion": "CIUDAD DE MÉXICO",
+        "fecha_expedicion": f"2024-06-{indice % 28 + 1:02d} 10:00:00",
+        "rfc_emisor": "FARA2402035H8",
+        "tipo_comprobante_clave": "I",
+        "tipo_comprobante_descripcion": "INGRESO",
+        "regimen_fiscal_clave": "601",
+        "regimen_fiscal_descripcion": "GENERAL DE LEY PERSONAS MORALES",
+        "rfc_receptor": "XAXX010101000",
+        "clave_producto_servicio": "51142001",
+        "descripcion_producto_servicio": "PARACETAMOL",
+        "cantidad": indice % 10 + 1,
+        "importe": 20.0,
+        "subtotal": 20.0 * (indice % 10 + 1),
+        "iva": 3.2 * (indice % 10 + 1),
+        "total": 23.2 * (indice % 10 + 1),
+        "total_con_letra": "VEINTITRÉS PESOS 20/100 M.N.",
+        "moneda": "MXN",
+        "tipo_cambio": 1.0,
+        "metodo_pago_clave": "PUE",
+        "metodo_pago_descripcion": "PAGO EN UNA SOLA EXHIBICIÓN",
+        "forma_pago_clave": "01",
+        "forma_pago_descripcion": "EFECTIVO",
+        "sello_digital_cfdi": sello,
+        "sello_digital_sat": cadena_aleatoria(344),
+        "cadena_original_complemento_certificacion": cadena_aleatoria(300),
+        "codigo_qr": generar_codigo_qr(f"{indice:08d}-0000-4000-8000-000000000000", "FARA2402035H8", "XAXX010101000", 23.2, sello),
+    }
+
+
+def datos_recibo(indice):
+    """
+    Genera los datos de un recibo de nómina de prueba.
+    """
+    sello = cadena_aleatoria(344)
+    return {
+        "id": indice,
+        "nombre_empresa": "FARMACIAS DE DIOS",
+        "uso_destino_cfdi_clave": "CN01",
+        "lugar_expedicion": "CIUDAD DE MÉXICO",
+        "fecha_expedicion": "2024-06-15 10:00:00",
+        "rfc_emisor": "FARA2402035H8",
+        "tipo_comprobante_clave": "N",
+        "regimen_laboral_clave": "02",
+        "empleado": {
+            "numero_empleado": f"E{indice:05d}",
+            "curp": "PEPJ800101HDFRRN09",
+            "nss": "12345678901",
+            "fecha_ingreso": "2020-01-01",
+            "sueldo_base": 15000.0,
+            "puesto_id": 1,
+            "departamento_id": 1,
+            "riesgo_id": 1,
+            "tipo_jornada": "01",
+            "tipo_contrato": "01",
+            "periodicidad_pago": "04",
+        },
+        "fecha_pago": "2024-06-15",
+        "metodo_pago_clave": "PUE",
+        "forma_pago_clave": "99",
+        "banco_clave": "002",
+        "percepciones_recibo": "001",
+        "valor_percepciones": 7500.0,
+        "total_percepciones": 7500.0,
+        "deducciones_recibo": "001",
+        "valor_deducciones": 208.13,
+        "total_deducciones": 958.13,
+        "importe": 6541.87,
+        "importe_con_letra": "SEIS MIL QUINIENTOS CUARENTA Y UN PESOS 87/100 M.N.",
+        "moneda": "MXN",
+        "tipo_cambio": 1.0,
+        "sello_digital_cfdi": sello,
+        "sello_digital_sat": cadena_aleatoria(344),
+        "cadena_original_complemento_certificacion": cadena_aleatoria(300),
+        "codigo_qr": generar_codigo_qr("A36EE28C-A98C-4892-B3F7-14801AC51D6B", "FARA2402035H8", "XAXX010101000", 6541.87, sello),
+    }
+
+
+def contenido(pdf_bytes):
+    """
+    Obtiene los flujos descomprimidos de un PDF (páginas e imágenes).
+    """
+    return [zlib.decompress(flujo) for flujo in re.findall(rb'stream\n(.*?)\nendstream', pdf_bytes, re.S)]
+
+
+def medir(funcion, documentos):
+    """
+    Mide los documentos por segundo de una función de generación.
+    """
+    inicio = time.perf_counter()
+    for datos in documentos:
+        funcion(datos)
+    return len(documentos) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide la generación de PDF con y sin plantillas compiladas.")
+    parser.add_argument('--documentos', type=int, default=1000, help="Documentos a generar por caso")
+    argumentos = parser.parse_args()
+
+    for nombre, plantilla, generar_datos in (
+        ('factura', PLANTILLA_FACTURA, datos_factura),
+        ('recibo', PLANTILLA_RECIBO, datos_recibo),
+    ):
+        documentos = [generar_datos(indice) for indice in range(argumentos.documentos)]
+
+        inicio = time.perf_counter()
+        plantilla.compilar()
+        compilacion = (time.perf_counter() - inicio) * 1000
+
+        for datos in documentos[:50]:
+            if contenido(plantilla.renderizar(datos)) != contenido(plantilla.rellenar(datos)):
+                raise SystemExit(f"{nombre}: el PDF de la plantilla no coincide con el diseño original")
+
+        antes = medir(plantilla.renderizar, documentos)
+        despues = medir(plantilla.rellenar, documentos)
+        print(
+            f"{nombre}: compilación {compilacion:.1f} ms | antes {antes:,.0f} docs/s | "
+            f"después {despues:,.0f} docs/s | {despues / antes:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# benchmarks/benchmark_servicios.py
+
+"""
+Este archivo mide la latencia y el rendimiento de las etapas más usadas de las facturas y del
+inicio de sesión: código QR, sellado, cálculo de valores, alta de la factura, procesamiento,
+carga de datos del PDF, generación del PDF y verificación del usuario.
+
+Por omisión usa una base de datos SQLite temporal con las tablas de Database.sql que necesitan
+las etapas; con --url puede usarse una base de PostgreSQL local y desechable (sin la tabla
+facturas, para no tocar una base con datos). Los resultados pueden guardarse como línea base en
+JSON y compararse con otra ejecución. Se ejecuta desde la raíz del proyecto:
+
+    python benchmarks/benchmark_servicios.py --iteraciones 200 --guardar base.json
+    python benchmarks/benchmark_servicios.py --iteraciones 200 --comparar base.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Tablas de Database.sql que se crean en SQLite (con los datos de sus catálogos)
+TABLAS_SQLITE = (
+    'usuarios', 'productos_servicios', 'perfiles_impuestos', 'tipo_comprobante', 'uso_destino_cfdi',
+    'regimen_fiscal', 'metodos_pago', 'formas_pago', 'facturas', 'facturas_pdf', 'catalogos_version',
+    'trabajos', 'resumen_ventas',
+)
+
+# Tipos de PostgreSQL de Database.sql y su equivalente en SQLite
+TIPOS_SQLITE = (
+    (r'\bBIGSERIAL PRIMARY KEY', 'INTEGER PRIMARY KEY'),
+    (r'\bSERIAL PRIMARY KEY', 'INTEGER PRIMARY KEY'),
+    (r'\bBYTEA\b', 'BLOB'),
+    (r'\bJSONB\b', 'TEXT'),
+    (r'\bNOW\(\)', 'CURRENT_TIMESTAMP'),
+)
+
+CORREO = 'benchmark@example.com'
+CONTRASEÑA = 'Benchmark123'
+RFC_RECEPTOR = 'XAXX010101000'
+
+
+def sentencias_sqlite(sql):
+    """
+    Obtiene las sentencias CREATE TABLE e INSERT INTO de TABLAS_SQLITE, con los tipos de SQLite.
+    """
+    for sentencia in re.finditer(r'^(?:CREATE TABLE|INSERT INTO) (\w+)\b.*?;[ \t]*(?:--[^\n]*)?$', sql, re.S | re.M):
+        if sentencia.group(1) in TABLAS_SQLITE:
+            texto = sentencia.group(0)
+            for patron, reemplazo in TIPOS_SQLITE:
+                texto = re.sub(patron, reemplazo, texto)
+            yield texto
+
+
+def preparar_base(engine):
+    """
+    Crea el esquema de Database.sql y el usuario de prueba.
+    """
+    from sqlalchemy import inspect, text
+
+    from services.auth_service import generar_hash
+
+    with open(os.path.join(RAIZ, 'Database.sql'), encoding='utf-8') as archivo:
+        sql = archivo.read()
+
+    if inspect(engine).has_table('facturas'):
+        raise SystemExit("La base de datos ya tiene la tabla facturas; usa una base vacía y desechable")
+
+    with engine.begin() as conexion:
+        if engine.dialect.name == 'sqlite':
+            for sentencia in sentencias_sqlite(sql):
+                conexion.exec_driver_sql(sentencia)
+        else:
+            conexion.exec_driver_sql(sql)
+        conexion.execute(
+            text(
+                "INSERT INTO usuarios (nombre_usuario, contraseña_hash, correo_electronico, rfc_receptor, domicilio, es_empleado) "
+                "VALUES ('benchmark', :hash, :correo, :rfc, 'CIUDAD DE MÉXICO', TRUE)"
+            ),
+            {'hash': generar_hash(CONTRASEÑA), 'correo': CORREO, 'rfc': RFC_RECEPTOR},
+        )
+
+
+def medir(funcion, argumentos):
+    """
+    Ejecuta una etapa con cada elemento de argumentos y devuelve sus tiempos y resultados.
+    """
+    tiempos = []
+    resultados = []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        resultados.append(funcion(argumento))
+        tiempos.append(time.perf_counter() - inicio)
+    return resumir(tiempos), resultados
+
+
+def resumir(tiempos):
+    """
+    Calcula los percentiles (en milisegundos) y las operaciones por segundo de una etapa.
+    """
+    ordenados = sorted(tiempos)
+
+    def percentil(p):
+        return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))] * 1000
+
+    return {
+        'n': len(tiempos),
+        'p50_ms': percentil(50),
+        'p95_ms': percentil(95),
+        'p99_ms': percentil(99),
+        'media_ms': statistics.fmean(tiempos) * 1000,
+        'max_ms': ordenados[-1] * 1000,
+        'ops_s': len(tiempos) / sum(tiempos) if sum(tiempos) else float('inf'),
+    }
+
+
+def ejecutar_etapas(iteraciones):
+    """
+    Mide cada etapa con iteraciones entradas distintas. Las etapas se ejecutan en el orden en que
+    una factura pasa por ellas, así que cada una usa lo que produjo la anterior.
+    """
+    from services.auth_service import verificar_usuario
+    from services.database import get_db
+    from services.factura_service import (
+        calcular_valores_factura, crear_factura, datos_cfdi_factura, obtener_formas_pago, obtener_metodos_pago,
+        obtener_productos_servicios, obtener_regimen_fiscal, obtener_tipo_comprobante, obtener_uso_destino_cfdi,
+        procesar_factura,
+    )
+    from services.sellado import obtener_csd, sellar_comprobante
+    from utils.cfdi import comprobante_factura
+    from utils.factura_pdf_util import generar_pdf, obtener_datos
+    from utils.qr_util import generar_codigo_qr
+
+    etapas = {}
+    with get_db() as db:
+        # Cargar los catálogos y el CSD antes de medir
+        productos = obtener_productos_servicios(db)
+        catalogos = {
+            'tipo_comprobante_clave': obtener_tipo_comprobante(db)[0],
+            'uso_destino_cfdi_clave': obtener_uso_destino_cfdi(db)[0],
+            'regimen_fiscal_clave': obtener_regimen_fiscal(db)[0],
+            'metodo_pago_clave': obtener_metodos_pago(db)[0],
+            'forma_pago_clave': obtener_formas_pago(db)[0],
+        }
+        obtener_csd()
+
+        entradas = [
+            {'clave_producto_servicio': productos[indice % len(productos)], 'cantidad': indice % 10 + 1, 'rfc_receptor': RFC_RECEPTOR}
+            for indice in range(iteraciones)
+        ]
+        etapas['calcular_valores_factura'], valores = medir(lambda datos: calcular_valores_factura(db, datos), entradas)
+
+        facturas = [{**catalogos, **datos, **calculados} for datos, calculados in zip(entradas, valores)]
+        etapas['crear_factura'], creadas = medir(lambda datos: crear_factura(db, datos), facturas)
+        ids = [factura.id for factura in creadas]
+
+        columnas = [{columna.name: getattr(factura, columna.key) for columna in factura.__table__.columns} for factura in creadas]
+        datos_cfdi = [datos_cfdi_factura(db, factura) for factura in columnas]
+        etapas['sellar_comprobante'], sellados = medir(
+            lambda datos: sellar_comprobante(datos['uuid'], comprobante_factura(datos)), datos_cfdi,
+        )
+        # Entradas distintas en cada llamada, porque generar_codigo_qr guarda sus resultados en caché
+        etapas['generar_codigo_qr'], _ = medir(
+            lambda datos: generar_codigo_qr(datos[0]['uuid'], datos[0]['rfc_emisor'], datos[0]['rfc_receptor'], datos[0]['total'], datos[1]['sello_digital_cfdi']),
+            list(zip(datos_cfdi, sellados)),
+        )
+
+        etapas['procesar_factura'], _ = medir(lambda id_factura: procesar_factura(db, id_factura), ids)
+        etapas['obtener_datos'], datos_pdf = medir(lambda id_factura: obtener_datos(db, id_factura), ids)
+        etapas['generar_pdf'], _ = medir(generar_pdf, datos_pdf)
+        etapas['verificar_usuario'], _ = medir(lambda _: verificar_usuario(db, CORREO, CONTRASEÑA), range(iteraciones))
+    return etapas
+
+
+def imprimir(etapas, base=None):
+    """
+    Imprime la tabla de resultados y, si hay línea base, la diferencia de p50 y de operaciones por segundo.
+    """
+    encabezado = f"{'etapa':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'media ms':>10}{'max ms':>10}{'ops/s':>10}"
+    if base:
+        encabezado += f"{'Δ p50':>10}{'Δ ops/s':>10}"
+    print(encabezado)
+    for nombre, etapa in etapas.items():
+        linea = (
+            f"{nombre:<26}{etapa['p50_ms']:>10.3f}{etapa['p95_ms']:>10.3f}{etapa['p99_ms']:>10.3f}"
+            f"{etapa['media_ms']:>10.3f}{etapa['max_ms']:>10.3f}{etapa['ops_s']:>10.1f}"
+        )
+        anterior = (base or {}).get(nombre)
+        if anterior:
+            linea += f"{variacion(anterior['p50_ms'], etapa['p50_ms']):>10}{variacion(anterior['ops_s'], etapa['ops_s']):>10}"
+        print(linea)
+
+
+def variacion(antes, despues):
+    """
+    Formatea el cambio porcentual entre dos valores.
+    """
+    return f"{(despues - antes) / antes * 100:+.1f}%" if antes else "n/d"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide las etapas de las facturas y del inicio de sesión.")
+    parser.add_argument('--url', help="Base de datos desechable (por omisión, SQLite temporal)")
+    parser.add_argument('--iteraciones', type=int, default=100, help="Entradas medidas por etapa")
+    parser.add_argument('--guardar', help="Archivo JSON donde se guardan los resultados como línea base")
+    parser.add_argument('--comparar', help="Archivo JSON de una línea base con la cual comparar")
+    argumentos = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='benchmark_servicios_')
+    # La configuración se lee al importar los servicios, así que se define antes
+    os.environ['DATABASE_URL'] = argumentos.url or f"sqlite:///{os.path.join(directorio, 'benchmark.db')}"
+    os.environ['DOCUMENTOS_RUTA'] = os.path.join(directorio, 'documentos')
+    os.environ.setdefault('CSD_PRUEBA', os.path.join(directorio, 'prueba.pem'))
+    sys.path.insert(0, os.path.join(RAIZ, 'app'))
+
+    from services.database import engine
+
+    preparar_base(engine)
+    etapas = ejecutar_etapas(argumentos.iteraciones)
+
+    base = None
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)['etapas']
+    imprimir(etapas, base)
+
+    if argumentos.guardar:
+        with open(argumentos.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'motor': engine.dialect.name,
+                'iteraciones': argumentos.iteraciones,
+                'python': platform.python_version(),
+                'etapas': etapas,
+            }, archivo, indent=2)
+        print(f"Línea base guardada en {argumentos.guardar}")
+
+
+if __name__ == "__main__":
+    main()
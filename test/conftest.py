@@ -0,0 +1,46 @@
+# test/conftest.py
+
+"""
+Este archivo prepara el entorno de las pruebas: agrega el directorio app a la ruta de importación y,
+como la configuración se lee al importar los servicios, define antes una base de datos SQLite, un
+almacén de documentos y un CSD de prueba temporales. La fixture base_datos crea en esa base las
+tablas de Database.sql para las pruebas que las necesitan.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DIRECTORIO_PRUEBAS = tempfile.mkdtemp(prefix='pruebas_facturas_')
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(DIRECTORIO_PRUEBAS, 'pruebas.db')}")
+os.environ.setdefault('DOCUMENTOS_RUTA', os.path.join(DIRECTORIO_PRUEBAS, 'documentos'))
+os.environ.setdefault('CSD_PRUEBA', os.path.join(DIRECTORIO_PRUEBAS, 'prueba.pem'))
+sys.path.insert(0, os.path.join(RAIZ, 'app'))
+
+
+# Tablas de Database.sql que usan las pruebas de los servicios, además de las del benchmark
+TABLAS_PRUEBAS = ('empleados', 'recibos_nomina')
+
+
+@pytest.fixture(scope='session')
+def base_datos():
+    """
+    Crea una sola vez, en la base SQLite de las pruebas, las tablas de Database.sql con los datos de
+    sus catálogos (ver benchmarks/benchmark_servicios.py) y devuelve el motor.
+    """
+    sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+    import benchmark_servicios
+
+    from services.database import engine
+
+    with open(os.path.join(RAIZ, 'Database.sql'), encoding='utf-8') as archivo:
+        sql = archivo.read()
+    benchmark_servicios.TABLAS_SQLITE += TABLAS_PRUEBAS
+    with engine.begin() as conexion:
+        for sentencia in benchmark_servicios.sentencias_sqlite(sql):
+            conexion.exec_driver_sql(sentencia)
+    return engine
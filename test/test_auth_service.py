@@ -0,0 +1,83 @@
+# test/test_auth_service.py
+
+"""
+Pruebas del registro y el inicio de sesión de usuarios (services/auth_service.py).
+"""
+
+import pytest
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import Usuario
+from services.auth_service import _PARAMETROS_HASH, _mensaje_duplicado, verificar_usuario
+from services.database import get_db
+
+
+class ErrorControlador(Exception):
+    """
+    Error de un controlador de base de datos con el código SQLSTATE en el atributo indicado.
+    """
+
+    def __init__(self, mensaje, **atributos):
+        super().__init__(mensaje)
+        self.__dict__.update(atributos)
+
+
+def error_integridad(mensaje, **atributos):
+    return IntegrityError('INSERT INTO empleados ...', {}, ErrorControlador(mensaje, **atributos))
+
+
+@pytest.mark.parametrize('mensaje, atributos, esperado', [
+    # psycopg2
+    ('duplicate key value violates unique constraint "empleados_curp_key"', {'pgcode': '23505'}, "La CURP ya está registrada."),
+    ('null value in column "curp" violates not-null constraint', {'pgcode': '23502'}, None),
+    # psycopg
+    ('duplicate key value violates unique constraint "usuarios_correo_electronico_key"', {'sqlstate': '23505'}, "El correo electrónico ya está registrado."),
+    ('insert or update on table "empleados" violates foreign key constraint "empleados_puesto_id_fkey"', {'sqlstate': '23503'}, None),
+    # SQLite
+    ('UNIQUE constraint failed: empleados.nss', {}, "El NSS ya está registrado."),
+    ('NOT NULL constraint failed: empleados.curp', {}, None),
+    ('UNIQUE constraint failed: facturas.uuid', {}, None),
+])
+def test_mensaje_duplicado(mensaje, atributos, esperado):
+    assert _mensaje_duplicado(error_integridad(mensaje, **atributos)) == esperado
+
+
+@pytest.fixture
+def usuario_pbkdf2(base_datos):
+    # Usuario registrado con un método de hash anterior al configurado
+    hash_anterior = generate_password_hash('Contraseña123', 'pbkdf2:sha256:1000')
+    with get_db() as db:
+        db.execute(delete(Usuario).where(Usuario.correo_electronico == 'rehash@example.com'))
+        db.execute(insert(Usuario).values(
+            nombre_usuario='rehash', contraseña_hash=hash_anterior, correo_electronico='rehash@example.com',
+            rfc_receptor='REHA800101AB1', domicilio='CIUDAD DE MÉXICO', es_empleado=False,
+        ))
+        db.commit()
+    return hash_anterior
+
+
+def hash_guardado(db):
+    return db.scalar(select(Usuario.contraseña_hash).where(Usuario.correo_electronico == 'rehash@example.com'))
+
+
+def test_hash_anterior_se_reemplaza_al_iniciar_sesion(usuario_pbkdf2):
+    with get_db() as db:
+        usuario = verificar_usuario(db, 'rehash@example.com', 'Contraseña123')
+        assert usuario['nombre_usuario'] == 'rehash' and 'contraseña_hash' not in usuario
+
+        nuevo = hash_guardado(db)
+        assert nuevo != usuario_pbkdf2
+        assert nuevo.split('$', 1)[0] == _PARAMETROS_HASH
+        assert check_password_hash(nuevo, 'Contraseña123')
+
+        # Con el hash vigente ya no se vuelve a reemplazar
+        assert verificar_usuario(db, 'rehash@example.com', 'Contraseña123') is not None
+        assert hash_guardado(db) == nuevo
+
+
+def test_contraseña_incorrecta_no_reemplaza_el_hash(usuario_pbkdf2):
+    with get_db() as db:
+        assert verificar_usuario(db, 'rehash@example.com', 'otra') is None
+        assert hash_guardado(db) == usuario_pbkdf2
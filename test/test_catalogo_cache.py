@@ -0,0 +1,74 @@
+# test/test_catalogo_cache.py
+
+"""
+Pruebas de la verificación de versiones de la caché de catálogos (services/catalogo_cache.py).
+
+El caso de la tabla inexistente usa una base SQLite vacía en memoria; los errores pasajeros se
+simulan con un motor que falla al conectarse.
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+import services.catalogo_cache as catalogo_cache
+from services.catalogo_cache import CacheCatalogos
+
+
+class MotorCaido:
+    """
+    Motor cuya conexión falla como cuando se pierde la conexión con el servidor.
+    """
+
+    def __init__(self):
+        self.intentos = 0
+
+    def connect(self):
+        self.intentos += 1
+        raise OperationalError("SELECT tabla, version FROM catalogos_version", {}, Exception("server closed the connection unexpectedly"))
+
+
+def contar_cargas(cache):
+    cargas = []
+    cache.obtener(None, 'formas_pago', lambda db: cargas.append(1) or ['01'])
+    return len(cargas)
+
+
+def test_sin_tabla_de_versiones_se_deja_de_consultar(monkeypatch):
+    monkeypatch.setattr(catalogo_cache, 'engine', create_engine('sqlite://'))
+    cache = CacheCatalogos(intervalo_verificacion=0)
+    assert contar_cargas(cache) == 1
+    assert cache._versiones_disponibles is False
+    # Sin versiones, cada verificación recarga los catálogos
+    assert contar_cargas(cache) == 1
+
+
+def test_error_pasajero_conserva_catalogos_y_reintenta(monkeypatch):
+    motor = MotorCaido()
+    monkeypatch.setattr(catalogo_cache, 'engine', motor)
+    cache = CacheCatalogos(intervalo_verificacion=0)
+
+    assert contar_cargas(cache) == 1
+    assert contar_cargas(cache) == 0
+    assert motor.intentos == 2
+    assert cache._versiones_disponibles is True
+
+
+@pytest.mark.parametrize('mensaje, esperado', [
+    ('no such table: catalogos_version', True),
+    ('relation "catalogos_version" does not exist', True),
+    ('server closed the connection unexpectedly', False),
+    ('database is locked', False),
+])
+def test_tabla_inexistente_por_mensaje(mensaje, esperado):
+    assert catalogo_cache._tabla_inexistente(OperationalError('SELECT 1', {}, Exception(mensaje))) is esperado
+
+
+def test_tabla_inexistente_por_sqlstate():
+    class ErrorPostgres(Exception):
+        def __init__(self, sqlstate):
+            super().__init__('error')
+            self.sqlstate = sqlstate
+
+    assert catalogo_cache._tabla_inexistente(OperationalError('SELECT 1', {}, ErrorPostgres('42P01'))) is True
+    assert catalogo_cache._tabla_inexistente(OperationalError('SELECT 1', {}, ErrorPostgres('57P01'))) is False
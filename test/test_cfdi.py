@@ -0,0 +1,151 @@
+# test/test_cfdi.py
+
+"""
+Pruebas de la cadena original de los comprobantes (utils/cfdi.py) y de su sellado (services/sellado.py).
+
+Las cadenas esperadas siguen el orden de atributos y nodos de cadenaoriginal_3_3.xslt y de la
+plantilla del complemento Nómina 1.2.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from services.sellado import sellar_comprobante, verificar_sello
+from utils.cfdi import IMPUESTO_IEPS, IMPUESTO_ISR, IMPUESTO_IVA, agregar_atributo, cadena_original, comprobante_factura, comprobante_recibo
+
+NO_CERTIFICADO = '30001000000500003416'
+
+
+@pytest.fixture
+def datos_factura():
+    return {
+        'fecha_expedicion': datetime(2024, 6, 15, 10, 0, 0, 123456),
+        'forma_pago_clave': '01',
+        'metodo_pago_clave': 'PUE',
+        'tipo_comprobante_clave': 'I',
+        'lugar_expedicion': '06600',
+        'rfc_emisor': 'FARA2402035H8',
+        'nombre_empresa': 'FARMACIAS DE DIOS',
+        'regimen_fiscal_clave': '601',
+        'rfc_receptor': 'XAXX010101000',
+        'uso_destino_cfdi_clave': 'G01',
+        'clave_producto_servicio': '1A1B1',
+        'cantidad': 2,
+        'unidad': 'PIEZA',
+        'descripcion': '  PARACETAMOL   500 MG ',
+        'valor_unitario': Decimal('10.00'),
+        'importe': Decimal('20.00'),
+        'subtotal': Decimal('20.00'),
+        'total': Decimal('20.93'),
+        'traslados': [
+            {'impuesto': IMPUESTO_IEPS, 'base': Decimal('20.00'), 'tasa': Decimal('0.08'), 'importe': Decimal('1.60')},
+            {'impuesto': IMPUESTO_IVA, 'base': Decimal('21.60'), 'tasa': Decimal('0.16'), 'importe': Decimal('3.46')},
+        ],
+        'retenciones': [
+            {'impuesto': IMPUESTO_IVA, 'base': Decimal('20.00'), 'tasa': Decimal('0.106667'), 'importe': Decimal('2.13')},
+            {'impuesto': IMPUESTO_ISR, 'base': Decimal('20.00'), 'tasa': Decimal('0.10'), 'importe': Decimal('2.00')},
+        ],
+    }
+
+
+@pytest.fixture
+def datos_recibo():
+    return {
+        'fecha_expedicion': datetime(2024, 6, 15, 9, 30, 0),
+        'lugar_expedicion': '06600',
+        'rfc_emisor': 'FARA2402035H8',
+        'nombre_empresa': 'FARMACIAS DE DIOS',
+        'rfc_receptor': 'XAXX010101000',
+        'fecha_pago': datetime(2024, 6, 15),
+        'fecha_inicial_pago': date(2024, 6, 1),
+        'fecha_final_pago': date(2024, 6, 15),
+        'dias_pagados': 15,
+        'percepciones_recibo': '001',
+        'total_percepciones': Decimal('7500.00'),
+        'deducciones_recibo': '002',
+        'total_deducciones': Decimal('750.00'),
+        'importe': Decimal('6750.00'),
+        'regimen_laboral_clave': '02',
+        'numero_empleado': 'E001',
+        'curp': 'AAAA000000HDFRRR01',
+        'nss': '12345678901',
+        'fecha_ingreso': date(2020, 1, 15),
+        'tipo_contrato': '01',
+        'tipo_jornada': '01',
+        'periodicidad_pago': '04',
+        'riesgo_id': '1',
+    }
+
+
+def test_cadena_original_factura(datos_factura):
+    comprobante = comprobante_factura({**datos_factura, 'no_certificado': NO_CERTIFICADO})
+    assert cadena_original(comprobante) == (
+        # Comprobante: Version, Fecha, FormaPago, NoCertificado, SubTotal, Moneda, Total, TipoDeComprobante, MetodoPago, LugarExpedicion
+        '||3.3|2024-06-15T10:00:00|01|30001000000500003416|20.00|MXN|20.93|I|PUE|06600'
+        # Emisor y Receptor
+        '|FARA2402035H8|FARMACIAS DE DIOS|601|XAXX010101000|G01'
+        # Concepto, con los espacios de la descripción normalizados
+        '|1A1B1|2|H87|PIEZA|PARACETAMOL 500 MG|10.00|20.00'
+        # Traslados y después retenciones del concepto: Base, Impuesto, TipoFactor, TasaOCuota, Importe
+        '|20.00|003|Tasa|0.080000|1.60|21.60|002|Tasa|0.160000|3.46'
+        '|20.00|002|Tasa|0.106667|2.13|20.00|001|Tasa|0.100000|2.00'
+        # Impuestos del comprobante: retenciones y su total, después traslados y su total
+        '|002|2.13|001|2.00|4.13'
+        '|003|Tasa|0.080000|1.60|002|Tasa|0.160000|3.46|5.06||'
+    )
+
+
+def test_cadena_original_recibo(datos_recibo):
+    comprobante = comprobante_recibo({**datos_recibo, 'no_certificado': NO_CERTIFICADO})
+    assert cadena_original(comprobante) == (
+        # Comprobante, con el Descuento de las deducciones después del SubTotal
+        '||3.3|2024-06-15T09:30:00|30001000000500003416|7500.00|750.00|MXN|6750.00|N|PUE|06600'
+        '|FARA2402035H8|FARMACIAS DE DIOS|601|XAXX010101000|P01'
+        '|84111505|1|ACT|Pago de nómina|7500.00|7500.00|750.00'
+        # Complemento Nómina 1.2: Nomina, Receptor, Percepciones, Percepcion, Deducciones, Deduccion
+        '|1.2|O|2024-06-15|2024-06-01|2024-06-15|15|7500.00|750.00'
+        '|AAAA000000HDFRRR01|12345678901|2020-01-15|01|01|02|E001|1|04|CMX'
+        '|7500.00|7500.00|0.00|001|001|SUELDO|7500.00|0.00'
+        '|750.00|002|002|DEDUCCIONES|750.00||'
+    )
+
+
+def test_cadena_original_omite_sello_certificado_y_espacios_de_nombres(datos_factura):
+    comprobante = comprobante_factura(datos_factura)
+    con_sello = agregar_atributo(comprobante, 'Sello', 'SELLO', antes_de='SubTotal')
+    con_sello = agregar_atributo(con_sello, 'Certificado', 'CERTIFICADO', antes_de='SubTotal')
+    con_sello = agregar_atributo(con_sello, 'xmlns:cfdi', 'http://www.sat.gob.mx/cfd/3', antes_de='Version')
+    con_sello = agregar_atributo(con_sello, 'xsi:schemaLocation', 'http://www.sat.gob.mx/cfd/3 cfdv33.xsd', antes_de='Version')
+    assert cadena_original(con_sello) == cadena_original(comprobante)
+
+
+def test_no_certificado_va_antes_del_subtotal(datos_factura):
+    comprobante = agregar_atributo(comprobante_factura(datos_factura), 'NoCertificado', NO_CERTIFICADO, antes_de='SubTotal')
+    assert cadena_original(comprobante) == cadena_original(comprobante_factura({**datos_factura, 'no_certificado': NO_CERTIFICADO}))
+
+
+@pytest.mark.parametrize('crear, fixture', [(comprobante_factura, 'datos_factura'), (comprobante_recibo, 'datos_recibo')])
+def test_sellar_y_verificar(crear, fixture, request):
+    uuid = '9F430D65-243F-488A-B64F-073C12271B57'
+    comprobante = crear(request.getfixturevalue(fixture))
+    sellado = sellar_comprobante(uuid, comprobante)
+
+    # La cadena sellada es la del comprobante con el número de certificado del CSD
+    cadena = cadena_original(agregar_atributo(comprobante, 'NoCertificado', sellado['no_certificado'], antes_de='SubTotal'))
+    assert sellado['cadena_original'] == cadena
+    assert verificar_sello(cadena, sellado['sello_digital_cfdi'])
+    assert not verificar_sello(cadena.replace('|PUE|', '|PPD|'), sellado['sello_digital_cfdi'])
+
+    # El timbre firma la cadena del complemento de certificación, que incluye el sello del comprobante
+    cadena_timbre = sellado['cadena_original_complemento_certificacion']
+    assert cadena_timbre.startswith(f"||1.1|{uuid}|")
+    assert sellado['sello_digital_cfdi'] in cadena_timbre
+    assert verificar_sello(cadena_timbre, sellado['sello_digital_sat'])
+
+    # El XML guardado lleva el mismo sello y certificado
+    xml = sellado['xml'].decode('utf-8')
+    assert f'Sello="{sellado["sello_digital_cfdi"]}"' in xml
+    assert f'NoCertificado="{sellado["no_certificado"]}"' in xml
+    assert f'SelloSAT="{sellado["sello_digital_sat"]}"' in xml
@@ -0,0 +1,57 @@
+# test/test_factura_pdf.py
+
+"""
+Pruebas de la obtención de los PDF de facturas (utils/factura_pdf_util.py) sobre la base SQLite de las pruebas.
+"""
+
+from sqlalchemy import func, insert, select
+
+from services.almacen_documentos import almacen, facturas_pdf
+from services.database import get_db
+from services.factura_service import (
+    calcular_valores_factura, crear_factura, obtener_formas_pago, obtener_metodos_pago, obtener_regimen_fiscal,
+    obtener_tipo_comprobante, obtener_uso_destino_cfdi, procesar_factura,
+)
+from utils.factura_pdf_util import PLANTILLA_FACTURA, obtener_pdf_factura
+
+
+def test_pdf_anterior_a_las_versiones_en_bytea(base_datos):
+    with base_datos.begin() as conexion:
+        conexion.execute(insert(facturas_pdf).values(id_factura=9001, pdf=b'%PDF-anterior', version_plantilla=None))
+    with get_db() as db:
+        assert obtener_pdf_factura(db, 9001) == b'%PDF-anterior'
+
+
+def test_pdf_vigente_tiene_prioridad_sobre_el_anterior(base_datos):
+    with base_datos.begin() as conexion:
+        conexion.execute(insert(facturas_pdf).values(id_factura=9002, hash_sha256=almacen.guardar(b'%PDF-sin-version')))
+        conexion.execute(insert(facturas_pdf).values(
+            id_factura=9002, hash_sha256=almacen.guardar(b'%PDF-vigente'), version_plantilla=PLANTILLA_FACTURA.version,
+        ))
+    with get_db() as db:
+        assert obtener_pdf_factura(db, 9002) == b'%PDF-vigente'
+
+
+def test_factura_sin_sellar_no_tiene_pdf(base_datos):
+    with get_db() as db:
+        datos = {'clave_producto_servicio': '1A1B1 - PARACETAMOL', 'cantidad': 2, 'rfc_receptor': 'XAXX010101000'}
+        datos.update(calcular_valores_factura(db, datos))
+        datos.update({
+            'tipo_comprobante_clave': obtener_tipo_comprobante(db)[0],
+            'uso_destino_cfdi_clave': obtener_uso_destino_cfdi(db)[0],
+            'regimen_fiscal_clave': obtener_regimen_fiscal(db)[0],
+            'metodo_pago_clave': obtener_metodos_pago(db)[0],
+            'forma_pago_clave': obtener_formas_pago(db)[0],
+        })
+        id_factura = crear_factura(db, datos).id
+
+        def pdfs_guardados():
+            return db.scalar(select(func.count()).select_from(facturas_pdf).where(facturas_pdf.c.id_factura == id_factura))
+
+        # Antes de sellarla no se genera, no se guarda y no queda en la caché
+        assert obtener_pdf_factura(db, id_factura) is None
+        assert pdfs_guardados() == 0
+
+        procesar_factura(db, id_factura)
+        assert pdfs_guardados() == 1
+        assert obtener_pdf_factura(db, id_factura).startswith(b'%PDF')
@@ -0,0 +1,101 @@
+# test/test_factura_service.py
+
+"""
+Pruebas de la facturación por lote (services/factura_service.py) sobre la base SQLite de las pruebas.
+"""
+
+import pytest
+from sqlalchemy import select, text
+
+import services.factura_service as factura_service
+import services.sellado as sellado
+from models import Factura
+from services.database import get_db
+
+RFC_RECEPTOR = 'LOTE800101AB1'
+RFC_SIN_SELLO = 'LOTE800101AB2'
+
+
+@pytest.fixture(scope='module')
+def receptores(base_datos):
+    with base_datos.begin() as conexion:
+        for indice, rfc in enumerate((RFC_RECEPTOR, RFC_SIN_SELLO)):
+            conexion.execute(
+                text(
+                    "INSERT INTO usuarios (nombre_usuario, contraseña_hash, correo_electronico, rfc_receptor, domicilio, es_empleado) "
+                    "VALUES (:nombre, 'x', :correo, :rfc, 'CIUDAD DE MÉXICO', FALSE)"
+                ),
+                {'nombre': f'lote{indice}', 'correo': f'lote{indice}@example.com', 'rfc': rfc},
+            )
+
+
+def factura(rfc=RFC_RECEPTOR, cantidad=1, **otros):
+    return {
+        'uso_destino_cfdi_clave': 'G03 - GASTOS EN GENERAL',
+        'tipo_comprobante_clave': 'I',
+        'regimen_fiscal_clave': '601',
+        'metodo_pago_clave': 'PUE',
+        'forma_pago_clave': '01',
+        'clave_producto_servicio': '1A1B1',
+        'rfc_receptor': rfc,
+        'cantidad': cantidad,
+        **otros,
+    }
+
+
+def test_lote_aisla_errores_de_sellado(receptores, monkeypatch):
+    sellar = sellado.sellar_comprobante
+
+    def sellar_con_falla(uuid, comprobante):
+        if RFC_SIN_SELLO in str(comprobante):
+            raise RuntimeError("CSD no disponible")
+        return sellar(uuid, comprobante)
+
+    monkeypatch.setattr(sellado, 'sellar_comprobante', sellar_con_falla)
+    with get_db() as db:
+        resultado = factura_service.crear_facturas_lote(db, [factura(), factura(RFC_SIN_SELLO), factura(cantidad='3')])
+        ids = resultado['ids']
+        assert ids[0] is not None and ids[1] is None and ids[2] is not None
+        assert [error['indice'] for error in resultado['errores']] == [1]
+        assert 'CSD no disponible' in resultado['errores'][0]['error']
+        selladas = db.scalars(select(Factura.sello_digital_cfdi).where(Factura.id.in_([ids[0], ids[2]]))).all()
+        assert len(selladas) == 2 and all(selladas)
+
+
+def test_lote_aisla_errores_de_datos_fiscales(receptores, monkeypatch):
+    generar = factura_service.generar_datos_fiscales
+    llamadas = []
+
+    def generar_con_falla(datos_cfdi, sellado=None):
+        llamadas.append(datos_cfdi['uuid'])
+        if len(llamadas) == 2:
+            raise OSError("almacén de documentos no disponible")
+        return generar(datos_cfdi, sellado)
+
+    monkeypatch.setattr(factura_service, 'generar_datos_fiscales', generar_con_falla)
+    with get_db() as db:
+        resultado = factura_service.crear_facturas_lote(db, [factura(), factura(), factura()])
+    assert resultado['ids'][1] is None
+    assert resultado['ids'][0] is not None and resultado['ids'][2] is not None
+    assert resultado['errores'] == [{'indice': 1, 'error': "OSError: almacén de documentos no disponible"}]
+
+
+@pytest.mark.parametrize('importes, error', [
+    ({'total': '116.00'}, "Faltan importes"),
+    ({'importe': '100.00', 'subtotal': '100.00', 'ieps': '0', 'iva': '16.00', 'retenciones': '0', 'total': '120.00'}, "no cuadran"),
+    ({'importe': '90.00', 'subtotal': '100.00', 'ieps': '0', 'iva': '16.00', 'retenciones': '0', 'total': '116.00'}, "subtotal"),
+])
+def test_lote_rechaza_importes_incongruentes(receptores, importes, error):
+    with get_db() as db:
+        resultado = factura_service.crear_facturas_lote(db, [factura(**importes)])
+    assert resultado['ids'] == [None]
+    assert error in resultado['errores'][0]['error']
+
+
+def test_lote_acepta_importes_completos(receptores):
+    importes = {'importe': '100.00', 'subtotal': '100.00', 'ieps': '8.00', 'iva': '17.28', 'retenciones': '10.00', 'total': '115.28'}
+    with get_db() as db:
+        resultado = factura_service.crear_facturas_lote(db, [factura(**importes)])
+        assert resultado['errores'] == []
+        total = db.scalar(select(Factura.total).where(Factura.id == resultado['ids'][0]))
+    assert str(total) == '115.28'
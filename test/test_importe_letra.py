@@ -0,0 +1,68 @@
+# test/test_importe_letra.py
+
+"""
+Pruebas de la conversión de importes a letra (utils/importe_letra.py).
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from utils.importe_letra import importe_con_letra, numero_a_letras
+
+
+@pytest.mark.parametrize('importe, esperado', [
+    (0, 'CERO PESOS 00/100 M.N.'),
+    (1, 'UN PESO 00/100 M.N.'),
+    (Decimal('1.50'), 'UN PESO 50/100 M.N.'),
+    (2, 'DOS PESOS 00/100 M.N.'),
+    (16, 'DIECISÉIS PESOS 00/100 M.N.'),
+    (21, 'VEINTIÚN PESOS 00/100 M.N.'),
+    (22, 'VEINTIDÓS PESOS 00/100 M.N.'),
+    (31, 'TREINTA Y UN PESOS 00/100 M.N.'),
+    (100, 'CIEN PESOS 00/100 M.N.'),
+    (101, 'CIENTO UN PESOS 00/100 M.N.'),
+    (115, 'CIENTO QUINCE PESOS 00/100 M.N.'),
+    (500, 'QUINIENTOS PESOS 00/100 M.N.'),
+    (1000, 'MIL PESOS 00/100 M.N.'),
+    (1001, 'MIL UN PESOS 00/100 M.N.'),
+    (Decimal('1234.45'), 'MIL DOSCIENTOS TREINTA Y CUATRO PESOS 45/100 M.N.'),
+    (21000, 'VEINTIÚN MIL PESOS 00/100 M.N.'),
+    (100000, 'CIEN MIL PESOS 00/100 M.N.'),
+    (121121, 'CIENTO VEINTIÚN MIL CIENTO VEINTIÚN PESOS 00/100 M.N.'),
+    (1000000, 'UN MILLÓN DE PESOS 00/100 M.N.'),
+    (1000001, 'UN MILLÓN UN PESOS 00/100 M.N.'),
+    (2000000, 'DOS MILLONES DE PESOS 00/100 M.N.'),
+    (21000000, 'VEINTIÚN MILLONES DE PESOS 00/100 M.N.'),
+    (1001000000, 'MIL UN MILLONES DE PESOS 00/100 M.N.'),
+    (999999999999, 'NOVECIENTOS NOVENTA Y NUEVE MIL NOVECIENTOS NOVENTA Y NUEVE MILLONES '
+                   'NOVECIENTOS NOVENTA Y NUEVE MIL NOVECIENTOS NOVENTA Y NUEVE PESOS 00/100 M.N.'),
+])
+def test_importe_con_letra(importe, esperado):
+    assert importe_con_letra(importe) == esperado
+
+
+@pytest.mark.parametrize('importe, esperado', [
+    (Decimal('0.005'), 'CERO PESOS 01/100 M.N.'),  # La mitad se redondea hacia arriba
+    (Decimal('0.004'), 'CERO PESOS 00/100 M.N.'),
+    (Decimal('0.995'), 'UN PESO 00/100 M.N.'),  # El redondeo puede completar un peso
+    (Decimal('99.999'), 'CIEN PESOS 00/100 M.N.'),
+    (10.1, 'DIEZ PESOS 10/100 M.N.'),  # Los float se convierten sin errores de representación
+    ('15.07', 'QUINCE PESOS 07/100 M.N.'),
+])
+def test_redondeo_de_centavos(importe, esperado):
+    assert importe_con_letra(importe) == esperado
+
+
+def test_otra_moneda():
+    assert importe_con_letra(1, moneda='DÓLARES', moneda_singular='DÓLAR', sufijo='USD') == 'UN DÓLAR 00/100 USD'
+
+
+@pytest.mark.parametrize('importe', [Decimal('-0.01'), 10 ** 12])
+def test_importe_fuera_de_rango(importe):
+    with pytest.raises(ValueError):
+        importe_con_letra(importe)
+
+
+def test_numero_a_letras_cero():
+    assert numero_a_letras(0) == 'CERO'
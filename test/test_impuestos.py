@@ -0,0 +1,77 @@
+# test/test_impuestos.py
+
+"""
+Pruebas del motor de impuestos y totales (services/impuestos.py).
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from services.impuestos import calcular_conceptos, totalizar_conceptos
+
+
+def test_importe_se_redondea_una_sola_vez():
+    # 1.5 × 10.005 = 15.0075: el valor unitario no se redondea a centavos antes de multiplicar
+    conceptos = calcular_conceptos([Decimal('1.5')], [Decimal('10.005')], [Decimal('0.16')])
+    totales = totalizar_conceptos(conceptos)
+    assert totales['subtotal'] == Decimal('15.01')
+    assert totales['iva'] == Decimal('2.40')
+    assert totales['total'] == Decimal('17.41')
+
+
+@pytest.mark.parametrize('valor_unitario, importe, iva', [
+    ('0.03125', '0.03', '0.00'),  # 0.03125 se redondea hacia abajo
+    ('0.125', '0.13', '0.02'),  # La mitad se redondea hacia arriba (0.125 y 0.0208 del IVA)
+    ('10.00', '10.00', '1.60'),
+])
+def test_redondeo_mitad_hacia_arriba(valor_unitario, importe, iva):
+    totales = totalizar_conceptos(calcular_conceptos([1], [Decimal(valor_unitario)], [Decimal('0.16')]))
+    assert totales['subtotal'] == Decimal(importe)
+    assert totales['iva'] == Decimal(iva)
+
+
+def test_ieps_forma_parte_de_la_base_del_iva():
+    conceptos = calcular_conceptos([2], [Decimal('10.00')], [Decimal('0.16')], tasas_ieps=[Decimal('0.08')])
+    totales = totalizar_conceptos(conceptos)
+    assert totales['ieps'] == Decimal('1.60')
+    # (20.00 + 1.60) × 0.16 = 3.456
+    assert totales['iva'] == Decimal('3.46')
+    assert totales['total'] == Decimal('25.06')
+
+
+def test_retenciones_se_restan_del_total():
+    conceptos = calcular_conceptos(
+        [1], [Decimal('1000.00')], [Decimal('0.16')],
+        tasas_retencion_iva=[Decimal('0.106667')], tasas_retencion_isr=[Decimal('0.10')],
+    )
+    totales = totalizar_conceptos(conceptos)
+    assert totales['retencion_iva'] == Decimal('106.67')
+    assert totales['retencion_isr'] == Decimal('100.00')
+    # Las retenciones se calculan sobre el importe, sin el IEPS
+    assert totales['total'] == Decimal('1000.00') + Decimal('160.00') - Decimal('106.67') - Decimal('100.00')
+
+
+def test_valores_grandes_pasan_a_enteros_de_python():
+    conceptos = calcular_conceptos(np.array([10 ** 9]), [Decimal('99999999.99')], [Decimal('0.16')])
+    assert conceptos['importe'].dtype == object
+    totales = totalizar_conceptos(conceptos)
+    assert totales['subtotal'] == Decimal('99999999990000000.00')
+    assert totales['iva'] == Decimal('15999999998400000.00')
+
+
+def test_totales_por_factura():
+    conceptos = calcular_conceptos(
+        [1, 2, 3], [Decimal('10.00'), Decimal('5.00'), Decimal('1.00')],
+        [Decimal('0.16'), Decimal('0'), Decimal('0.16')],
+    )
+    totales = totalizar_conceptos(conceptos, facturas=[0, 1, 0], numero_facturas=3)
+    assert totales['subtotal'] == [Decimal('13.00'), Decimal('10.00'), Decimal('0.00')]
+    assert totales['iva'] == [Decimal('2.08'), Decimal('0.00'), Decimal('0.00')]
+    assert totales['total'] == [Decimal('15.08'), Decimal('10.00'), Decimal('0.00')]
+
+
+def test_columnas_de_distinta_longitud():
+    with pytest.raises(ValueError):
+        calcular_conceptos([1, 2], [Decimal('1.00')], [Decimal('0.16'), Decimal('0.16')])
@@ -0,0 +1,83 @@
+# test/test_pdf_plantilla.py
+
+"""
+Pruebas de las plantillas PDF precompiladas (utils/pdf_plantilla.py).
+
+Un documento generado con la plantilla debe ser idéntico, salvo la fecha de creación, al que se
+obtiene ejecutando la función de diseño con los datos. Si una versión de fpdf cambia los detalles
+internos de los que depende la compilación, estas pruebas fallan.
+"""
+
+import re
+
+import pytest
+
+from utils.factura_pdf_util import PLANTILLA_FACTURA
+from utils.qr_util import generar_codigo_qr
+from utils.recibo_pdf_util import PLANTILLA_RECIBO
+
+SELLO = 'kR3d9Qm7XzP1' * 30  # Más largo que el ancho de la página, para que multi_cell lo divida en líneas
+CADENA_TIMBRE = '||1.1|9F430D65-243F-488A-B64F-073C12271B57|2024-06-15T10:00:00|' + SELLO[:120] + '|30001000000500003456||'
+
+
+def sin_fecha_creacion(pdf):
+    return re.sub(rb'/CreationDate \(D:\d+\)', b'/CreationDate ()', pdf)
+
+
+def codigo_qr():
+    return generar_codigo_qr('9F430D65-243F-488A-B64F-073C12271B57', 'FARA2402035H8', 'XAXX010101000', '1160.00', SELLO)
+
+
+def datos_factura(qr):
+    return {
+        'nombre_empresa': 'FARMACIAS DE DIOS', 'rfc_emisor': 'FARA2402035H8',
+        'regimen_fiscal_clave': '601', 'regimen_fiscal_descripcion': 'General de Ley Personas Morales',
+        'rfc_receptor': 'XAXX010101000',
+        'tipo_comprobante_clave': 'I', 'tipo_comprobante_descripcion': 'Ingreso',
+        'uso_destino_cfdi_clave': 'G03', 'uso_destino_cfdi_descripcion': 'Gastos en general',
+        'fecha_expedicion': '2024-06-15 10:00:00', 'lugar_expedicion': '06600',
+        'forma_pago_clave': '01', 'forma_pago_descripcion': 'Efectivo',
+        'metodo_pago_clave': 'PUE', 'metodo_pago_descripcion': 'Pago en una sola exhibición',
+        'moneda': 'MXN', 'tipo_cambio': '1.00',
+        'clave_producto_servicio': '51101500', 'descripcion_producto_servicio': 'Antibióticos (caja) ñ',
+        'subtotal': '1000.00', 'iva': '160.00', 'cantidad': 2, 'total': '1160.00', 'importe': '1000.00',
+        'total_con_letra': 'MIL CIENTO SESENTA PESOS 00/100 M.N.',
+        'sello_digital_cfdi': SELLO, 'sello_digital_sat': SELLO[::-1],
+        'cadena_original_complemento_certificacion': CADENA_TIMBRE,
+        'codigo_qr': qr,
+    }
+
+
+def datos_recibo(qr):
+    return {
+        'empleado': {
+            'numero_empleado': '0042', 'curp': 'PEGJ800101HDFRRN09', 'nss': '12345678901',
+            'fecha_ingreso': '2020-01-15', 'tipo_contrato': '01', 'tipo_jornada': '01',
+            'periodicidad_pago': '04', 'sueldo_base': '15000.00',
+        },
+        'id': 7, 'nombre_empresa': 'FARMACIAS DE DIOS', 'rfc_emisor': 'FARA2402035H8',
+        'tipo_comprobante_clave': 'N', 'uso_destino_cfdi_clave': 'P01', 'regimen_laboral_clave': '02',
+        'fecha_expedicion': '2024-06-15 10:00:00', 'lugar_expedicion': '06600', 'fecha_pago': '2024-06-15',
+        'forma_pago_clave': '99', 'metodo_pago_clave': 'PUE', 'moneda': 'MXN', 'tipo_cambio': '1.00',
+        'percepciones_recibo': '001', 'deducciones_recibo': '002',
+        'valor_percepciones': '15000.00', 'valor_deducciones': '1800.00',
+        'total_percepciones': '15000.00', 'total_deducciones': '1800.00',
+        'importe': '13200.00', 'importe_con_letra': 'TRECE MIL DOSCIENTOS PESOS 00/100 M.N.',
+        'sello_digital_cfdi': SELLO, 'sello_digital_sat': SELLO[::-1],
+        'cadena_original_complemento_certificacion': CADENA_TIMBRE,
+        'codigo_qr': qr,
+    }
+
+
+@pytest.mark.parametrize('plantilla, datos', [(PLANTILLA_FACTURA, datos_factura), (PLANTILLA_RECIBO, datos_recibo)], ids=['factura', 'recibo'])
+@pytest.mark.parametrize('con_qr', [True, False], ids=['con_qr', 'sin_qr'])
+def test_plantilla_igual_al_diseño_directo(plantilla, datos, con_qr):
+    valores = datos(codigo_qr() if con_qr else None)
+    assert sin_fecha_creacion(plantilla.rellenar(valores)) == sin_fecha_creacion(plantilla.renderizar(valores))
+
+
+def test_plantilla_reutilizada_con_datos_distintos():
+    primera = datos_factura(codigo_qr())
+    segunda = {**primera, 'rfc_receptor': 'MOSA8001017T4', 'total': '23.20', 'sello_digital_cfdi': SELLO[:50], 'codigo_qr': None}
+    for valores in (primera, segunda, primera):
+        assert sin_fecha_creacion(PLANTILLA_FACTURA.rellenar(valores)) == sin_fecha_creacion(PLANTILLA_FACTURA.renderizar(valores))
@@ -0,0 +1,63 @@
+# test/test_sesion_cache.py
+
+"""
+Pruebas de la caché de sesiones iniciadas (services/sesion_cache.py).
+"""
+
+import pytest
+
+import services.sesion_cache as sesion_cache
+from services.sesion_cache import CacheSesiones
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """
+    Reloj monotónico controlado por la prueba.
+    """
+    class Reloj:
+        ahora = 1000.0
+
+        def avanzar(self, segundos):
+            self.ahora += segundos
+
+    actual = Reloj()
+    monkeypatch.setattr(sesion_cache.time, 'monotonic', lambda: actual.ahora)
+    return actual
+
+
+def test_sesion_vence_por_inactividad(reloj):
+    cache = CacheSesiones(duracion=60)
+    identificador = cache.crear({'id': 1})
+
+    reloj.avanzar(59)
+    assert cache.obtener(identificador) == {'id': 1}
+    # Cada uso extiende el vencimiento
+    reloj.avanzar(59)
+    assert cache.obtener(identificador) == {'id': 1}
+    reloj.avanzar(60)
+    assert cache.obtener(identificador) is None
+    # La sesión vencida se elimina
+    reloj.avanzar(-120)
+    assert cache.obtener(identificador) is None
+
+
+def test_se_descarta_la_sesion_menos_usada(reloj):
+    cache = CacheSesiones(duracion=60, max_entradas=2)
+    primera = cache.crear({'id': 1})
+    segunda = cache.crear({'id': 2})
+    # Usar la primera la vuelve la más reciente, así que se descarta la segunda
+    assert cache.obtener(primera) == {'id': 1}
+    tercera = cache.crear({'id': 3})
+
+    assert cache.obtener(segunda) is None
+    assert cache.obtener(primera) == {'id': 1}
+    assert cache.obtener(tercera) == {'id': 3}
+
+
+def test_eliminar_sesion(reloj):
+    cache = CacheSesiones()
+    identificador = cache.crear({'id': 1})
+    cache.eliminar(identificador)
+    cache.eliminar(identificador)
+    assert cache.obtener(identificador) is None
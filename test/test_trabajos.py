@@ -0,0 +1,112 @@
+# test/test_trabajos.py
+
+"""
+Pruebas de la cola de trabajos en segundo plano (services/trabajos.py) sobre la base SQLite de las pruebas.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from services.database import get_db
+from services.trabajos import (
+    EN_PROCESO, FALLIDO, PENDIENTE, TERMINADO, ejecutar_trabajo, encolar, obtener_estado_trabajo,
+    recuperar_trabajos_abandonados, tarea, tomar_trabajos, trabajos,
+)
+
+ejecuciones = []
+
+
+@tarea('prueba.registrar')
+def registrar(db, valor):
+    ejecuciones.append(valor)
+
+
+@tarea('prueba.fallar')
+def fallar(db):
+    raise RuntimeError("falla de prueba")
+
+
+@pytest.fixture
+def db(base_datos):
+    # Cada prueba empieza con la cola vacía, para que los trabajos de otras pruebas no se tomen
+    with get_db() as sesion:
+        sesion.execute(delete(trabajos))
+        sesion.commit()
+        yield sesion
+
+
+def leer(db, id_trabajo):
+    return db.execute(select(trabajos).where(trabajos.c.id == id_trabajo)).mappings().one()
+
+
+def test_trabajo_exitoso_termina(db):
+    id_trabajo = encolar(db, 'prueba.registrar', {'valor': 7}, clave='prueba:exito')
+    db.commit()
+
+    [trabajo] = tomar_trabajos(db, 'trabajador-1')
+    assert trabajo['id'] == id_trabajo and trabajo['intentos'] == 1
+    assert leer(db, id_trabajo)['estado'] == EN_PROCESO
+
+    assert ejecutar_trabajo(db, trabajo) is True
+    assert ejecuciones[-1] == 7
+    fila = leer(db, id_trabajo)
+    assert fila['estado'] == TERMINADO and fila['bloqueado_por'] is None and fila['terminado_en'] is not None
+
+
+def test_trabajo_fallido_se_reintenta_con_espera_y_despues_falla(db):
+    id_trabajo = encolar(db, 'prueba.fallar', {}, clave='prueba:falla', max_intentos=2)
+    db.commit()
+
+    # Primer intento: vuelve a pendientes con espera de 2 ** 1 segundos
+    [trabajo] = tomar_trabajos(db, 'trabajador-1')
+    antes = datetime.now()
+    assert ejecutar_trabajo(db, trabajo) is False
+    fila = leer(db, id_trabajo)
+    assert fila['estado'] == PENDIENTE
+    assert 'falla de prueba' in fila['error']
+    assert antes + timedelta(seconds=1.5) <= fila['ejecutar_despues'] <= datetime.now() + timedelta(seconds=2)
+    # Mientras no pasa la espera no se vuelve a tomar
+    assert tomar_trabajos(db, 'trabajador-1') == []
+
+    # Segundo y último intento: queda como fallido
+    db.execute(update(trabajos).where(trabajos.c.id == id_trabajo).values(ejecutar_despues=datetime.now()))
+    db.commit()
+    [trabajo] = tomar_trabajos(db, 'trabajador-1')
+    assert trabajo['intentos'] == 2
+    assert ejecutar_trabajo(db, trabajo) is False
+    fila = leer(db, id_trabajo)
+    assert fila['estado'] == FALLIDO and fila['terminado_en'] is not None
+    assert tomar_trabajos(db, 'trabajador-1') == []
+
+
+def test_recuperar_trabajos_abandonados(db):
+    abandonado = encolar(db, 'prueba.registrar', {'valor': 1}, clave='prueba:abandonado')
+    reciente = encolar(db, 'prueba.registrar', {'valor': 2}, clave='prueba:reciente')
+    db.commit()
+    tomar_trabajos(db, 'trabajador-muerto', limite=2)
+    db.execute(update(trabajos).where(trabajos.c.id == abandonado).values(bloqueado_en=datetime.now() - timedelta(minutes=30)))
+    db.commit()
+
+    assert recuperar_trabajos_abandonados(db, timedelta(minutes=10)) == 1
+    fila = leer(db, abandonado)
+    assert fila['estado'] == PENDIENTE and fila['bloqueado_por'] is None
+    assert leer(db, reciente)['estado'] == EN_PROCESO
+
+    # El trabajo recuperado se vuelve a tomar
+    assert [trabajo['id'] for trabajo in tomar_trabajos(db, 'trabajador-2')] == [abandonado]
+
+
+def test_estado_del_trabajo_mas_reciente_de_una_clave(db):
+    assert obtener_estado_trabajo(db, 'factura:inexistente') is None
+
+    primero = encolar(db, 'prueba.fallar', {}, clave='factura:99', max_intentos=1)
+    db.commit()
+    ejecutar_trabajo(db, tomar_trabajos(db, 'trabajador-1')[0])
+    segundo = encolar(db, 'prueba.registrar', {'valor': 3}, clave='factura:99')
+    db.commit()
+
+    estado = obtener_estado_trabajo(db, 'factura:99')
+    assert estado['id'] == segundo and estado['id'] != primero
+    assert estado['estado'] == PENDIENTE and estado['intentos'] == 0 and estado['error'] is None